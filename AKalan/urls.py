@@ -26,7 +26,7 @@ urlpatterns = [
     path('django-admin/', admin.site.urls),  # Django admin (changé pour éviter les conflits)
 ]
 
-# Servir les fichiers statiques et média en développement
+# Servir les fichiers statiques en développement
+# Les fichiers média passent toujours par comptes.views.fichier_protege (contrôle d'accès)
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
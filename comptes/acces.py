@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Classe, Utilisateur
+from .replicas import sur_primaire
+
+
+def cle_acces(utilisateur_id):
+    return f'acces:{utilisateur_id}'
+
+
+class ContexteAcces:
+    """
+    Faits d'autorisation d'un utilisateur : sa classe, les cours auxquels il
+    est inscrit et les classes qu'il enseigne. Les vérifications d'accès sont
+    des recherches dans des ensembles, sans requête.
+    """
+
+    def __init__(self, classe_id, cours_inscrits, classes_enseignees):
+        self.classe_id = classe_id
+        self.cours_inscrits = frozenset(cours_inscrits)
+        self.classes_enseignees = frozenset(classes_enseignees)
+
+    def enseigne(self, classe):
+        return classe.id in self.classes_enseignees
+
+
+def _charger(utilisateur):
+    from cours.models import Inscription
+
+    # Une seule requête : les inscriptions d'un étudiant ou les classes d'un enseignant
+    cours_inscrits = classes_enseignees = []
+    if utilisateur.role == 'etudiant':
+        cours_inscrits = list(Inscription.objects.filter(etudiant_id=utilisateur.id).values_list('cours_id', flat=True))
+    elif utilisateur.role == 'enseignant':
+        classes_enseignees = list(
+            Classe.enseignants.through.objects.filter(utilisateur_id=utilisateur.id).values_list('classe_id', flat=True)
+        )
+    return {
+        'classe_id': utilisateur.classe_id,
+        'cours_inscrits': cours_inscrits,
+        'classes_enseignees': classes_enseignees,
+    }
+
+
+def contexte_acces(utilisateur):
+    """
+    Contexte d'accès de l'utilisateur, gardé sur l'objet pour la durée de la
+    requête et dans le cache partagé (ACCES_CACHE_DUREE secondes) entre les
+    requêtes. Les signaux ci-dessous l'invalident à chaque changement.
+    """
+    contexte = utilisateur.__dict__.get('_contexte_acces')
+    if contexte is not None:
+        return contexte
+    valeurs = cache.get(cle_acces(utilisateur.id))
+    # La classe lue avec l'utilisateur fait foi (changement par update() sans signal)
+    if valeurs is None or valeurs['classe_id'] != utilisateur.classe_id:
+        with sur_primaire():
+            valeurs = _charger(utilisateur)
+        cache.set(cle_acces(utilisateur.id), valeurs, getattr(settings, 'ACCES_CACHE_DUREE', 300))
+    contexte = ContexteAcces(**valeurs)
+    utilisateur.__dict__['_contexte_acces'] = contexte
+    return contexte
+
+
+def invalider_acces(utilisateur_ids):
+    """
+    Supprime les contextes d'accès en cache, tout de suite pour la suite de la
+    transaction en cours, puis de nouveau après le COMMIT : une requête
+    concurrente a pu recharger et remettre en cache les anciennes lignes
+    entre-temps.
+    """
+    cles = [cle_acces(utilisateur_id) for utilisateur_id in utilisateur_ids if utilisateur_id]
+    if cles:
+        cache.delete_many(cles)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: cache.delete_many(cles))
+
+
+#----------------------------------Signaux----------------------------------
+@receiver(post_save, sender=Utilisateur)
+@receiver(post_delete, sender=Utilisateur)
+def _acces_utilisateur(sender, instance, **kwargs):
+    invalider_acces([instance.id])
+
+
+@receiver(post_save, sender='cours.Inscription')
+@receiver(post_delete, sender='cours.Inscription')
+def _acces_inscription(sender, instance, **kwargs):
+    invalider_acces([instance.etudiant_id])
+
+
+@receiver(m2m_changed, sender=Classe.enseignants.through)
+def _acces_enseignants_classe(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # La liste des enseignants retirés n'est plus lisible après le clear
+        if reverse:
+            invalider_acces([instance.id])
+        else:
+            invalider_acces(instance.enseignants.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        # reverse : instance est l'enseignant, pk_set les classes
+        invalider_acces([instance.id] if reverse else pk_set or [])
+
+
+@receiver(pre_delete, sender=Classe)
+def _acces_classe_supprimee(sender, instance, **kwargs):
+    # Enseignants et étudiants (classe mise à NULL par update(), sans signal)
+    invalider_acces(
+        list(instance.enseignants.values_list('id', flat=True))
+        + list(instance.utilisateur_set.values_list('id', flat=True))
+    )
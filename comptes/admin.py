@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Utilisateur, Note, Invitation
+from .models import Utilisateur, Note, Invitation, EmailSortant, CompteurStatistique, AgregatNotes, ContenuFichier
 
 
 @admin.register(Utilisateur)
@@ -29,13 +29,47 @@ class NoteAdmin(admin.ModelAdmin):
 @admin.register(Invitation)
 class InvitationAdmin(admin.ModelAdmin):
     """Configuration de l'admin pour le modèle Invitation"""
-    list_display = ('email', 'role', 'classe', 'statut', 'date_creation', 'date_expiration', 'cree_par')
-    list_filter = ('role', 'statut', 'date_creation')
+    list_display = ('email', 'role', 'classe', 'statut', 'statut_envoi', 'date_creation', 'date_expiration', 'cree_par')
+    list_filter = ('role', 'statut', 'statut_envoi', 'date_creation')
     search_fields = ('email', 'token')
-    readonly_fields = ('token', 'date_creation', 'date_acceptation')
+    readonly_fields = ('token', 'date_creation', 'date_acceptation', 'statut_envoi', 'date_envoi')
     date_hierarchy = 'date_creation'
     
     def get_readonly_fields(self, request, obj=None):
         if obj:  # Si on modifie un objet existant
             return self.readonly_fields + ('email', 'role', 'classe')
         return self.readonly_fields
+
+
+@admin.register(EmailSortant)
+class EmailSortantAdmin(admin.ModelAdmin):
+    """Configuration de l'admin pour la file d'attente des emails"""
+    list_display = ('destinataire', 'sujet', 'statut', 'tentatives', 'prochaine_tentative', 'date_creation', 'date_envoi')
+    list_filter = ('statut', 'date_creation')
+    search_fields = ('destinataire', 'sujet')
+    readonly_fields = ('date_creation', 'date_envoi', 'derniere_erreur')
+    date_hierarchy = 'date_creation'
+
+
+@admin.register(CompteurStatistique)
+class CompteurStatistiqueAdmin(admin.ModelAdmin):
+    """Configuration de l'admin pour le modèle CompteurStatistique"""
+    list_display = ('cle', 'valeur', 'date_mise_a_jour')
+    readonly_fields = ('cle', 'valeur', 'date_mise_a_jour')
+
+
+@admin.register(AgregatNotes)
+class AgregatNotesAdmin(admin.ModelAdmin):
+    """Configuration de l'admin pour le modèle AgregatNotes"""
+    list_display = ('cle', 'portee', 'nb_notes', 'moyenne', 'mediane', 'minimum', 'maximum', 'date_mise_a_jour')
+    list_filter = ('portee',)
+    search_fields = ('cle',)
+    readonly_fields = ('cle', 'portee', 'nb_notes', 'moyenne', 'mediane', 'minimum', 'maximum', 'date_mise_a_jour')
+
+
+@admin.register(ContenuFichier)
+class ContenuFichierAdmin(admin.ModelAdmin):
+    """Configuration de l'admin pour le modèle ContenuFichier"""
+    list_display = ('sha256', 'taille', 'nb_references', 'date_creation')
+    search_fields = ('sha256', 'references__nom')
+    readonly_fields = ('sha256', 'taille', 'nb_references', 'date_creation')
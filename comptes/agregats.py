@@ -0,0 +1,260 @@
+import statistics
+import threading
+from decimal import Decimal
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import AgregatNotes, Note, Utilisateur
+from .replicas import sur_primaire
+
+DEUX_DECIMALES = Decimal('0.01')
+
+TAILLE_LOT_AGREGATS = 500
+
+
+def cle_etudiant(etudiant_id):
+    return f'etudiant:{etudiant_id}'
+
+
+def cle_etudiant_enseignant(etudiant_id, enseignant_id):
+    return f'etudiant_enseignant:{etudiant_id}:{enseignant_id}'
+
+
+def cle_devoir(devoir_id):
+    return f'devoir:{devoir_id}'
+
+
+def cle_classe(classe_id):
+    return f'classe:{classe_id}'
+
+
+# Champs de Note qui identifient chaque portée d'agrégat
+CHAMPS_PORTEES = {
+    'etudiant': ('etudiant_id',),
+    'etudiant_enseignant': ('etudiant_id', 'enseignant_id'),
+    'devoir': ('devoir_id',),
+    'classe': ('etudiant__classe_id',),
+}
+
+
+def _valeurs_par_cle(cles):
+    """Charge les notes couvertes par chaque agrégat, avec une requête par portée"""
+    valeurs = {cle: [] for cle in cles}
+    ids_par_portee = {}
+    for cle in cles:
+        portee, *ids = cle.split(':')
+        if portee not in CHAMPS_PORTEES:
+            raise ValueError(f'Clé d\'agrégat inconnue : {cle}')
+        ids_par_portee.setdefault(portee, set()).add(int(ids[0]))
+
+    for portee, ids in ids_par_portee.items():
+        champs = CHAMPS_PORTEES[portee]
+        lignes = Note.objects.filter(**{f'{champs[0]}__in': ids}).values_list(*champs, 'note')
+        for *ids_ligne, note in lignes:
+            cle = ':'.join([portee, *map(str, ids_ligne)])
+            if cle in valeurs:
+                valeurs[cle].append(note)
+    return valeurs
+
+
+def _statistiques(valeurs):
+    valeurs = sorted(valeurs)
+    if not valeurs:
+        return {'nb_notes': 0, 'moyenne': None, 'mediane': None, 'minimum': None, 'maximum': None}
+    return {
+        'nb_notes': len(valeurs),
+        'moyenne': (sum(valeurs) / len(valeurs)).quantize(DEUX_DECIMALES),
+        'mediane': Decimal(statistics.median(valeurs)).quantize(DEUX_DECIMALES),
+        'minimum': valeurs[0],
+        'maximum': valeurs[-1],
+    }
+
+
+def recalculer_agregats(cles):
+    """
+    Recalcule et enregistre les agrégats donnés en un nombre constant de requêtes.
+
+    Les lignes des agrégats sont verrouillées (et créées si besoin) avant la
+    lecture des notes : deux enregistrements de notes concurrents se
+    succèdent, et le second relit les notes validées par le premier
+    (isolation READ COMMITTED, voir OPTIONS_MYSQL dans les settings).
+    """
+    cles = set(cles)
+    if not cles:
+        return {}
+    now = timezone.now()
+    with transaction.atomic():
+        agregats = {
+            agregat.cle: agregat
+            for agregat in AgregatNotes.objects.select_for_update().filter(cle__in=cles)
+        }
+        manquantes = cles - agregats.keys()
+        if manquantes:
+            # Une ligne créée entre-temps par un autre processus est ignorée ici, puis verrouillée et recalculée
+            AgregatNotes.objects.bulk_create(
+                [AgregatNotes(cle=cle, portee=cle.split(':')[0]) for cle in sorted(manquantes)],
+                batch_size=TAILLE_LOT_AGREGATS, ignore_conflicts=True,
+            )
+            agregats.update(
+                (agregat.cle, agregat)
+                for agregat in AgregatNotes.objects.select_for_update().filter(cle__in=manquantes)
+            )
+        valeurs = _valeurs_par_cle(cles)
+        for cle, agregat in agregats.items():
+            for champ, valeur in _statistiques(valeurs[cle]).items():
+                setattr(agregat, champ, valeur)
+            agregat.date_mise_a_jour = now
+        AgregatNotes.objects.bulk_update(
+            agregats.values(),
+            ['nb_notes', 'moyenne', 'mediane', 'minimum', 'maximum', 'date_mise_a_jour'],
+            batch_size=TAILLE_LOT_AGREGATS,
+        )
+    return agregats
+
+
+def cles_note(note):
+    """Agrégats qui dépendent d'une note"""
+    cles = [
+        cle_etudiant(note.etudiant_id),
+        cle_etudiant_enseignant(note.etudiant_id, note.enseignant_id),
+        cle_devoir(note.devoir_id),
+    ]
+    if note.etudiant.classe_id:
+        cles.append(cle_classe(note.etudiant.classe_id))
+    return cles
+
+
+def lire_agregats(cles):
+    """
+    Lit les agrégats en une requête, indexés par clé.
+    Les agrégats absents (données antérieures) sont calculés puis enregistrés.
+    """
+    agregats = {agregat.cle: agregat for agregat in AgregatNotes.objects.filter(cle__in=cles)}
+    manquants = [cle for cle in cles if cle not in agregats]
+    if manquants:
+        # Recalcul sur la base principale : un agrégat absent d'un réplica peut exister sur la principale
+        with sur_primaire():
+            agregats.update(recalculer_agregats(manquants))
+    return agregats
+
+
+def reconstruire_agregats():
+    """Recalcule tous les agrégats à partir des notes et supprime ceux devenus orphelins"""
+    cles = set()
+    for etudiant_id, enseignant_id, devoir_id, classe_id in Note.objects.values_list(
+        'etudiant_id', 'enseignant_id', 'devoir_id', 'etudiant__classe_id'
+    ).distinct():
+        cles.update([
+            cle_etudiant(etudiant_id),
+            cle_etudiant_enseignant(etudiant_id, enseignant_id),
+            cle_devoir(devoir_id),
+        ])
+        if classe_id:
+            cles.add(cle_classe(classe_id))
+    with transaction.atomic():
+        AgregatNotes.objects.exclude(cle__in=cles).delete()
+        recalculer_agregats(cles)
+    return len(cles)
+
+
+# Agrégats à recalculer à la validation de la transaction en cours
+_en_attente = threading.local()
+
+
+def _attente():
+    if not hasattr(_en_attente, 'cles'):
+        # cles : agrégats touchés ; etudiants : leur classe est relue à la validation ;
+        # classes : classe des étudiants supprimés, qui ne peut plus être relue
+        _en_attente.cles, _en_attente.etudiants, _en_attente.classes = set(), set(), {}
+    return _en_attente
+
+
+def _planifier(etudiant_id, enseignant_id, devoir_id):
+    """
+    Planifie le recalcul des agrégats d'une note écrite ou supprimée, sans
+    requête : une seule passe à la validation couvre toutes les notes de la
+    transaction (suppression en cascade d'un devoir, d'un cours, d'un étudiant...).
+    """
+    attente = _attente()
+    attente.cles.update([
+        cle_etudiant(etudiant_id),
+        cle_etudiant_enseignant(etudiant_id, enseignant_id),
+        cle_devoir(devoir_id),
+    ])
+    attente.etudiants.add(etudiant_id)
+    transaction.on_commit(_recalculer_en_attente)
+
+
+def planifier_recalcul(notes):
+    """Pour les écritures sans signaux (bulk_create, bulk_update) : recalcul des agrégats des notes à la validation"""
+    for note in notes:
+        _planifier(note.etudiant_id, note.enseignant_id, note.devoir_id)
+
+
+def _recalculer_en_attente():
+    attente = _attente()
+    if not attente.cles:
+        # Déjà fait par un rappel précédent de la même transaction
+        return
+    cles, etudiants, classes = attente.cles, attente.etudiants, attente.classes
+    attente.cles, attente.etudiants, attente.classes = set(), set(), {}
+    classes.update(Utilisateur.objects.filter(id__in=etudiants).values_list('id', 'classe_id'))
+    cles.update(cle_classe(classes[etudiant_id]) for etudiant_id in etudiants if classes.get(etudiant_id))
+    recalculer_agregats(cles)
+
+
+#----------------------------------Signaux----------------------------------
+@receiver(post_init, sender=Note)
+def memoriser_portees(sender, instance, **kwargs):
+    # Étudiant, enseignant et devoir d'origine : une note modifiée quitte aussi leurs agrégats
+    # (None si le champ est différé par only/defer)
+    instance._portees_initiales = tuple(
+        instance.__dict__.get(champ) for champ in ('etudiant_id', 'enseignant_id', 'devoir_id')
+    )
+
+
+@receiver(post_save, sender=Note)
+def suivre_note_enregistree(sender, instance, created, **kwargs):
+    portees = (instance.etudiant_id, instance.enseignant_id, instance.devoir_id)
+    if not created and instance._portees_initiales != portees and None not in instance._portees_initiales:
+        _planifier(*instance._portees_initiales)
+    instance._portees_initiales = portees
+    _planifier(*portees)
+
+
+@receiver(post_delete, sender=Note)
+def suivre_note_supprimee(sender, instance, **kwargs):
+    _planifier(instance.etudiant_id, instance.enseignant_id, instance.devoir_id)
+
+
+@receiver(pre_delete, sender=Utilisateur)
+def memoriser_classe_supprimee(sender, instance, **kwargs):
+    # Les notes d'un étudiant supprimé quittent la moyenne de sa classe
+    if instance.classe_id:
+        _attente().classes[instance.id] = instance.classe_id
+
+
+@receiver(post_init, sender=Utilisateur)
+def memoriser_classe(sender, instance, **kwargs):
+    # La classe peut être différée (only/defer) : elle n'est alors pas suivie
+    if 'classe_id' in instance.__dict__:
+        instance._classe_initiale = instance.classe_id
+
+
+@receiver(post_save, sender=Utilisateur)
+def suivre_changement_classe(sender, instance, created, **kwargs):
+    """
+    Les moyennes de classe portent sur les notes des étudiants actuellement
+    dans la classe : quand un étudiant change de classe, ses notes quittent
+    l'agrégat de l'ancienne classe et entrent dans celui de la nouvelle.
+    """
+    if created or '_classe_initiale' not in instance.__dict__:
+        instance._classe_initiale = instance.classe_id
+        return
+    ancienne_classe_id, instance._classe_initiale = instance._classe_initiale, instance.classe_id
+    if ancienne_classe_id == instance.classe_id or not Note.objects.filter(etudiant_id=instance.id).exists():
+        return
+    recalculer_agregats([
+        cle_classe(classe_id) for classe_id in (ancienne_classe_id, instance.classe_id) if classe_id
+    ])
@@ -0,0 +1,115 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .files_attente import marquer_echec, reserver_lot, traiter_lots
+from .models import ApercuFichier
+from .stockage import stockage_dedoublonne
+
+# Repli sans pdfinfo : objets /Type /Page (et non /Pages) du fichier
+OBJET_PAGE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+PAGES_PDFINFO = re.compile(r'^Pages:\s+(\d+)', re.MULTILINE)
+
+
+def est_pdf(nom):
+    return bool(nom) and nom.lower().endswith('.pdf')
+
+
+def demander_apercu(nom):
+    """Met le PDF `nom` dans la file des aperçus s'il n'y est pas déjà"""
+    if est_pdf(nom):
+        ApercuFichier.objects.bulk_create([ApercuFichier(nom=nom)], ignore_conflicts=True)
+
+
+def apercus_par_nom(noms):
+    """Aperçus prêts des fichiers `noms`, en une requête : {nom: ApercuFichier}"""
+    noms = [nom for nom in noms if est_pdf(nom)]
+    if not noms:
+        return {}
+    return {
+        apercu.nom: apercu
+        for apercu in ApercuFichier.objects.filter(nom__in=noms, statut='pret')
+    }
+
+
+def _executer(commande):
+    return subprocess.run(commande, capture_output=True, check=True, timeout=getattr(settings, 'APERCU_DELAI_MAX', 60))
+
+
+def compter_pages(chemin):
+    """Nombre de pages du PDF, avec pdfinfo (poppler) s'il est installé"""
+    pdfinfo = shutil.which(getattr(settings, 'APERCU_PDFINFO', 'pdfinfo'))
+    if pdfinfo:
+        sortie = _executer([pdfinfo, chemin]).stdout.decode('utf-8', 'replace')
+        correspondance = PAGES_PDFINFO.search(sortie)
+        if correspondance:
+            return int(correspondance.group(1))
+    # Approximation : les pages rangées dans des flux d'objets compressés ne sont pas vues
+    with open(chemin, 'rb') as fichier:
+        return len(OBJET_PAGE.findall(fichier.read())) or None
+
+
+def rendre_premiere_page(chemin):
+    """Image PNG de la première page, ou None si pdftoppm (poppler) n'est pas installé"""
+    pdftoppm = shutil.which(getattr(settings, 'APERCU_PDFTOPPM', 'pdftoppm'))
+    if not pdftoppm:
+        return None
+    largeur = getattr(settings, 'APERCU_LARGEUR', 600)
+    with tempfile.TemporaryDirectory() as dossier:
+        racine = os.path.join(dossier, 'apercu')
+        _executer([pdftoppm, '-png', '-f', '1', '-l', '1', '-singlefile', '-scale-to', str(largeur), chemin, racine])
+        with open(racine + '.png', 'rb') as image:
+            return image.read()
+
+
+def generer_apercu(apercu):
+    """Calcule le nombre de pages et l'image de la première page d'un aperçu réservé"""
+    chemin = stockage_dedoublonne.path(apercu.nom)
+    apercu.nb_pages = compter_pages(chemin)
+    image = rendre_premiere_page(chemin)
+    if image is not None:
+        if apercu.image:
+            apercu.image.delete(save=False)
+        apercu.image.save(os.path.basename(apercu.nom)[:-4] + '.png', ContentFile(image), save=False)
+    apercu.statut = 'pret'
+    apercu.derniere_erreur = ''
+    apercu.save()
+
+
+def _marquer_echec(apercu, erreur):
+    marquer_echec(
+        apercu, erreur, getattr(settings, 'APERCU_MAX_TENTATIVES', 3),
+        lambda tentatives: timedelta(minutes=tentatives), definitif=isinstance(erreur, FileNotFoundError),
+    )
+
+
+def traiter_file(taille_lot=None):
+    """
+    Génère les aperçus en attente, lot par lot.
+    Retourne le nombre d'aperçus générés et le nombre d'échecs.
+    """
+    taille_lot = taille_lot or getattr(settings, 'APERCU_TAILLE_LOT', 20)
+    return traiter_lots(
+        lambda: reserver_lot(ApercuFichier.objects.all(), taille_lot), generer_apercu, _marquer_echec,
+    )
+
+
+#----------------------------------Signaux----------------------------------
+# Le dépôt ne fait qu'ajouter une ligne à la file : le PDF est lu par le worker
+@receiver(post_save, sender='cours.Cours')
+def _apercu_cours(sender, instance, **kwargs):
+    demander_apercu(instance.fichier_pdf.name)
+
+
+# Pas de soumissions : leur aperçu n'est affiché nulle part
+@receiver(post_save, sender='devoirs.Devoir')
+def _apercu_devoir(sender, instance, **kwargs):
+    demander_apercu(instance.fichier.name)
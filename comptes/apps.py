@@ -3,3 +3,19 @@ from django.apps import AppConfig
 
 class ComptesConfig(AppConfig):
     name = 'comptes'
+
+    def ready(self):
+        # Enregistre les signaux qui tiennent à jour les compteurs du dashboard
+        from . import statistiques  # noqa: F401
+        # Met les PDF déposés dans la file des aperçus
+        from . import apercus  # noqa: F401
+        # Tient à jour l'espace de stockage utilisé par chaque utilisateur
+        from . import quotas  # noqa: F401
+        # Libère les fichiers des cours, devoirs et soumissions supprimés ou remplacés
+        from . import stockage  # noqa: F401
+        # Invalide les contextes d'accès en cache (classe, inscriptions, classes enseignées)
+        from . import acces  # noqa: F401
+        # Recalcule les moyennes précalculées après chaque écriture de notes (cascades et admin compris)
+        from . import agregats  # noqa: F401
+        # Change la version des modèles dont dépendent les fragments en cache
+        from . import caches  # noqa: F401
@@ -0,0 +1,114 @@
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from .models import Classe, Utilisateur
+from .replicas import sur_primaire
+
+# Modèles versionnés : chaque écriture change leur version et donc la clé des données qui en dépendent
+MODELES_VERSIONNES = (
+    'cours.Cours', 'cours.Inscription', 'devoirs.Devoir', 'devoirs.Soumission', 'comptes.Note', 'comptes.Classe',
+)
+
+
+def cle_version(modele):
+    return f'version:{modele}'
+
+
+def versions(modeles):
+    """Version courante de chaque modèle, en une lecture du cache"""
+    cles = {modele: cle_version(modele) for modele in modeles}
+    lues = cache.get_many(list(cles.values()))
+    # Version initiale horodatée : une version perdue (éviction, redémarrage) ne retombe pas sur d'anciennes clés
+    manquantes = {cle: time.time_ns() for cle in cles.values() if cle not in lues}
+    if manquantes:
+        cache.set_many(manquantes, None)
+        lues.update(manquantes)
+    return {modele: lues[cle] for modele, cle in cles.items()}
+
+
+def _incrementer_versions(modeles):
+    for modele in modeles:
+        try:
+            cache.incr(cle_version(modele))
+        except ValueError:
+            cache.set(cle_version(modele), time.time_ns(), None)
+
+
+def invalider_modele(*modeles):
+    """
+    Change la version des modèles : les données en cache qui en dépendent ne
+    sont plus relues. Dans une transaction, la version change de nouveau après
+    le COMMIT : un fragment calculé entre-temps par une requête concurrente,
+    sur les anciennes lignes, est enregistré sous la version intermédiaire.
+    """
+    _incrementer_versions(modeles)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _incrementer_versions(modeles))
+
+
+def cle_modele(modele, *parties):
+    """Clé versionnée d'une donnée dérivée de `modele`, par ex. cle_modele('cours.Cours', cours.id)"""
+    return ':'.join([modele, str(versions([modele])[modele]), *map(str, parties)])
+
+
+def cle_fragment(nom, utilisateur, modeles, args):
+    etat = versions(modeles)
+    empreinte = hashlib.md5(
+        ':'.join([*(f'{modele}={etat[modele]}' for modele in sorted(modeles)), *map(str, args)]).encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+    # Rôle, utilisateur et classe : deux utilisateurs ne partagent jamais un fragment
+    return f'fragment:{nom}:{utilisateur.role}:{utilisateur.id}:{utilisateur.classe_id}:{empreinte}'
+
+
+def fragment_en_cache(nom, modeles, duree=None):
+    """
+    Met en cache le résultat de `fonction(utilisateur, *args)`, bloc coûteux
+    d'une page (cartes des classes, liste des cours...). La clé porte le rôle,
+    l'utilisateur, sa classe, les arguments et la version des `modeles` : une
+    écriture sur l'un d'eux invalide le fragment. Le résultat doit pouvoir
+    être sérialisé (pickle).
+    """
+    def decorateur(fonction):
+        @wraps(fonction)
+        def enveloppe(utilisateur, *args):
+            cle = cle_fragment(nom, utilisateur, modeles, args)
+            valeur = cache.get(cle)
+            if valeur is None:
+                # Un fragment lu sur un réplica en retard resterait en cache sous la nouvelle version
+                with sur_primaire():
+                    valeur = fonction(utilisateur, *args)
+                cache.set(cle, valeur, getattr(settings, 'FRAGMENTS_CACHE_DUREE', 600) if duree is None else duree)
+            return valeur
+        enveloppe.sans_cache = fonction
+        return enveloppe
+    return decorateur
+
+
+#----------------------------------Signaux----------------------------------
+def _changer_version(sender, **kwargs):
+    invalider_modele(sender._meta.label)
+
+
+for _modele in MODELES_VERSIONNES:
+    post_save.connect(_changer_version, sender=_modele, dispatch_uid=f'caches_save_{_modele}')
+    post_delete.connect(_changer_version, sender=_modele, dispatch_uid=f'caches_delete_{_modele}')
+
+
+@receiver(m2m_changed, sender=Classe.enseignants.through)
+def _version_enseignants_classe(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalider_modele('comptes.Classe')
+
+
+@receiver(post_save, sender=Utilisateur)
+@receiver(post_delete, sender=Utilisateur)
+def _version_effectifs(sender, instance, update_fields=None, **kwargs):
+    # Les effectifs des classes changent avec les étudiants (la connexion n'enregistre que last_login)
+    if instance.role == 'etudiant' and (update_fields is None or 'classe' in update_fields):
+        invalider_modele('comptes.Classe')
@@ -0,0 +1,188 @@
+import http.cookiejar
+import math
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, BrokenBarrierError
+
+
+class _SansRedirection(urllib.request.HTTPRedirectHandler):
+    """Chaque redirection est mesurée comme une réponse, sans charger la page suivante"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClientHttp:
+    """Navigateur minimal d'un utilisateur virtuel : cookies de session et jeton CSRF"""
+
+    def __init__(self, url_base, nom_cookie_csrf='csrftoken', delai=30):
+        self.url_base = url_base.rstrip('/')
+        self.nom_cookie_csrf = nom_cookie_csrf
+        self.delai = delai
+        self.cookies = http.cookiejar.CookieJar()
+        self.ouvreur = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _SansRedirection)
+
+    def cookie(self, nom):
+        return next((cookie.value for cookie in self.cookies if cookie.name == nom), None)
+
+    def requete(self, chemin, donnees=None, fichiers=None):
+        """
+        GET (ou POST de `donnees` avec le jeton CSRF ; multipart si `fichiers`
+        {champ: (nom, octets)}). Retourne le statut (0 si injoignable) et la durée en secondes.
+        """
+        url = self.url_base + chemin
+        corps = None
+        entetes = {'Referer': url}
+        if donnees is not None or fichiers:
+            donnees = {'csrfmiddlewaretoken': self.cookie(self.nom_cookie_csrf) or '', **(donnees or {})}
+            if fichiers:
+                corps, entetes['Content-Type'] = _multipart(donnees, fichiers)
+            else:
+                corps = urllib.parse.urlencode(donnees).encode()
+        demande = urllib.request.Request(url, data=corps, headers=entetes)
+        debut = time.perf_counter()
+        try:
+            with self.ouvreur.open(demande, timeout=self.delai) as reponse:
+                reponse.read()
+                statut = reponse.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            statut = e.code
+        except OSError:
+            statut = 0
+        return statut, time.perf_counter() - debut
+
+
+def _multipart(donnees, fichiers):
+    """Corps multipart/form-data d'un formulaire avec fichiers, et son Content-Type"""
+    separateur = uuid.uuid4().hex
+    parties = []
+    for nom, valeur in donnees.items():
+        parties.append(
+            f'--{separateur}\r\nContent-Disposition: form-data; name="{nom}"\r\n\r\n{valeur}\r\n'.encode()
+        )
+    for champ, (nom_fichier, octets) in fichiers.items():
+        parties.append(
+            f'--{separateur}\r\nContent-Disposition: form-data; name="{champ}"; filename="{nom_fichier}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + octets + b'\r\n'
+        )
+    parties.append(f'--{separateur}--\r\n'.encode())
+    return b''.join(parties), f'multipart/form-data; boundary={separateur}'
+
+
+def parcourir(url_base, utilisateur, iterations, fin=None, pause=0, graine=None, nom_cookie_csrf='csrftoken'):
+    """
+    Rejoue le parcours d'un utilisateur virtuel : connexion, puis `iterations`
+    passages sur ses pages (une page tirée au hasard parmi les candidates de
+    chaque étape). Retourne les mesures (point, statut, durée).
+    """
+    alea = random.Random(graine)
+    client = ClientHttp(url_base, nom_cookie_csrf)
+    mesures = []
+    statut, duree = client.requete(utilisateur['connexion'])
+    mesures.append(('connexion (GET)', statut, duree))
+    statut, duree = client.requete(utilisateur['connexion'], {'username': utilisateur['username'], 'password': utilisateur['mot_de_passe']})
+    # Une connexion réussie redirige vers le dashboard ; sinon la page est réaffichée
+    mesures.append(('connexion (POST)', statut if statut == 302 else 401, duree))
+    if statut != 302:
+        return mesures
+
+    for _ in range(iterations):
+        for point, chemins in utilisateur['parcours']:
+            if fin is not None and time.monotonic() >= fin:
+                return mesures
+            statut, duree = client.requete(alea.choice(chemins))
+            mesures.append((point, statut, duree))
+            if pause:
+                # Temps de lecture de la page, tiré entre 0 et 2 x pause
+                time.sleep(alea.uniform(0, 2 * pause))
+    return mesures
+
+
+def executer_charge(url_base, utilisateurs, concurrence=None, iterations=5, duree_max=None, pause=0, graine=None,
+                    nom_cookie_csrf='csrftoken'):
+    """
+    Fait parcourir le site à tous les utilisateurs virtuels, `concurrence` à la fois.
+    Retourne toutes les mesures et la durée totale en secondes.
+    """
+    debut = time.monotonic()
+    fin = debut + duree_max if duree_max else None
+    with ThreadPoolExecutor(max_workers=concurrence or len(utilisateurs) or 1) as executeur:
+        resultats = executeur.map(
+            lambda element: parcourir(
+                url_base, element[1], iterations, fin, pause,
+                None if graine is None else graine + element[0], nom_cookie_csrf,
+            ),
+            enumerate(utilisateurs),
+        )
+        mesures = [mesure for resultat in resultats for mesure in resultat]
+    return mesures, time.monotonic() - debut
+
+
+def deposer_en_rafale(url_base, depots, envois=1, nom_cookie_csrf='csrftoken', delai=120):
+    """
+    Rush avant une deadline : chaque étudiant virtuel se connecte, puis tous
+    envoient leur soumission au même instant (`envois` fois chacun pour
+    vérifier que les doublons sont écartés). `depots` : dictionnaires
+    username, mot_de_passe, connexion, chemin et fichier (nom, octets).
+    Retourne les mesures des soumissions seules et la durée de la rafale.
+    """
+    barriere = Barrier(len(depots))
+    debuts = []
+
+    def deposer(depot):
+        client = ClientHttp(url_base, nom_cookie_csrf, delai)
+        client.requete(depot['connexion'])
+        statut, _ = client.requete(depot['connexion'], {'username': depot['username'], 'password': depot['mot_de_passe']})
+        try:
+            # Un étudiant dont la connexion a échoué rejoint quand même la barrière pour ne pas bloquer les autres
+            barriere.wait(timeout=delai * 10)
+        except BrokenBarrierError:
+            pass
+        debuts.append(time.monotonic())
+        if statut != 302:
+            return [('connexion (POST)', 401, 0)]
+        mesures = []
+        for _ in range(envois):
+            statut, duree = client.requete(depot['chemin'], fichiers={'fichier': depot['fichier']})
+            mesures.append(('soumission', statut, duree))
+        return mesures
+
+    with ThreadPoolExecutor(max_workers=len(depots) or 1) as executeur:
+        resultats = list(executeur.map(deposer, depots))
+    fin = time.monotonic()
+    mesures = [mesure for resultat in resultats for mesure in resultat]
+    return mesures, fin - min(debuts, default=fin)
+
+
+def centile(valeurs_triees, pourcentage):
+    """Centile par la méthode du rang le plus proche"""
+    if not valeurs_triees:
+        return None
+    rang = max(1, math.ceil(pourcentage / 100 * len(valeurs_triees)))
+    return valeurs_triees[rang - 1]
+
+
+def rapport(mesures):
+    """Par point d'accès : nombre de requêtes, d'erreurs (statut 0 ou >= 400), p50/p95/p99 et maximum en ms"""
+    par_point = {}
+    for point, statut, duree in mesures:
+        par_point.setdefault(point, []).append((statut, duree))
+    lignes = []
+    for point, valeurs in sorted(par_point.items()):
+        durees = sorted(duree * 1000 for _, duree in valeurs)
+        lignes.append({
+            'point': point,
+            'requetes': len(valeurs),
+            'erreurs': sum(1 for statut, _ in valeurs if not 200 <= statut < 400),
+            'p50': centile(durees, 50),
+            'p95': centile(durees, 95),
+            'p99': centile(durees, 99),
+            'max': durees[-1],
+        })
+    return lignes
@@ -0,0 +1,137 @@
+import logging
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.template.loader import get_template
+from django.utils import timezone
+from .files_attente import marquer_echec, reserver_lot
+from .models import EmailSortant, Invitation
+
+logger = logging.getLogger(__name__)
+
+# Libellés des rôles tels qu'ils apparaissent dans les emails
+ROLES_LIBELLES = {
+    'enseignant': 'enseignant',
+    'etudiant': 'étudiant',
+}
+
+
+def expediteur():
+    """Adresse d'expédition des emails"""
+    return getattr(settings, 'DEFAULT_FROM_EMAIL', None) or 'noreply@akalan.com'
+
+
+def construire_email_invitation(invitation, template=None):
+    """
+    Prépare l'email d'invitation sans l'enregistrer dans la file.
+    Un template déjà chargé peut être fourni pour les envois en masse.
+    """
+    template = template or get_template('admin/email_invitation.html')
+    role = ROLES_LIBELLES.get(invitation.role, invitation.role)
+    lien_invitation = f"{settings.SITE_URL}/admin/accepter-invitation/{invitation.token}/"
+    message_html = template.render({
+        'invitation': invitation,
+        'lien': lien_invitation,
+        'role': role,
+    })
+    return EmailSortant(
+        destinataire=invitation.email,
+        sujet=f"Invitation à rejoindre AKalan en tant qu'{role}",
+        message=f"Vous avez été invité à rejoindre AKalan en tant qu'{role}. Cliquez sur ce lien pour créer votre compte: {lien_invitation}",
+        message_html=message_html,
+        invitation=invitation,
+    )
+
+
+def mettre_invitation_en_file(invitation):
+    """Ajoute l'email d'invitation à la file d'envoi et retourne immédiatement"""
+    email = construire_email_invitation(invitation)
+    email.save()
+    return email
+
+
+def delai_nouvelle_tentative(tentatives):
+    """Délai exponentiel avant la prochaine tentative d'envoi"""
+    delai_base = getattr(settings, 'EMAIL_FILE_DELAI_BASE', 60)
+    return timedelta(seconds=delai_base * 2 ** max(tentatives - 1, 0))
+
+
+def _envoyer(email, connection):
+    message = EmailMultiAlternatives(
+        email.sujet,
+        email.message,
+        expediteur(),
+        [email.destinataire],
+        connection=connection,
+    )
+    if email.message_html:
+        message.attach_alternative(email.message_html, 'text/html')
+    try:
+        message.send()
+    except SMTPServerDisconnected:
+        # Le serveur a fermé la connexion entre deux messages : on la rouvre une fois
+        connection.close()
+        connection.open()
+        message.send()
+
+
+def _marquer_echec(email, erreur):
+    max_tentatives = getattr(settings, 'EMAIL_FILE_MAX_TENTATIVES', 5)
+    if marquer_echec(email, erreur, max_tentatives, delai_nouvelle_tentative) and email.invitation_id:
+        Invitation.objects.filter(id=email.invitation_id).update(statut_envoi='echec')
+
+
+def envoyer_lot(emails, connection):
+    """
+    Envoie un lot d'emails sur une connexion SMTP déjà ouverte.
+    Retourne le nombre d'emails envoyés et le nombre d'échecs.
+    """
+    envoyes = []
+    echecs = 0
+    for email in emails:
+        try:
+            _envoyer(email, connection)
+        except Exception as e:
+            logger.exception("Échec de l'envoi de l'email %s", email.id)
+            _marquer_echec(email, e)
+            echecs += 1
+        else:
+            envoyes.append(email)
+
+    if envoyes:
+        now = timezone.now()
+        EmailSortant.objects.filter(id__in=[email.id for email in envoyes]).update(
+            statut='envoye',
+            date_envoi=now,
+            tentatives=F('tentatives') + 1,
+        )
+        invitation_ids = [email.invitation_id for email in envoyes if email.invitation_id]
+        if invitation_ids:
+            Invitation.objects.filter(id__in=invitation_ids).update(
+                statut_envoi='envoyee',
+                date_envoi=now,
+            )
+    return len(envoyes), echecs
+
+
+def traiter_file(taille_lot=None):
+    """
+    Vide la file d'attente en réutilisant une seule connexion SMTP.
+    Retourne le nombre d'emails envoyés et le nombre d'échecs.
+    """
+    taille_lot = taille_lot or getattr(settings, 'EMAIL_FILE_TAILLE_LOT', 50)
+    total_envoyes = 0
+    total_echecs = 0
+    emails = reserver_lot(EmailSortant.objects.all(), taille_lot)
+    if not emails:
+        return total_envoyes, total_echecs
+
+    with get_connection(fail_silently=False) as connection:
+        while emails:
+            envoyes, echecs = envoyer_lot(emails, connection)
+            total_envoyes += envoyes
+            total_echecs += echecs
+            emails = reserver_lot(EmailSortant.objects.all(), taille_lot)
+    return total_envoyes, total_echecs
@@ -0,0 +1,221 @@
+import csv
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+from django.utils import timezone
+from cours.models import Inscription
+from devoirs.models import Soumission
+from .models import Note
+
+# Nombre de lignes lues par requête pendant un export
+TAILLE_LOT_EXPORT = 2000
+
+# Colonnes de chaque export : (en-tête, champ de values_list)
+EXPORTS = {
+    'notes': (Note, [
+        ('Étudiant', 'etudiant__username'),
+        ('Nom', 'etudiant__last_name'),
+        ('Prénom', 'etudiant__first_name'),
+        ('Classe', 'etudiant__classe__nom'),
+        ('Cours', 'devoir__cours__titre'),
+        ('Devoir', 'devoir__titre'),
+        ('Enseignant', 'enseignant__username'),
+        ('Note', 'note'),
+        ('Commentaire', 'commentaire'),
+        ("Date d'attribution", 'date_attribution'),
+    ]),
+    'soumissions': (Soumission, [
+        ('Étudiant', 'etudiant__username'),
+        ('Nom', 'etudiant__last_name'),
+        ('Prénom', 'etudiant__first_name'),
+        ('Classe', 'etudiant__classe__nom'),
+        ('Cours', 'devoir__cours__titre'),
+        ('Devoir', 'devoir__titre'),
+        ('Deadline', 'devoir__deadline'),
+        ('Date de soumission', 'date_soumission'),
+        ('En retard', 'en_retard'),
+        ('Fichier', 'fichier'),
+    ]),
+    'inscriptions': (Inscription, [
+        ('Étudiant', 'etudiant__username'),
+        ('Nom', 'etudiant__last_name'),
+        ('Prénom', 'etudiant__first_name'),
+        ('Classe', 'etudiant__classe__nom'),
+        ('Cours', 'cours__titre'),
+        ('Enseignant', 'cours__enseignant__username'),
+        ("Date d'inscription", 'date_inscription'),
+    ]),
+}
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def entetes_export(nom):
+    return [entete for entete, _ in EXPORTS[nom][1]]
+
+
+def lignes_export(nom, taille_lot=TAILLE_LOT_EXPORT):
+    """
+    Parcourt les lignes d'un export par lots de `taille_lot`, triés par id.
+
+    Chaque lot est une requête values_list reprenant après le dernier id lu :
+    la mémoire reste constante même avec MySQL, dont le client charge tout le
+    résultat d'une requête (pas de curseur serveur pour .iterator()).
+    """
+    modele, colonnes = EXPORTS[nom]
+    champs = [champ for _, champ in colonnes]
+    queryset = modele.objects.order_by('id').values_list('id', *champs)
+    dernier_id = 0
+    while True:
+        lot = list(queryset.filter(id__gt=dernier_id)[:taille_lot])
+        for ligne in lot:
+            yield ligne[1:]
+        if len(lot) < taille_lot:
+            return
+        dernier_id = lot[-1][0]
+
+
+def _texte(valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, bool):
+        return 'oui' if valeur else 'non'
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).strftime('%Y-%m-%d %H:%M')
+    return str(valeur)
+
+
+class TamponFlux:
+    """Pseudo-fichier qui accumule ce qui y est écrit jusqu'à ce qu'on le vide"""
+
+    def __init__(self):
+        self.morceaux = []
+        self.position = 0
+
+    def write(self, donnees):
+        self.morceaux.append(bytes(donnees))
+        self.position += len(donnees)
+        return len(donnees)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def vider(self):
+        donnees = b''.join(self.morceaux)
+        self.morceaux = []
+        return donnees
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : write() retourne la ligne au lieu de l'écrire"""
+
+    def write(self, valeur):
+        return valeur
+
+
+def flux_csv(entetes, lignes):
+    """Génère un CSV (séparateur ';', UTF-8 avec BOM pour Excel) ligne par ligne"""
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield ('\ufeff' + writer.writerow(entetes)).encode('utf-8')
+    for ligne in lignes:
+        yield writer.writerow([_texte(valeur) for valeur in ligne]).encode('utf-8')
+
+
+def _nom_colonne(index):
+    nom = ''
+    index += 1
+    while index:
+        index, reste = divmod(index - 1, 26)
+        nom = chr(65 + reste) + nom
+    return nom
+
+
+def _cellule_xlsx(reference, valeur):
+    if isinstance(valeur, (int, float, Decimal)) and not isinstance(valeur, bool):
+        return f'<c r="{reference}"><v>{valeur}</v></c>'
+    texte = escape(_texte(valeur))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{texte}</t></is></c>'
+
+
+def _ligne_xlsx(numero, valeurs):
+    cellules = ''.join(
+        _cellule_xlsx(f'{_nom_colonne(index)}{numero}', valeur) for index, valeur in enumerate(valeurs)
+    )
+    return f'<row r="{numero}">{cellules}</row>'.encode('utf-8')
+
+
+FICHIERS_XLSX = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def flux_xlsx(entetes, lignes, lignes_par_morceau=500):
+    """
+    Génère un classeur XLSX au fil de l'eau.
+
+    La feuille est écrite directement dans une archive zip non positionnable
+    (descripteurs de données) : chaque groupe de lignes compressé est envoyé
+    au client sans attendre la fin de l'export.
+    """
+    tampon = TamponFlux()
+    with zipfile.ZipFile(tampon, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for nom, contenu in FICHIERS_XLSX.items():
+            archive.writestr(nom, contenu)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as feuille:
+            feuille.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            feuille.write(_ligne_xlsx(1, entetes))
+            for numero, ligne in enumerate(lignes, start=2):
+                feuille.write(_ligne_xlsx(numero, ligne))
+                if numero % lignes_par_morceau == 0:
+                    yield tampon.vider()
+            feuille.write(b'</sheetData></worksheet>')
+    yield tampon.vider()
+
+
+def flux_export(nom, format_export='csv'):
+    """Flux d'octets de l'export demandé"""
+    lignes = lignes_export(nom)
+    if format_export == 'xlsx':
+        return flux_xlsx(entetes_export(nom), lignes)
+    return flux_csv(entetes_export(nom), lignes)
+
+
+def nom_fichier_export(nom, format_export='csv'):
+    return f"{nom}_{timezone.localdate():%Y-%m-%d}.{FORMATS[format_export][1]}"
@@ -0,0 +1,72 @@
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Durée pendant laquelle un lot réservé par un worker est invisible aux autres workers
+DUREE_RESERVATION = timedelta(minutes=5)
+
+
+def reserver_lot(queryset, taille_lot):
+    """
+    Réserve pour ce worker un lot d'éléments en attente d'une file (modèle avec
+    statut, tentatives, prochaine_tentative et derniere_erreur). Les lignes
+    verrouillées par un autre worker sont sautées (skip_locked).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        elements = list(
+            queryset.select_for_update(skip_locked=True)
+            .filter(statut='en_attente', prochaine_tentative__lte=now)
+            .order_by('prochaine_tentative')[:taille_lot]
+        )
+        if elements:
+            queryset.model.objects.filter(id__in=[element.id for element in elements]).update(
+                prochaine_tentative=now + DUREE_RESERVATION
+            )
+    return elements
+
+
+def marquer_echec(element, erreur, max_tentatives, delai, definitif=False):
+    """
+    Enregistre l'échec d'un élément : nouvelle tentative après `delai(tentatives)`,
+    ou statut 'echec' au bout de `max_tentatives` (ou tout de suite avec `definitif`).
+    Retourne True si l'élément ne sera plus retenté.
+    """
+    element.tentatives += 1
+    element.derniere_erreur = str(erreur)
+    if definitif or element.tentatives >= max_tentatives:
+        element.statut = 'echec'
+    else:
+        element.prochaine_tentative = timezone.now() + delai(element.tentatives)
+    champs = ['tentatives', 'derniere_erreur', 'statut', 'prochaine_tentative']
+    champs += [champ.name for champ in element._meta.concrete_fields if getattr(champ, 'auto_now', False)]
+    element.save(update_fields=champs)
+    return element.statut == 'echec'
+
+
+def traiter_lots(reserver, traiter, echec):
+    """
+    Boucle commune des workers : réserve un lot avec `reserver()`, traite
+    chaque élément avec `traiter(element)` et, en cas d'exception, la
+    journalise puis appelle `echec(element, erreur)`. S'arrête quand la file
+    est vide. Retourne le nombre d'éléments traités et le nombre d'échecs
+    (un élément pour lequel `traiter` retourne False, laissé à un autre
+    worker, n'est pas compté).
+    """
+    traites = echecs = 0
+    lot = reserver()
+    while lot:
+        for element in lot:
+            try:
+                traite = traiter(element)
+            except Exception as e:
+                logger.exception('Échec du traitement de %r', element)
+                echec(element, e)
+                echecs += 1
+            else:
+                traites += traite is not False
+        lot = reserver()
+    return traites, echecs
@@ -0,0 +1,204 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from cours.models import Cours, Inscription
+from devoirs.models import Devoir, Soumission
+from .acces import invalider_acces
+from .agregats import reconstruire_agregats
+from .caches import MODELES_VERSIONNES, invalider_modele
+from .models import Utilisateur, Classe, Invitation, Note, ApercuFichier
+from .statistiques import recalculer_statistiques
+from .stockage import stockage_dedoublonne
+
+TAILLE_LOT_GENERATION = 1000
+
+# PDF d'une page déposé une seule fois : les autres fichiers générés en sont des références
+PDF_GENERE = (
+    b'%PDF-1.4\n'
+    b'1 0 obj <</Type /Catalog /Pages 2 0 R>> endobj\n'
+    b'2 0 obj <</Type /Pages /Kids [3 0 R] /Count 1>> endobj\n'
+    b'3 0 obj <</Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]>> endobj\n'
+    b'trailer <</Root 1 0 R>>\n%%EOF\n'
+)
+
+
+def _fichiers(noms):
+    """Dépose le PDF sous le premier nom et rattache les suivants au même contenu"""
+    if not noms:
+        return []
+    premier = stockage_dedoublonne.save(noms[0], ContentFile(PDF_GENERE))
+    return [premier] + stockage_dedoublonne.dupliquer(premier, noms[1:])
+
+
+def generer_etablissement(nb_classes, nb_enseignants, nb_etudiants, cours_par_classe=3, devoirs_par_cours=4,
+                          taux_soumission=0.8, taux_notes=0.7, nb_invitations=0, prefixe='synth',
+                          mot_de_passe='motdepasse', graine=None, taille_lot=TAILLE_LOT_GENERATION):
+    """
+    Crée un établissement fictif pour les tests de charge : classes,
+    enseignants, étudiants, cours, devoirs, soumissions avec un petit PDF,
+    notes et invitations en attente.
+
+    Les lignes sont insérées par bulk_create, en un nombre de requêtes qui
+    dépend du nombre de lots et non du nombre de lignes. Les signaux ne sont
+    donc pas envoyés : les inscriptions sont créées directement, puis les
+    compteurs, les agrégats de notes et les espaces utilisés sont recalculés.
+    Retourne le nombre d'objets créés par modèle.
+    """
+    if nb_classes < 1 or nb_enseignants < 1:
+        raise ValueError('Il faut au moins une classe et un enseignant.')
+    if Utilisateur.objects.filter(username__startswith=f'{prefixe}_').exists():
+        raise ValueError(f'Des comptes "{prefixe}_..." existent déjà : choisissez un autre préfixe.')
+
+    alea = random.Random(graine)
+    now = timezone.now()
+    # Un seul hachage (volontairement coûteux) pour tous les comptes générés
+    mot_de_passe_chiffre = make_password(mot_de_passe)
+
+    with transaction.atomic():
+        # Les clés primaires ne sont pas relues après bulk_create (MySQL) : les lignes sont rechargées
+        Classe.objects.bulk_create(
+            [Classe(nom=f'{prefixe} classe {i + 1}', description='Classe générée') for i in range(nb_classes)],
+            batch_size=taille_lot,
+        )
+        classes = list(Classe.objects.filter(nom__startswith=f'{prefixe} classe ').order_by('id'))
+
+        Utilisateur.objects.bulk_create(
+            [
+                Utilisateur(username=f'{prefixe}_enseignant_{i + 1}', email=f'{prefixe}.enseignant{i + 1}@example.com',
+                            password=mot_de_passe_chiffre, role='enseignant')
+                for i in range(nb_enseignants)
+            ] + [
+                Utilisateur(username=f'{prefixe}_etudiant_{i + 1}', email=f'{prefixe}.etudiant{i + 1}@example.com',
+                            password=mot_de_passe_chiffre, role='etudiant', classe=classes[i % nb_classes])
+                for i in range(nb_etudiants)
+            ],
+            batch_size=taille_lot,
+        )
+        comptes = Utilisateur.objects.filter(username__startswith=f'{prefixe}_').order_by('id')
+        enseignants = [compte for compte in comptes if compte.role == 'enseignant']
+        etudiants_par_classe = {}
+        for compte in comptes:
+            if compte.role == 'etudiant':
+                etudiants_par_classe.setdefault(compte.classe_id, []).append(compte)
+
+        # Deux enseignants par classe (un seul s'il n'y en a qu'un)
+        enseignants_par_classe = {}
+        for i, classe in enumerate(classes):
+            paire = [enseignants[i % nb_enseignants], enseignants[(i + 1) % nb_enseignants]]
+            enseignants_par_classe[classe.id] = paire[:1] if nb_enseignants == 1 else paire
+        Classe.enseignants.through.objects.bulk_create(
+            [
+                Classe.enseignants.through(classe_id=classe_id, utilisateur_id=enseignant.id)
+                for classe_id, enseignants_classe in enseignants_par_classe.items()
+                for enseignant in enseignants_classe
+            ],
+            batch_size=taille_lot,
+        )
+
+        cours_a_creer = []
+        for i, classe in enumerate(classes):
+            for k in range(cours_par_classe):
+                enseignants_classe = enseignants_par_classe[classe.id]
+                cours_a_creer.append(Cours(
+                    titre=f'{prefixe} cours {i + 1}.{k + 1}', description='Cours généré',
+                    enseignant=enseignants_classe[k % len(enseignants_classe)], classe=classe,
+                ))
+        noms = _fichiers([f'cours/pdf/{prefixe}_cours_{i + 1}.pdf' for i in range(len(cours_a_creer))])
+        for cours, nom in zip(cours_a_creer, noms):
+            cours.fichier_pdf.name = nom
+        Cours.objects.bulk_create(cours_a_creer, batch_size=taille_lot)
+        cours_generes = list(Cours.objects.filter(classe__in=classes).order_by('id'))
+        ApercuFichier.objects.bulk_create(
+            [ApercuFichier(nom=cours.fichier_pdf.name) for cours in cours_generes],
+            batch_size=taille_lot, ignore_conflicts=True,
+        )
+
+        # Inscriptions que le signal de création de cours aurait faites
+        Inscription.objects.bulk_create(
+            [
+                Inscription(cours=cours, etudiant=etudiant)
+                for cours in cours_generes
+                for etudiant in etudiants_par_classe.get(cours.classe_id, [])
+            ],
+            batch_size=taille_lot,
+        )
+
+        Devoir.objects.bulk_create(
+            [
+                Devoir(
+                    cours=cours, titre=f'{prefixe} devoir {cours.id}.{d + 1}', description='Devoir généré',
+                    # Échéances réparties sur deux mois autour d'aujourd'hui
+                    deadline=now + timedelta(hours=alea.randint(-30 * 24, 30 * 24)),
+                )
+                for cours in cours_generes
+                for d in range(devoirs_par_cours)
+            ],
+            batch_size=taille_lot,
+        )
+        devoirs = list(Devoir.objects.filter(cours__in=cours_generes).select_related('cours').order_by('id'))
+
+        soumissions = []
+        notes = []
+        for devoir in devoirs:
+            for etudiant in etudiants_par_classe.get(devoir.cours.classe_id, []):
+                if alea.random() >= taux_soumission:
+                    continue
+                passe = devoir.deadline < now
+                soumissions.append(Soumission(devoir=devoir, etudiant=etudiant, en_retard=passe and alea.random() < 0.2))
+                if passe and alea.random() < taux_notes:
+                    notes.append(Note(
+                        etudiant=etudiant, enseignant_id=devoir.cours.enseignant_id, devoir=devoir,
+                        note=Decimal(alea.randint(0, 80)) / 4,
+                    ))
+        noms = _fichiers([
+            f'soumissions/{prefixe}_{soumission.devoir_id}_{soumission.etudiant_id}.pdf' for soumission in soumissions
+        ])
+        for soumission, nom in zip(soumissions, noms):
+            soumission.fichier.name = nom
+        Soumission.objects.bulk_create(soumissions, batch_size=taille_lot)
+        Note.objects.bulk_create(notes, batch_size=taille_lot)
+
+        # Invitations déjà envoyées : aucune ne passe dans la file des emails
+        invitations = []
+        for i in range(nb_invitations):
+            role = 'enseignant' if i % 5 == 4 else 'etudiant'
+            invitations.append(Invitation(
+                email=f'{prefixe}.invite{i + 1}@example.com', role=role,
+                classe=alea.choice(classes) if role == 'etudiant' else None,
+                token=get_random_string(64), date_expiration=now + timedelta(days=7),
+                statut_envoi='envoyee', date_envoi=now, cree_par=None,
+            ))
+        Invitation.objects.bulk_create(invitations, batch_size=taille_lot)
+
+        # Données dérivées normalement tenues à jour par les signaux
+        recalculer_statistiques()
+        reconstruire_agregats()
+        espace = {}
+        for proprietaire_id in [cours.enseignant_id for cours in cours_generes] + [s.etudiant_id for s in soumissions]:
+            espace[proprietaire_id] = espace.get(proprietaire_id, 0) + len(PDF_GENERE)
+        Utilisateur.objects.bulk_update(
+            [Utilisateur(id=utilisateur_id, espace_utilise=octets) for utilisateur_id, octets in espace.items()],
+            ['espace_utilise'], batch_size=taille_lot,
+        )
+        invalider_acces(
+            [enseignant.id for enseignant in enseignants]
+            + [etudiant.id for etudiants in etudiants_par_classe.values() for etudiant in etudiants]
+        )
+        invalider_modele(*MODELES_VERSIONNES)
+
+    return {
+        'classes': len(classes),
+        'enseignants': len(enseignants),
+        'etudiants': sum(len(etudiants) for etudiants in etudiants_par_classe.values()),
+        'cours': len(cours_generes),
+        'inscriptions': sum(len(etudiants_par_classe.get(cours.classe_id, [])) for cours in cours_generes),
+        'devoirs': len(devoirs),
+        'soumissions': len(soumissions),
+        'notes': len(notes),
+        'invitations': len(invitations),
+    }
@@ -0,0 +1,126 @@
+import csv
+import io
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from .emails import construire_email_invitation
+from .models import Utilisateur, Classe, Invitation, EmailSortant
+
+# Rôles acceptés dans la colonne "role" du fichier CSV
+ROLES_CSV = {
+    'enseignant': 'enseignant',
+    'etudiant': 'etudiant',
+    'étudiant': 'etudiant',
+}
+
+TAILLE_LOT_IMPORT = 500
+
+
+def lire_csv(contenu):
+    """Lit un fichier CSV (séparateur ',' ou ';') avec les colonnes email, role et classe"""
+    if isinstance(contenu, bytes):
+        contenu = contenu.decode('utf-8-sig')
+    try:
+        dialecte = csv.Sniffer().sniff(contenu[:2048], delimiters=',;')
+    except csv.Error:
+        dialecte = csv.excel
+    lecteur = csv.DictReader(io.StringIO(contenu), dialect=dialecte)
+    lignes = []
+    for ligne in lecteur:
+        ligne = {(cle or '').strip().lower(): (valeur or '').strip() for cle, valeur in ligne.items()}
+        lignes.append({
+            'email': ligne.get('email', ''),
+            'role': ligne.get('role', '') or ligne.get('rôle', ''),
+            'classe': ligne.get('classe', ''),
+        })
+    return lignes
+
+
+def importer_invitations(lignes, cree_par=None):
+    """
+    Crée les invitations d'un import CSV et met leurs emails en file d'attente.
+
+    Toutes les lignes sont validées avec un nombre constant de requêtes, les
+    invitations et les emails sont insérés avec bulk_create et le template de
+    l'email n'est chargé qu'une seule fois. Retourne le résultat de chaque ligne.
+    """
+    emails = {ligne['email'] for ligne in lignes if ligne['email']}
+    noms_classes = {ligne['classe'] for ligne in lignes if ligne['classe']}
+
+    emails_utilises = set(
+        Utilisateur.objects.filter(email__in=emails).values_list('email', flat=True)
+    )
+    invitations_en_attente = set(
+        Invitation.objects.filter(email__in=emails, statut='en_attente').values_list('email', 'role')
+    )
+    classes = {classe.nom: classe for classe in Classe.objects.filter(nom__in=noms_classes)}
+
+    resultats = []
+    invitations = []
+    vus = set()
+    expiration = timezone.now() + timedelta(days=7)
+    for numero, ligne in enumerate(lignes, start=2):  # La ligne 1 est l'en-tête
+        resultat = {'ligne': numero, 'email': ligne['email'], 'statut': 'erreur', 'message': ''}
+        resultats.append(resultat)
+
+        role = ROLES_CSV.get(ligne['role'].lower())
+        try:
+            validate_email(ligne['email'])
+        except ValidationError:
+            resultat['message'] = 'Email invalide.'
+            continue
+        if not role:
+            resultat['message'] = f'Rôle inconnu : "{ligne["role"]}".'
+            continue
+        if ligne['email'] in vus:
+            resultat['message'] = 'Email en double dans le fichier.'
+            continue
+        if ligne['email'] in emails_utilises:
+            resultat['message'] = 'Cet email est déjà utilisé.'
+            continue
+        if (ligne['email'], role) in invitations_en_attente:
+            resultat['statut'] = 'ignore'
+            resultat['message'] = 'Une invitation a déjà été envoyée à cet email.'
+            continue
+
+        classe = None
+        if ligne['classe'] and role == 'etudiant':
+            classe = classes.get(ligne['classe'])
+            if classe is None:
+                resultat['message'] = f'Classe inconnue : "{ligne["classe"]}".'
+                continue
+
+        vus.add(ligne['email'])
+        invitations.append(Invitation(
+            email=ligne['email'],
+            role=role,
+            classe=classe,
+            token=get_random_string(64),
+            date_expiration=expiration,
+            cree_par=cree_par,
+        ))
+        resultat['statut'] = 'cree'
+        resultat['message'] = 'Invitation créée, email en file d\'attente.'
+
+    if not invitations:
+        return resultats
+
+    with transaction.atomic():
+        Invitation.objects.bulk_create(invitations, batch_size=TAILLE_LOT_IMPORT)
+        # MySQL ne renvoie pas les identifiants après bulk_create : on les relit via les tokens
+        ids = dict(
+            Invitation.objects.filter(token__in=[invitation.token for invitation in invitations])
+            .values_list('token', 'id')
+        )
+        template = get_template('admin/email_invitation.html')
+        emails_sortants = []
+        for invitation in invitations:
+            invitation.id = ids[invitation.token]
+            emails_sortants.append(construire_email_invitation(invitation, template))
+        EmailSortant.objects.bulk_create(emails_sortants, batch_size=TAILLE_LOT_IMPORT)
+
+    return resultats
@@ -0,0 +1,13 @@
+from comptes.management.file_attente import CommandeFile
+from devoirs.images import traiter_file
+
+
+class Command(CommandeFile):
+    help = 'Convertit les photos soumises (HEIC, JPEG...) en variante web réduite'
+    aide_lot = 'Nombre de photos réservées par lot'
+
+    def passage(self, taille_lot):
+        converties, echecs = traiter_file(taille_lot)
+        if converties or echecs:
+            return f'{converties} photo(s) convertie(s), {echecs} échec(s).'
+        return ''
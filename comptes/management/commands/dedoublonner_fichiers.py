@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from comptes.stockage import dedoublonner_fichiers_existants
+
+
+class Command(BaseCommand):
+    help = 'Rattache les fichiers déjà déposés au stockage par contenu et remplace les doublons par des liens'
+
+    def handle(self, *args, **options):
+        resultat = dedoublonner_fichiers_existants()
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultat['fichiers']} fichier(s) rattaché(s), "
+            f"{resultat['octets_liberes'] / (1024 * 1024):.1f} Mo libéré(s)."
+        ))
+        if resultat['manquants']:
+            self.stdout.write(self.style.WARNING(f"{resultat['manquants']} fichier(s) introuvable(s) sur le disque."))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from comptes.emails import traiter_file
+from comptes.management.file_attente import CommandeFile
+
+
+class Command(CommandeFile):
+    help = 'Envoie les emails en attente dans la file (invitations, ...)'
+    aide_lot = 'Nombre d\'emails réservés par lot'
+
+    def passage(self, taille_lot):
+        try:
+            envoyes, echecs = traiter_file(taille_lot or settings.EMAIL_FILE_TAILLE_LOT)
+        except Exception as e:
+            # Serveur SMTP injoignable : les emails réservés seront repris plus tard
+            self.stdout.write(self.style.ERROR(f'Connexion au serveur email impossible: {e}'))
+            return ''
+        if envoyes or echecs:
+            return f'{envoyes} email(s) envoyé(s), {echecs} échec(s).'
+        return ''
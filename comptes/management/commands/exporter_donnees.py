@@ -0,0 +1,25 @@
+import sys
+from django.core.management.base import BaseCommand
+from comptes.exports import EXPORTS, FORMATS, flux_export
+
+
+class Command(BaseCommand):
+    help = 'Exporte les notes, soumissions ou inscriptions en CSV ou XLSX, en flux'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS), help='Données à exporter')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='Format du fichier (csv par défaut)')
+        parser.add_argument('--sortie', help='Fichier de destination (sortie standard par défaut)')
+
+    def handle(self, *args, **options):
+        flux = flux_export(options['export'], options['format'])
+        if not options['sortie']:
+            for morceau in flux:
+                sys.stdout.buffer.write(morceau)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(options['sortie'], 'wb') as fichier:
+            for morceau in flux:
+                fichier.write(morceau)
+        self.stderr.write(self.style.SUCCESS(f"Export écrit dans {options['sortie']}"))
@@ -0,0 +1,14 @@
+from comptes.management.file_attente import CommandeFile
+from devoirs.depots import traiter_file
+
+
+class Command(CommandeFile):
+    help = 'Range les fichiers des soumissions déposées dans le stockage final'
+    intervalle = 1
+    aide_lot = 'Nombre de dépôts lus par lot'
+
+    def passage(self, taille_lot):
+        finalises, echecs = traiter_file(taille_lot)
+        if finalises or echecs:
+            return f'{finalises} dépôt(s) finalisé(s), {echecs} échec(s).'
+        return ''
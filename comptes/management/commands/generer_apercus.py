@@ -0,0 +1,13 @@
+from comptes.apercus import traiter_file
+from comptes.management.file_attente import CommandeFile
+
+
+class Command(CommandeFile):
+    help = 'Génère les aperçus (première page, nombre de pages) des PDF déposés'
+    aide_lot = 'Nombre de PDF réservés par lot'
+
+    def passage(self, taille_lot):
+        generes, echecs = traiter_file(taille_lot)
+        if generes or echecs:
+            return f'{generes} aperçu(s) généré(s), {echecs} échec(s).'
+        return ''
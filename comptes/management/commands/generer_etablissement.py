@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from comptes.generation import generer_etablissement
+
+
+class Command(BaseCommand):
+    help = 'Génère un établissement fictif (classes, comptes, cours, devoirs, soumissions, notes, invitations) pour les tests de charge'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=10, help='Nombre de classes')
+        parser.add_argument('--enseignants', type=int, default=20, help="Nombre d'enseignants")
+        parser.add_argument('--etudiants', type=int, default=300, help="Nombre d'étudiants, répartis entre les classes")
+        parser.add_argument('--cours', type=int, default=3, help='Cours par classe')
+        parser.add_argument('--devoirs', type=int, default=4, help='Devoirs par cours')
+        parser.add_argument('--taux-soumission', type=float, default=0.8, help='Part des devoirs rendus par chaque étudiant')
+        parser.add_argument('--taux-notes', type=float, default=0.7, help='Part des soumissions échues qui sont notées')
+        parser.add_argument('--invitations', type=int, default=20, help="Nombre d'invitations en attente")
+        parser.add_argument('--prefixe', default='synth', help='Préfixe des noms de comptes, de classes et de fichiers')
+        parser.add_argument('--mot-de-passe', default='motdepasse', help='Mot de passe de tous les comptes générés')
+        parser.add_argument('--graine', type=int, default=None, help='Graine du générateur aléatoire (données reproductibles)')
+
+    def handle(self, *args, **options):
+        try:
+            crees = generer_etablissement(
+                nb_classes=options['classes'],
+                nb_enseignants=options['enseignants'],
+                nb_etudiants=options['etudiants'],
+                cours_par_classe=options['cours'],
+                devoirs_par_cours=options['devoirs'],
+                taux_soumission=options['taux_soumission'],
+                taux_notes=options['taux_notes'],
+                nb_invitations=options['invitations'],
+                prefixe=options['prefixe'],
+                mot_de_passe=options['mot_de_passe'],
+                graine=options['graine'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for modele, nombre in crees.items():
+            self.stdout.write(f'{modele:<14} {nombre:>8}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Comptes {options['prefixe']}_enseignant_N et {options['prefixe']}_etudiant_N "
+            f"(mot de passe : {options['mot_de_passe']})."
+        ))
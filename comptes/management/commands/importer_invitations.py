@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from comptes.emails import traiter_file
+from comptes.imports import lire_csv, importer_invitations
+from comptes.models import Utilisateur
+
+
+class Command(BaseCommand):
+    help = 'Importe des invitations depuis un fichier CSV (colonnes email, role, classe)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', type=str, help='Chemin du fichier CSV')
+        parser.add_argument('--admin', type=str, help='Nom d\'utilisateur de l\'administrateur créateur des invitations')
+        parser.add_argument('--envoyer', action='store_true', help='Envoie immédiatement les emails sur une seule connexion SMTP')
+
+    def handle(self, *args, **options):
+        cree_par = None
+        if options.get('admin'):
+            try:
+                cree_par = Utilisateur.objects.get(username=options['admin'], role='admin')
+            except Utilisateur.DoesNotExist:
+                raise CommandError(f'L\'administrateur "{options["admin"]}" n\'existe pas.')
+
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                lignes = lire_csv(fichier.read())
+        except OSError as e:
+            raise CommandError(f'Impossible de lire le fichier: {e}')
+
+        resultats = importer_invitations(lignes, cree_par=cree_par)
+        for resultat in resultats:
+            style = self.style.SUCCESS if resultat['statut'] == 'cree' else self.style.ERROR if resultat['statut'] == 'erreur' else self.style.WARNING
+            self.stdout.write(style(f'Ligne {resultat["ligne"]} - {resultat["email"]}: {resultat["message"]}'))
+
+        nb_crees = sum(1 for resultat in resultats if resultat['statut'] == 'cree')
+        self.stdout.write(self.style.SUCCESS(f'{nb_crees} invitation(s) créée(s) sur {len(resultats)} ligne(s).'))
+
+        if options['envoyer'] and nb_crees:
+            envoyes, echecs = traiter_file()
+            self.stdout.write(self.style.SUCCESS(f'{envoyes} email(s) envoyé(s), {echecs} échec(s).'))
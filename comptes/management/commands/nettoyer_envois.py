@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from devoirs.envois import nettoyer_envois
+
+
+class Command(BaseCommand):
+    help = 'Supprime les envois fractionnés abandonnés et leurs fichiers partiels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--heures', type=int, default=48, help="Âge minimal d'un envoi sans nouveau bloc (défaut : 48)")
+
+    def handle(self, *args, **options):
+        nombre = nettoyer_envois(timedelta(hours=options['heures']))
+        self.stdout.write(self.style.SUCCESS(f'{nombre} envoi(s) abandonné(s) supprimé(s).'))
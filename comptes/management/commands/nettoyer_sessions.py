@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from comptes.sessions import supprimer_sessions_expirees
+
+
+class Command(BaseCommand):
+    help = 'Supprime les sessions expirées de la base, par lots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lot', type=int, default=None, help='Nombre de sessions supprimées par requête')
+
+    def handle(self, *args, **options):
+        nombre = supprimer_sessions_expirees(options['lot'])
+        self.stdout.write(self.style.SUCCESS(f'{nombre} session(s) expirée(s) supprimée(s).'))
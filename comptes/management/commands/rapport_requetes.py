@@ -0,0 +1,49 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from comptes.profilage import budget_requetes
+
+
+class Command(BaseCommand):
+    help = 'Résume par vue les profils SQL enregistrés par le middleware de profilage (PROFILAGE_FICHIER)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fichier', default=None, help='Fichier de profils (défaut : PROFILAGE_FICHIER)')
+        parser.add_argument('--depassements', action='store_true', help="N'afficher que les vues hors budget ou avec des requêtes répétées")
+        parser.add_argument('--vider', action='store_true', help='Vider le fichier après le rapport')
+
+    def handle(self, *args, **options):
+        chemin = options['fichier'] or getattr(settings, 'PROFILAGE_FICHIER', None)
+        if not chemin:
+            raise CommandError('Aucun fichier de profils : définissez PROFILAGE_FICHIER ou passez --fichier.')
+        try:
+            with open(chemin, encoding='utf-8') as fichier:
+                profils = [json.loads(ligne) for ligne in fichier if ligne.strip()]
+        except FileNotFoundError:
+            raise CommandError(f'Fichier introuvable : {chemin}')
+
+        vues = {}
+        for profil in profils:
+            vue = vues.setdefault(profil['vue'], {'appels': 0, 'requetes': [], 'temps_sql': [], 'doublons': {}})
+            vue['appels'] += 1
+            vue['requetes'].append(profil['nb_requetes'])
+            vue['temps_sql'].append(profil['temps_sql_ms'])
+            for empreinte, nombre in profil['doublons'].items():
+                vue['doublons'][empreinte] = max(vue['doublons'].get(empreinte, 0), nombre)
+
+        self.stdout.write(f"{'Vue':<45} {'appels':>6} {'req. moy':>8} {'req. max':>8} {'budget':>6} {'SQL max (ms)':>12}")
+        for nom, vue in sorted(vues.items(), key=lambda element: -max(element[1]['requetes'])):
+            budget = budget_requetes(nom)
+            hors_budget = max(vue['requetes']) > budget or vue['doublons']
+            if options['depassements'] and not hors_budget:
+                continue
+            ligne = (
+                f"{nom[:45]:<45} {vue['appels']:>6} {sum(vue['requetes']) / vue['appels']:>8.1f} "
+                f"{max(vue['requetes']):>8} {budget:>6} {max(vue['temps_sql']):>12.1f}"
+            )
+            self.stdout.write(self.style.WARNING(ligne) if hors_budget else ligne)
+            for empreinte, nombre in sorted(vue['doublons'].items(), key=lambda element: -element[1])[:3]:
+                self.stdout.write(f'    {nombre} x {empreinte[:150]}')
+
+        if options['vider']:
+            open(chemin, 'w').close()
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from comptes.agregats import reconstruire_agregats
+
+
+class Command(BaseCommand):
+    help = 'Recalcule toutes les moyennes précalculées (étudiants, devoirs, classes)'
+
+    def handle(self, *args, **options):
+        nb_agregats = reconstruire_agregats()
+        self.stdout.write(self.style.SUCCESS(f'{nb_agregats} agrégat(s) de notes recalculé(s).'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from comptes.quotas import recalculer_espace
+
+
+class Command(BaseCommand):
+    help = "Recalcule l'espace de stockage utilisé par chaque utilisateur et corrige les dérives"
+
+    def handle(self, *args, **options):
+        ecarts = recalculer_espace()
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS('Les espaces utilisés sont à jour.'))
+            return
+        self.stdout.write(self.style.WARNING(f'{len(ecarts)} utilisateur(s) corrigé(s).'))
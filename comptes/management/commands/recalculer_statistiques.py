@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from comptes.statistiques import recalculer_statistiques
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les compteurs du dashboard admin et corrige les dérives'
+
+    def handle(self, *args, **options):
+        ecarts = recalculer_statistiques()
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS('Les compteurs sont à jour.'))
+            return
+        for cle, ecart in sorted(ecarts.items()):
+            self.stdout.write(self.style.WARNING(f'{cle}: écart de {ecart:+d} corrigé'))
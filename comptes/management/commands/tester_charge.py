@@ -0,0 +1,123 @@
+import random
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from comptes.charge import executer_charge, rapport
+from comptes.models import Utilisateur, Classe
+from cours.models import Cours, Inscription
+from devoirs.models import Devoir
+
+
+class Command(BaseCommand):
+    help = (
+        "Rejoue en parallèle des parcours d'étudiants et d'enseignants générés par generer_etablissement "
+        "sur un serveur local, puis affiche p50/p95/p99 par point d'accès"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Adresse du serveur testé')
+        parser.add_argument('--etudiants', type=int, default=20, help="Nombre d'étudiants virtuels")
+        parser.add_argument('--enseignants', type=int, default=5, help="Nombre d'enseignants virtuels")
+        parser.add_argument('--concurrence', type=int, default=None, help='Utilisateurs actifs en même temps (défaut : tous)')
+        parser.add_argument('--iterations', type=int, default=5, help='Passages sur le parcours par utilisateur')
+        parser.add_argument('--duree', type=float, default=None, help='Durée maximale du test en secondes')
+        parser.add_argument('--pause', type=float, default=0, help='Temps de lecture moyen entre deux pages, en secondes')
+        parser.add_argument('--prefixe', default='synth', help='Préfixe des comptes générés')
+        parser.add_argument('--mot-de-passe', default='motdepasse', help='Mot de passe des comptes générés')
+        parser.add_argument('--graine', type=int, default=None, help='Graine du tirage des comptes et des pages')
+
+    def handle(self, *args, **options):
+        alea = random.Random(options['graine'])
+        utilisateurs = (
+            self.parcours_etudiants(alea, options) + self.parcours_enseignants(alea, options)
+        )
+        if not utilisateurs:
+            raise CommandError(f"Aucun compte \"{options['prefixe']}_...\" : lancez d'abord generer_etablissement.")
+
+        self.stdout.write(f"{len(utilisateurs)} utilisateur(s) virtuel(s) sur {options['url']}...")
+        mesures, duree = executer_charge(
+            options['url'], utilisateurs,
+            concurrence=options['concurrence'], iterations=options['iterations'],
+            duree_max=options['duree'], pause=options['pause'], graine=options['graine'],
+            nom_cookie_csrf=settings.CSRF_COOKIE_NAME,
+        )
+
+        self.stdout.write(f"{'Point d accès':<40} {'req.':>6} {'err.':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for ligne in rapport(mesures):
+            texte = (
+                f"{ligne['point'][:40]:<40} {ligne['requetes']:>6} {ligne['erreurs']:>5} "
+                f"{ligne['p50']:>8.1f} {ligne['p95']:>8.1f} {ligne['p99']:>8.1f} {ligne['max']:>8.1f}"
+            )
+            self.stdout.write(self.style.WARNING(texte) if ligne['erreurs'] else texte)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(mesures)} requêtes en {duree:.1f} s ({len(mesures) / duree if duree else 0:.1f} requêtes/s).'
+        ))
+
+    def comptes(self, alea, role, nombre, prefixe):
+        ids = list(
+            Utilisateur.objects.filter(role=role, username__startswith=f'{prefixe}_')
+            .order_by('id').values_list('id', flat=True)
+        )
+        ids = alea.sample(ids, min(nombre, len(ids)))
+        return list(Utilisateur.objects.filter(id__in=ids).order_by('id'))
+
+    def parcours_etudiants(self, alea, options):
+        etudiants = self.comptes(alea, 'etudiant', options['etudiants'], options['prefixe'])
+        cours_par_etudiant = {}
+        for etudiant_id, cours_id in Inscription.objects.filter(etudiant__in=etudiants).values_list('etudiant_id', 'cours_id'):
+            cours_par_etudiant.setdefault(etudiant_id, []).append(cours_id)
+        devoirs_par_cours = {}
+        cours_ids = {cours_id for ids in cours_par_etudiant.values() for cours_id in ids}
+        for cours_id, devoir_id in Devoir.objects.filter(cours_id__in=cours_ids).values_list('cours_id', 'id'):
+            devoirs_par_cours.setdefault(cours_id, []).append(devoir_id)
+
+        utilisateurs = []
+        for etudiant in etudiants:
+            cours_ids = cours_par_etudiant.get(etudiant.id, [])
+            devoir_ids = [devoir_id for cours_id in cours_ids for devoir_id in devoirs_par_cours.get(cours_id, [])]
+            utilisateurs.append(self.utilisateur(etudiant, options, reverse('etudiants:etudiant_login'), [
+                ('etudiants:dashboard_etudiant', [reverse('etudiants:dashboard_etudiant')]),
+                ('etudiants:mes_cours', [reverse('etudiants:mes_cours')]),
+                ('etudiants:detail_cours', [reverse('etudiants:detail_cours', args=[i]) for i in cours_ids]),
+                ('etudiants:mes_devoirs', [reverse('etudiants:mes_devoirs')]),
+                ('etudiants:soumettre_devoir', [reverse('etudiants:soumettre_devoir', args=[i]) for i in devoir_ids]),
+                ('etudiants:mes_notes', [reverse('etudiants:mes_notes')]),
+                ('etudiants:mes_soumissions', [reverse('etudiants:mes_soumissions')]),
+            ]))
+        return utilisateurs
+
+    def parcours_enseignants(self, alea, options):
+        enseignants = self.comptes(alea, 'enseignant', options['enseignants'], options['prefixe'])
+        classes_par_enseignant = {}
+        for enseignant_id, classe_id in Classe.enseignants.through.objects.filter(
+            utilisateur__in=enseignants
+        ).values_list('utilisateur_id', 'classe_id'):
+            classes_par_enseignant.setdefault(enseignant_id, []).append(classe_id)
+        cours_par_enseignant = {}
+        for enseignant_id, cours_id in Cours.objects.filter(enseignant__in=enseignants).values_list('enseignant_id', 'id'):
+            cours_par_enseignant.setdefault(enseignant_id, []).append(cours_id)
+
+        utilisateurs = []
+        for enseignant in enseignants:
+            classe_ids = classes_par_enseignant.get(enseignant.id, [])
+            cours_ids = cours_par_enseignant.get(enseignant.id, [])
+            utilisateurs.append(self.utilisateur(enseignant, options, reverse('enseignants:enseignant_login'), [
+                ('enseignants:dashboard_enseignant', [reverse('enseignants:dashboard_enseignant')]),
+                ('enseignants:mes_classes', [reverse('enseignants:mes_classes')]),
+                ('enseignants:detail_classe', [reverse('enseignants:detail_classe', args=[i]) for i in classe_ids]),
+                ('enseignants:etudiants_classe', [reverse('enseignants:etudiants_classe', args=[i]) for i in classe_ids]),
+                ('enseignants:carnet_notes', [reverse('enseignants:carnet_notes', args=[i]) for i in classe_ids]),
+                ('enseignants:mes_cours', [reverse('enseignants:mes_cours')]),
+                ('enseignants:detail_cours', [reverse('enseignants:detail_cours', args=[i]) for i in cours_ids]),
+                ('enseignants:mes_devoirs', [reverse('enseignants:mes_devoirs')]),
+            ]))
+        return utilisateurs
+
+    def utilisateur(self, compte, options, connexion, parcours):
+        # Les étapes sans page possible (aucun cours, aucun devoir...) sont retirées du parcours
+        return {
+            'username': compte.username,
+            'mot_de_passe': options['mot_de_passe'],
+            'connexion': connexion,
+            'parcours': [(point, chemins) for point, chemins in parcours if chemins],
+        }
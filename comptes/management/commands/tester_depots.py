@@ -0,0 +1,97 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+from django.urls import reverse
+from django.utils import timezone
+from comptes.charge import deposer_en_rafale, rapport
+from comptes.generation import PDF_GENERE
+from comptes.models import Utilisateur
+from devoirs.models import Devoir, Soumission
+
+
+class Command(BaseCommand):
+    help = (
+        "Simule le rush avant une deadline sur un serveur local : des étudiants générés par "
+        "generer_etablissement soumettent tous le même devoir au même instant"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Adresse du serveur testé')
+        parser.add_argument('--etudiants', type=int, default=500, help='Nombre de soumissions simultanées')
+        parser.add_argument('--devoir', type=int, default=None, help='Devoir soumis (défaut : le devoir ouvert le moins soumis)')
+        parser.add_argument('--envois', type=int, default=1, help='Envois par étudiant (2 ou plus : vérifie que les doublons sont écartés)')
+        parser.add_argument('--taille', type=int, default=200, help='Taille du fichier soumis, en Ko')
+        parser.add_argument('--prefixe', default='synth', help='Préfixe des comptes générés')
+        parser.add_argument('--mot-de-passe', default='motdepasse', help='Mot de passe des comptes générés')
+
+    def handle(self, *args, **options):
+        devoir = self.devoir(options)
+        etudiants = list(
+            Utilisateur.objects.filter(
+                role='etudiant', classe_id=devoir.cours.classe_id, username__startswith=f"{options['prefixe']}_",
+            ).exclude(soumission__devoir=devoir).order_by('id')[:options['etudiants']]
+        )
+        if not etudiants:
+            raise CommandError(f'Aucun étudiant de la classe du devoir {devoir.id} sans soumission.')
+        if len(etudiants) < options['etudiants']:
+            self.stdout.write(self.style.WARNING(
+                f"Seulement {len(etudiants)} étudiant(s) sans soumission : "
+                f"lancez generer_etablissement --classes 1 --etudiants {options['etudiants']} --taux-soumission 0."
+            ))
+
+        # PDF valide complété jusqu'à la taille demandée
+        contenu = PDF_GENERE + b'%' * max(options['taille'] * 1024 - len(PDF_GENERE), 0)
+        chemin = reverse('etudiants:soumettre_devoir', args=[devoir.id])
+        depots = [
+            {
+                'username': etudiant.username,
+                'mot_de_passe': options['mot_de_passe'],
+                'connexion': reverse('etudiants:etudiant_login'),
+                'chemin': chemin,
+                'fichier': (f'{etudiant.username}.pdf', contenu),
+            }
+            for etudiant in etudiants
+        ]
+
+        self.stdout.write(f"{len(depots)} soumission(s) simultanée(s) du devoir {devoir.id} sur {options['url']}...")
+        mesures, duree = deposer_en_rafale(options['url'], depots, options['envois'], settings.CSRF_COOKIE_NAME)
+
+        self.stdout.write(f"{'Point d accès':<20} {'req.':>6} {'err.':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for ligne in rapport(mesures):
+            texte = (
+                f"{ligne['point']:<20} {ligne['requetes']:>6} {ligne['erreurs']:>5} "
+                f"{ligne['p50']:>8.1f} {ligne['p95']:>8.1f} {ligne['p99']:>8.1f} {ligne['max']:>8.1f}"
+            )
+            self.stdout.write(self.style.WARNING(texte) if ligne['erreurs'] else texte)
+
+        # Une soumission et une seule par étudiant, quel que soit le nombre d'envois
+        creees = Soumission.objects.filter(devoir=devoir, etudiant__in=etudiants).aggregate(
+            total=Count('id'), en_attente=Count('id', filter=Q(depot_en_attente=True)),
+        )
+        soumissions = sum(1 for point, _, _ in mesures if point == 'soumission')
+        self.stdout.write(self.style.SUCCESS(
+            f"{soumissions} envoi(s) en {duree:.1f} s ({soumissions / duree if duree else 0:.1f} envois/s), "
+            f"{creees['total']} soumission(s) créée(s) pour {len(etudiants)} étudiant(s), "
+            f"{creees['en_attente']} en attente du worker (finaliser_depots)."
+        ))
+        if creees['total'] > len(etudiants):
+            raise CommandError('Des soumissions en double ont été créées.')
+
+    def devoir(self, options):
+        if options['devoir']:
+            try:
+                return Devoir.objects.select_related('cours').get(id=options['devoir'])
+            except Devoir.DoesNotExist:
+                raise CommandError(f"Le devoir {options['devoir']} n'existe pas.")
+        # La deadline doit rester ouverte pendant toute la rafale
+        devoir = (
+            Devoir.objects.select_related('cours')
+            .filter(deadline__gt=timezone.now() + timedelta(minutes=30), cours__classe__isnull=False,
+                    titre__startswith=f"{options['prefixe']} ")
+            .annotate(soumis=Count('soumission'))
+            .order_by('soumis', 'id').first()
+        )
+        if devoir is None:
+            raise CommandError(f"Aucun devoir \"{options['prefixe']}\" ouvert : lancez d'abord generer_etablissement.")
+        return devoir
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+
+
+class CommandeFile(BaseCommand):
+    """
+    Commande d'un worker de file d'attente : un passage, ou une boucle avec
+    --continu. Les sous-classes définissent passage(taille_lot), qui retourne
+    le message à afficher (ou une chaîne vide quand la file était vide).
+    """
+
+    intervalle = 5
+    aide_lot = 'Nombre d\'éléments réservés par lot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continu', action='store_true', help='Tourne en boucle au lieu de vider la file une seule fois')
+        parser.add_argument('--intervalle', type=float, default=self.intervalle, help='Pause (secondes) entre deux passages en mode continu')
+        parser.add_argument('--lot', type=int, default=None, help=self.aide_lot)
+
+    def passage(self, taille_lot):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        while True:
+            message = self.passage(options['lot'])
+            if message:
+                self.stdout.write(self.style.SUCCESS(message))
+
+            if not options['continu']:
+                break
+            time.sleep(options['intervalle'])
@@ -0,0 +1,156 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from cours.models import Cours
+from cours.services import etudiant_a_acces
+from devoirs.models import Devoir, Soumission
+
+TAILLE_BLOC = 64 * 1024
+
+PLAGE_OCTETS = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def fichier_autorise(utilisateur, chemin):
+    """
+    Indique si l'utilisateur peut lire le fichier média `chemin`.
+    Retourne None si aucun cours, devoir ou soumission ne référence ce fichier.
+
+    - administrateur : tous les fichiers ;
+    - enseignant : les fichiers de ses cours, de leurs devoirs et des soumissions à ces devoirs ;
+    - étudiant : les cours et devoirs auxquels il a accès (mêmes règles que
+      etudiants.detail_cours et soumettre_devoir) et ses propres soumissions.
+
+    La variante web d'une soumission suit les mêmes règles que l'original.
+    """
+    cours = Cours.objects.filter(fichier_pdf=chemin).first()
+    if cours is None:
+        devoir = Devoir.objects.select_related('cours').filter(fichier=chemin).first()
+        cours = devoir.cours if devoir else None
+    soumission = None
+    if cours is None:
+        soumission = (
+            Soumission.objects.select_related('devoir__cours')
+            .filter(Q(fichier=chemin) | Q(fichier_web=chemin)).first()
+        )
+        if soumission is None:
+            return None
+        cours = soumission.devoir.cours
+
+    if utilisateur.role == 'admin':
+        return True
+    if utilisateur.role == 'enseignant':
+        return cours.enseignant_id == utilisateur.id
+    if utilisateur.role == 'etudiant':
+        if soumission is not None:
+            return soumission.etudiant_id == utilisateur.id
+        return etudiant_a_acces(utilisateur, cours)
+    return False
+
+
+def _entetes_fichier(response, chemin, taille=None):
+    type_contenu, encodage = mimetypes.guess_type(chemin)
+    response['Content-Type'] = type_contenu or 'application/octet-stream'
+    if encodage:
+        response['Content-Encoding'] = encodage
+    # filename*= (RFC 5987) pour les noms accentués ou contenant des guillemets
+    response['Content-Disposition'] = content_disposition_header(False, os.path.basename(chemin))
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    if taille is not None:
+        response['Content-Length'] = str(taille)
+    return response
+
+
+def _plage(request, taille, etag, date_modification):
+    """
+    Plage demandée par l'en-tête Range (une seule plage en octets).
+    Retourne None pour envoyer le fichier entier, (debut, fin) inclusifs, ou
+    False si la plage ne peut pas être satisfaite.
+    """
+    entete = request.META.get('HTTP_RANGE', '')
+    correspondance = PLAGE_OCTETS.match(entete.strip())
+    if not correspondance:
+        return None
+    # If-Range : la plage n'est valable que si le fichier n'a pas changé
+    si_plage = request.META.get('HTTP_IF_RANGE')
+    if si_plage and si_plage != etag and parse_http_date_safe(si_plage) != int(date_modification):
+        return None
+
+    debut, fin = correspondance.groups()
+    if not debut and not fin:
+        return None
+    if not debut:
+        # bytes=-N : les N derniers octets
+        debut, fin = max(taille - int(fin), 0), taille - 1
+    else:
+        debut, fin = int(debut), min(int(fin), taille - 1) if fin else taille - 1
+    if debut >= taille or debut > fin:
+        return False
+    return debut, fin
+
+
+def _lire_plage(fichier, debut, longueur):
+    with fichier:
+        fichier.seek(debut)
+        while longueur > 0:
+            bloc = fichier.read(min(TAILLE_BLOC, longueur))
+            if not bloc:
+                break
+            longueur -= len(bloc)
+            yield bloc
+
+
+def servir_fichier(request, chemin):
+    """
+    Envoie un fichier média déjà autorisé.
+
+    Avec MEDIA_ENVOI = 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache),
+    Django ne fait que répondre avec l'en-tête et le serveur frontal lit le
+    fichier. Sinon les requêtes conditionnelles (ETag, If-Modified-Since) et
+    les requêtes partielles (Range) sont gérées ici.
+    """
+    envoi = getattr(settings, 'MEDIA_ENVOI', '')
+    if envoi == 'x-accel-redirect':
+        prefixe = getattr(settings, 'MEDIA_ACCEL_PREFIXE', '/media-protege/')
+        response = _entetes_fichier(HttpResponse(), chemin)
+        # En-têtes lus comme des URL par nginx et mod_xsendfile : chemin encodé, jamais en MIME
+        response['X-Accel-Redirect'] = quote(prefixe + chemin)
+        return response
+    if envoi == 'x-sendfile':
+        response = _entetes_fichier(HttpResponse(), chemin)
+        response['X-Sendfile'] = quote(default_storage.path(chemin))
+        return response
+
+    try:
+        informations = os.stat(default_storage.path(chemin))
+    except FileNotFoundError:
+        return None
+    taille = informations.st_size
+    date_modification = informations.st_mtime
+    etag = f'"{int(date_modification):x}-{taille:x}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(date_modification))
+    if response is None:
+        plage = _plage(request, taille, etag, date_modification)
+        if plage is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{taille}'
+            return response
+        fichier = default_storage.open(chemin, 'rb')
+        if plage is None:
+            response = _entetes_fichier(FileResponse(fichier), chemin, taille)
+        else:
+            debut, fin = plage
+            response = StreamingHttpResponse(_lire_plage(fichier, debut, fin - debut + 1), status=206)
+            _entetes_fichier(response, chemin, fin - debut + 1)
+            response['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(date_modification)
+    return response
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-17 19:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0008_invitation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invitation',
+            name='date_envoi',
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi"),
+        ),
+        migrations.AddField(
+            model_name='invitation',
+            name='statut_envoi',
+            field=models.CharField(choices=[('en_file', "En file d'attente"), ('envoyee', 'Envoyée'), ('echec', 'Échec')], default='en_file', max_length=20, verbose_name="Statut de l'envoi"),
+        ),
+        migrations.CreateModel(
+            name='EmailSortant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinataire', models.EmailField(max_length=254, verbose_name='Destinataire')),
+                ('sujet', models.CharField(max_length=255, verbose_name='Sujet')),
+                ('message', models.TextField(verbose_name='Message texte')),
+                ('message_html', models.TextField(blank=True, verbose_name='Message HTML')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('envoye', 'Envoyé'), ('echec', 'Échec')], default='en_attente', max_length=20, verbose_name='Statut')),
+                ('tentatives', models.PositiveIntegerField(default=0, verbose_name='Tentatives')),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('derniere_erreur', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_envoi', models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")),
+                ('invitation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='emails', to='comptes.invitation', verbose_name='Invitation')),
+            ],
+            options={
+                'verbose_name': 'Email sortant',
+                'verbose_name_plural': 'Emails sortants',
+                'ordering': ['date_creation'],
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='email_sortant_a_envoyer')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('comptes', '0009_emailsortant_invitation_statut_envoi'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=models.Index(fields=['date_joined', 'id'], name='utilisateur_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=models.Index(fields=['role', 'date_joined', 'id'], name='utilisateur_role_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=models.Index(fields=['email'], name='utilisateur_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=models.Index(fields=['first_name'], name='utilisateur_prenom_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=models.Index(fields=['last_name'], name='utilisateur_nom_idx'),
+        ),
+    ]
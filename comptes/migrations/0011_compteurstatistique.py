@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0010_index_recherche_utilisateur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurStatistique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=50, unique=True, verbose_name='Clé')),
+                ('valeur', models.BigIntegerField(default=0, verbose_name='Valeur')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True, verbose_name='Date de mise à jour')),
+            ],
+            options={
+                'verbose_name': 'Compteur statistique',
+                'verbose_name_plural': 'Compteurs statistiques',
+                'ordering': ['cle'],
+            },
+        ),
+    ]
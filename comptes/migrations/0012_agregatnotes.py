@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0011_compteurstatistique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregatNotes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=60, unique=True, verbose_name='Clé')),
+                ('portee', models.CharField(choices=[('etudiant', 'Étudiant'), ('etudiant_enseignant', 'Étudiant pour un enseignant'), ('devoir', 'Devoir'), ('classe', 'Classe')], max_length=20, verbose_name='Portée')),
+                ('nb_notes', models.PositiveIntegerField(default=0, verbose_name='Nombre de notes')),
+                ('moyenne', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Moyenne')),
+                ('mediane', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Médiane')),
+                ('minimum', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Minimum')),
+                ('maximum', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Maximum')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True, verbose_name='Date de mise à jour')),
+            ],
+            options={
+                'verbose_name': 'Agrégat de notes',
+                'verbose_name_plural': 'Agrégats de notes',
+                'ordering': ['cle'],
+            },
+        ),
+    ]
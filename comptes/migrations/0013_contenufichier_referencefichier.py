@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-17 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0012_agregatnotes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContenuFichier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('taille', models.BigIntegerField(verbose_name='Taille')),
+                ('nb_references', models.PositiveIntegerField(default=0, verbose_name='Nombre de références')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+            ],
+            options={
+                'verbose_name': 'Contenu de fichier',
+                'verbose_name_plural': 'Contenus de fichiers',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReferenceFichier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=255, unique=True, verbose_name='Nom')),
+                ('contenu', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='references', to='comptes.contenufichier', verbose_name='Contenu')),
+            ],
+            options={
+                'verbose_name': 'Référence de fichier',
+                'verbose_name_plural': 'Références de fichiers',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-17 12:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0013_contenufichier_referencefichier'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApercuFichier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=255, unique=True, verbose_name='Fichier')),
+                ('image', models.FileField(blank=True, upload_to='apercus/', verbose_name='Aperçu')),
+                ('nb_pages', models.PositiveIntegerField(blank=True, null=True, verbose_name='Nombre de pages')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('pret', 'Prêt'), ('echec', 'Échec')], default='en_attente', max_length=20, verbose_name='Statut')),
+                ('tentatives', models.PositiveIntegerField(default=0, verbose_name='Tentatives')),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('derniere_erreur', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True, verbose_name='Date de mise à jour')),
+            ],
+            options={
+                'verbose_name': 'Aperçu de fichier',
+                'verbose_name_plural': 'Aperçus de fichiers',
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='apercu_a_generer')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0014_apercufichier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='utilisateur',
+            name='espace_utilise',
+            field=models.BigIntegerField(default=0, verbose_name='Espace utilisé (octets)'),
+        ),
+    ]
@@ -50,17 +50,24 @@ class Utilisateur(AbstractUser):
         blank=True,
         verbose_name="Classe"
     )
+    # Taille des fichiers déposés par l'utilisateur, tenue à jour par comptes.quotas
+    espace_utilise = models.BigIntegerField(default=0, verbose_name="Espace utilisé (octets)")
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Pagination par curseur de la liste des utilisateurs (avec ou sans filtre de rôle)
+            models.Index(fields=['date_joined', 'id'], name='utilisateur_date_id_idx'),
+            models.Index(fields=['role', 'date_joined', 'id'], name='utilisateur_role_date_idx'),
+            # Recherche par préfixe
+            models.Index(fields=['email'], name='utilisateur_email_idx'),
+            models.Index(fields=['first_name'], name='utilisateur_prenom_idx'),
+            models.Index(fields=['last_name'], name='utilisateur_nom_idx'),
+        ]
     
     def inscrire_aux_cours_classe(self):
         """Inscrit automatiquement l'étudiant aux cours de sa classe"""
-        if self.role == 'etudiant' and self.classe:
-            from cours.models import Cours, Inscription
-            cours_classe = Cours.objects.filter(classe=self.classe)
-            for cours in cours_classe:
-                Inscription.objects.get_or_create(
-                    cours=cours,
-                    etudiant=self
-                )
+        from cours.services import inscrire_etudiant_aux_cours
+        return inscrire_etudiant_aux_cours(self)
 
 
 class Note(models.Model):
@@ -112,6 +119,33 @@ class Note(models.Model):
         return f"{self.etudiant.username} - {self.note}/20 - {self.devoir.titre}"
 
 
+class AgregatNotes(models.Model):
+    """Statistiques précalculées des notes, tenues à jour par comptes.agregats"""
+    PORTEE_CHOICES = (
+        ('etudiant', 'Étudiant'),
+        ('etudiant_enseignant', 'Étudiant pour un enseignant'),
+        ('devoir', 'Devoir'),
+        ('classe', 'Classe'),
+    )
+    
+    cle = models.CharField(max_length=60, unique=True, verbose_name="Clé")
+    portee = models.CharField(max_length=20, choices=PORTEE_CHOICES, verbose_name="Portée")
+    nb_notes = models.PositiveIntegerField(default=0, verbose_name="Nombre de notes")
+    moyenne = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="Moyenne")
+    mediane = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="Médiane")
+    minimum = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="Minimum")
+    maximum = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="Maximum")
+    date_mise_a_jour = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
+    
+    class Meta:
+        verbose_name = "Agrégat de notes"
+        verbose_name_plural = "Agrégats de notes"
+        ordering = ['cle']
+    
+    def __str__(self):
+        return f"{self.cle} : {self.moyenne} ({self.nb_notes} notes)"
+
+
 class Invitation(models.Model):
     """Modèle pour gérer les invitations d'utilisateurs"""
     STATUT_CHOICES = (
@@ -119,6 +153,11 @@ class Invitation(models.Model):
         ('acceptee', 'Acceptée'),
         ('expiree', 'Expirée'),
     )
+    STATUT_ENVOI_CHOICES = (
+        ('en_file', 'En file d\'attente'),
+        ('envoyee', 'Envoyée'),
+        ('echec', 'Échec'),
+    )
     
     email = models.EmailField(verbose_name="Email")
     role = models.CharField(
@@ -144,6 +183,13 @@ class Invitation(models.Model):
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     date_expiration = models.DateTimeField(verbose_name="Date d'expiration")
     date_acceptation = models.DateTimeField(null=True, blank=True, verbose_name="Date d'acceptation")
+    statut_envoi = models.CharField(
+        max_length=20,
+        choices=STATUT_ENVOI_CHOICES,
+        default='en_file',
+        verbose_name="Statut de l'envoi"
+    )
+    date_envoi = models.DateTimeField(null=True, blank=True, verbose_name="Date d'envoi")
     cree_par = models.ForeignKey(
         Utilisateur,
         on_delete=models.SET_NULL,
@@ -183,11 +229,129 @@ class Invitation(models.Model):
         self.save()
 
 
+class EmailSortant(models.Model):
+    """File d'attente persistante des emails, vidée par la commande envoyer_emails"""
+    STATUT_CHOICES = (
+        ('en_attente', 'En attente'),
+        ('envoye', 'Envoyé'),
+        ('echec', 'Échec'),
+    )
+    
+    destinataire = models.EmailField(verbose_name="Destinataire")
+    sujet = models.CharField(max_length=255, verbose_name="Sujet")
+    message = models.TextField(verbose_name="Message texte")
+    message_html = models.TextField(blank=True, verbose_name="Message HTML")
+    invitation = models.ForeignKey(
+        Invitation,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='emails',
+        verbose_name="Invitation"
+    )
+    statut = models.CharField(
+        max_length=20,
+        choices=STATUT_CHOICES,
+        default='en_attente',
+        verbose_name="Statut"
+    )
+    tentatives = models.PositiveIntegerField(default=0, verbose_name="Tentatives")
+    prochaine_tentative = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    derniere_erreur = models.TextField(blank=True, verbose_name="Dernière erreur")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    date_envoi = models.DateTimeField(null=True, blank=True, verbose_name="Date d'envoi")
+    
+    class Meta:
+        verbose_name = "Email sortant"
+        verbose_name_plural = "Emails sortants"
+        ordering = ['date_creation']
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative'], name='email_sortant_a_envoyer'),
+        ]
+    
+    def __str__(self):
+        return f"{self.sujet} -> {self.destinataire} ({self.get_statut_display()})"
+
+
+class CompteurStatistique(models.Model):
+    """Compteur global du dashboard admin, tenu à jour par les signaux de comptes.statistiques"""
+    cle = models.CharField(max_length=50, unique=True, verbose_name="Clé")
+    valeur = models.BigIntegerField(default=0, verbose_name="Valeur")
+    date_mise_a_jour = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
+    
+    class Meta:
+        verbose_name = "Compteur statistique"
+        verbose_name_plural = "Compteurs statistiques"
+        ordering = ['cle']
+    
+    def __str__(self):
+        return f"{self.cle} = {self.valeur}"
+
+
+class ContenuFichier(models.Model):
+    """Contenu d'un fichier déposé, stocké une seule fois sous son empreinte SHA-256 (comptes.stockage)"""
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name="SHA-256")
+    taille = models.BigIntegerField(verbose_name="Taille")
+    nb_references = models.PositiveIntegerField(default=0, verbose_name="Nombre de références")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    
+    class Meta:
+        verbose_name = "Contenu de fichier"
+        verbose_name_plural = "Contenus de fichiers"
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.nb_references} référence(s))"
+
+
+class ReferenceFichier(models.Model):
+    """Nom de fichier utilisé par un cours, un devoir ou une soumission, lié à son contenu"""
+    nom = models.CharField(max_length=255, unique=True, verbose_name="Nom")
+    contenu = models.ForeignKey(ContenuFichier, on_delete=models.PROTECT, related_name='references', verbose_name="Contenu")
+    
+    class Meta:
+        verbose_name = "Référence de fichier"
+        verbose_name_plural = "Références de fichiers"
+    
+    def __str__(self):
+        return self.nom
+
+
+class ApercuFichier(models.Model):
+    """Aperçu de la première page et nombre de pages d'un PDF déposé, générés par la commande generer_apercus"""
+    STATUT_CHOICES = (
+        ('en_attente', 'En attente'),
+        ('pret', 'Prêt'),
+        ('echec', 'Échec'),
+    )
+    
+    nom = models.CharField(max_length=255, unique=True, verbose_name="Fichier")
+    image = models.FileField(upload_to='apercus/', blank=True, verbose_name="Aperçu")
+    nb_pages = models.PositiveIntegerField(null=True, blank=True, verbose_name="Nombre de pages")
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente', verbose_name="Statut")
+    tentatives = models.PositiveIntegerField(default=0, verbose_name="Tentatives")
+    prochaine_tentative = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    derniere_erreur = models.TextField(blank=True, verbose_name="Dernière erreur")
+    date_mise_a_jour = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
+    
+    class Meta:
+        verbose_name = "Aperçu de fichier"
+        verbose_name_plural = "Aperçus de fichiers"
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative'], name='apercu_a_generer'),
+        ]
+    
+    def __str__(self):
+        return f"{self.nom} ({self.get_statut_display()})"
+
+
 # Signal pour inscrire automatiquement un étudiant aux cours de sa classe lorsqu'il est assigné à une classe
 @receiver(post_save, sender=Utilisateur)
-def inscrire_etudiant_aux_cours(sender, instance, **kwargs):
+def inscrire_etudiant_aux_cours(sender, instance, update_fields=None, **kwargs):
     """Inscrit automatiquement un étudiant aux cours de sa classe lorsqu'il est assigné à une classe"""
+    # Inutile si la sauvegarde ne touche ni la classe ni le rôle (ex: mise à jour de last_login)
+    if update_fields is not None and not {'classe', 'role'} & set(update_fields):
+        return
     # Ne s'exécute que si l'utilisateur est un étudiant et a une classe
-    if instance.role == 'etudiant' and instance.classe:
+    if instance.role == 'etudiant' and instance.classe_id:
         instance.inscrire_aux_cours_classe()
 
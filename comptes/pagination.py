@@ -0,0 +1,106 @@
+import base64
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+# Nombre d'éléments affichés par page dans les listes de l'administration
+PAR_PAGE = 50
+
+
+class PageCurseur:
+    """Page d'une liste paginée par curseur (keyset)"""
+
+    def __init__(self, objets, url_precedente=None, url_suivante=None):
+        self.objets = objets
+        self.url_precedente = url_precedente
+        self.url_suivante = url_suivante
+
+    @property
+    def a_plusieurs_pages(self):
+        return bool(self.url_precedente or self.url_suivante)
+
+
+def _encoder_curseur(valeurs, sens):
+    # isoformat() conserve les microsecondes, que DjangoJSONEncoder tronque
+    valeurs = [valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur for valeur in valeurs]
+    donnees = json.dumps({'v': valeurs, 's': sens}, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(donnees.encode()).decode()
+
+
+def _decoder_curseur(curseur, modele, champs):
+    try:
+        donnees = json.loads(base64.urlsafe_b64decode(curseur.encode()).decode())
+        valeurs = [
+            modele._meta.get_field(champ).to_python(valeur)
+            for champ, valeur in zip(champs, donnees['v'], strict=True)
+        ]
+        sens = donnees['s']
+    except Exception:
+        return None, None
+    if sens not in ('suivant', 'precedent'):
+        return None, None
+    return valeurs, sens
+
+
+def _filtre_apres(ordre, valeurs, inverse=False):
+    """
+    Construit le filtre (a, b) > (x, y) en respectant le sens de chaque champ :
+    a > x OR (a = x AND b > y) pour un tri croissant.
+    """
+    filtre = Q()
+    egalites = Q()
+    for champ_ordre, valeur in zip(ordre, valeurs):
+        champ = champ_ordre.lstrip('-')
+        decroissant = champ_ordre.startswith('-') != inverse
+        comparaison = f'{champ}__lt' if decroissant else f'{champ}__gt'
+        filtre |= egalites & Q(**{comparaison: valeur})
+        egalites &= Q(**{champ: valeur})
+    return filtre
+
+
+def _inverser(ordre):
+    return [champ[1:] if champ.startswith('-') else f'-{champ}' for champ in ordre]
+
+
+def _url(request, curseur):
+    parametres = request.GET.copy()
+    parametres['curseur'] = curseur
+    return f'?{parametres.urlencode()}'
+
+
+def paginer_par_curseur(queryset, request, ordre, par_page=PAR_PAGE):
+    """
+    Pagine un queryset par curseur sur les champs de tri `ordre`.
+
+    Contrairement à OFFSET, chaque page est une lecture d'index à partir de la
+    dernière ligne affichée : le coût reste le même quelle que soit la page.
+    Le dernier champ de `ordre` doit être unique (en général 'id' ou '-id').
+    """
+    champs = [champ.lstrip('-') for champ in ordre]
+    valeurs, sens = None, None
+    if request.GET.get('curseur'):
+        valeurs, sens = _decoder_curseur(request.GET['curseur'], queryset.model, champs)
+
+    if sens == 'precedent':
+        lignes = list(
+            queryset.filter(_filtre_apres(ordre, valeurs, inverse=True))
+            .order_by(*_inverser(ordre))[:par_page + 1]
+        )
+        a_plus = len(lignes) > par_page
+        objets = lignes[:par_page][::-1]
+        a_precedente, a_suivante = a_plus, True
+    else:
+        if valeurs is not None:
+            queryset = queryset.filter(_filtre_apres(ordre, valeurs))
+        lignes = list(queryset.order_by(*ordre)[:par_page + 1])
+        objets = lignes[:par_page]
+        a_precedente, a_suivante = valeurs is not None, len(lignes) > par_page
+
+    url_precedente = url_suivante = None
+    if objets and a_precedente:
+        premier = [getattr(objets[0], champ) for champ in champs]
+        url_precedente = _url(request, _encoder_curseur(premier, 'precedent'))
+    if objets and a_suivante:
+        dernier = [getattr(objets[-1], champ) for champ in champs]
+        url_suivante = _url(request, _encoder_curseur(dernier, 'suivant'))
+    return PageCurseur(objets, url_precedente, url_suivante)
@@ -0,0 +1,118 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Valeurs littérales remplacées pour regrouper les requêtes de même forme
+LITTERAUX = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def empreinte_sql(sql):
+    """Forme de la requête sans ses valeurs : deux requêtes d'une boucle N+1 ont la même empreinte"""
+    for motif, remplacement in LITTERAUX:
+        sql = motif.sub(remplacement, sql)
+    return sql.strip()
+
+
+class ProfilRequetes:
+    """execute_wrapper qui relève l'empreinte et la durée de chaque requête SQL"""
+
+    def __init__(self):
+        self.requetes = []
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.requetes.append((empreinte_sql(sql), time.perf_counter() - debut))
+
+    def resultat(self, vue, chemin, duree):
+        doublons = Counter(empreinte for empreinte, _ in self.requetes)
+        seuil = getattr(settings, 'PROFILAGE_SEUIL_DOUBLONS', 5)
+        return {
+            'vue': vue,
+            'chemin': chemin,
+            'nb_requetes': len(self.requetes),
+            'temps_sql_ms': round(sum(duree_sql for _, duree_sql in self.requetes) * 1000, 2),
+            'temps_total_ms': round(duree * 1000, 2),
+            # Même requête répétée au moins `seuil` fois : boucle N+1 probable
+            'doublons': {empreinte: nombre for empreinte, nombre in doublons.most_common() if nombre >= seuil},
+        }
+
+
+def budget_requetes(vue):
+    """Nombre maximal de requêtes SQL accepté pour une vue (nom d'URL, par ex. 'etudiants:mes_cours')"""
+    return getattr(settings, 'PROFILAGE_BUDGETS', {}).get(vue, getattr(settings, 'PROFILAGE_BUDGET_REQUETES', 30))
+
+
+def depassements(resultat):
+    """Motifs pour lesquels une requête HTTP dépasse son budget"""
+    motifs = []
+    budget = budget_requetes(resultat['vue'])
+    if resultat['nb_requetes'] > budget:
+        motifs.append(f"{resultat['nb_requetes']} requêtes SQL (budget {budget})")
+    budget_temps = getattr(settings, 'PROFILAGE_BUDGET_TEMPS_SQL_MS', 200)
+    if resultat['temps_sql_ms'] > budget_temps:
+        motifs.append(f"{resultat['temps_sql_ms']} ms de SQL (budget {budget_temps} ms)")
+    if resultat['doublons']:
+        motifs.append(f"{len(resultat['doublons'])} requête(s) répétée(s) (N+1 probable)")
+    return motifs
+
+
+def enregistrer(resultat):
+    """Ajoute le profil au fichier PROFILAGE_FICHIER (une ligne JSON par requête HTTP), lu par rapport_requetes"""
+    fichier = getattr(settings, 'PROFILAGE_FICHIER', None)
+    if fichier:
+        with open(fichier, 'a', encoding='utf-8') as sortie:
+            sortie.write(json.dumps(resultat, ensure_ascii=False) + '\n')
+
+
+class ProfilageRequetesMiddleware:
+    """
+    Relève, pour chaque requête HTTP, le nombre de requêtes SQL, leur durée
+    totale et les requêtes répétées, et signale les vues hors budget.
+
+    Activé par PROFILAGE_REQUETES = True. Désactivé, le middleware est
+    retiré de la chaîne au démarrage (MiddlewareNotUsed) et ne coûte rien.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILAGE_REQUETES', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profil = ProfilRequetes()
+        debut = time.perf_counter()
+        with ExitStack() as pile:
+            for connexion in connections.all():
+                pile.enter_context(connexion.execute_wrapper(profil))
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        correspondance = request.resolver_match
+        vue = correspondance.view_name if correspondance else request.path
+        resultat = profil.resultat(vue, request.path, duree)
+        motifs = depassements(resultat)
+        if motifs:
+            resultat['depassements'] = motifs
+            logger.warning('%s (%s) : %s', vue, request.path, ', '.join(motifs))
+        enregistrer(resultat)
+
+        response['X-Requetes-SQL'] = str(resultat['nb_requetes'])
+        response['X-Temps-SQL'] = f"{resultat['temps_sql_ms']}ms"
+        return response
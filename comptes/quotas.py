@@ -0,0 +1,106 @@
+from django.apps import apps
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from .models import Utilisateur
+
+# Fichiers comptés dans l'espace de leur propriétaire : app.Modèle -> (champ fichier, chemin du propriétaire)
+FICHIERS_PAR_MODELE = {
+    'cours.Cours': ('fichier_pdf', 'enseignant'),
+    'devoirs.Devoir': ('fichier', 'cours__enseignant'),
+    'devoirs.Soumission': ('fichier', 'etudiant'),
+}
+
+
+def quota(utilisateur):
+    """Espace de stockage accordé à l'utilisateur, en octets (None : illimité)"""
+    return getattr(settings, 'QUOTAS_STOCKAGE', {}).get(utilisateur.role)
+
+
+def espace_disponible(utilisateur):
+    """Octets que l'utilisateur peut encore déposer (None : illimité)"""
+    limite = quota(utilisateur)
+    if limite is None:
+        return None
+    espace_utilise = Utilisateur.objects.filter(id=utilisateur.id).values_list('espace_utilise', flat=True).first() or 0
+    return max(limite - espace_utilise, 0)
+
+
+def _taille(fichier):
+    if not fichier:
+        return 0
+    try:
+        return fichier.size
+    except OSError:
+        # Fichier absent du disque : il n'occupe pas d'espace
+        return 0
+
+
+def _proprietaire(instance, chemin):
+    *relations, attribut = chemin.split('__')
+    for relation in relations:
+        instance = getattr(instance, relation)
+    return getattr(instance, f'{attribut}_id')
+
+
+def ajuster_espace(utilisateur_id, delta):
+    if utilisateur_id and delta:
+        Utilisateur.objects.filter(id=utilisateur_id).update(espace_utilise=F('espace_utilise') + delta)
+
+
+def recalculer_espace():
+    """
+    Recalcule l'espace utilisé de chaque utilisateur à partir des fichiers
+    sur le disque et corrige les dérives. Retourne {utilisateur_id: écart}.
+    """
+    totaux = {}
+    for nom_modele, (champ, proprietaire) in FICHIERS_PAR_MODELE.items():
+        modele = apps.get_model(nom_modele)
+        stockage = modele._meta.get_field(champ).storage
+        objets = modele.objects.exclude(**{champ: ''})
+        if nom_modele == 'devoirs.Soumission':
+            # Dépôts en attente : comptés par le worker quand il les finalise (devoirs.depots)
+            objets = objets.filter(depot_en_attente=False)
+        for utilisateur_id, nom in objets.values_list(proprietaire, champ).iterator():
+            if nom and stockage.exists(nom):
+                totaux[utilisateur_id] = totaux.get(utilisateur_id, 0) + stockage.size(nom)
+
+    ecarts = {}
+    for utilisateur_id, espace_utilise in Utilisateur.objects.values_list('id', 'espace_utilise').iterator():
+        ecart = totaux.get(utilisateur_id, 0) - espace_utilise
+        if ecart:
+            ecarts[utilisateur_id] = ecart
+            ajuster_espace(utilisateur_id, ecart)
+    return ecarts
+
+
+#----------------------------------Signaux----------------------------------
+def _memoriser_fichier(sender, instance, **kwargs):
+    # Le champ peut être différé (only/defer) : on ne déclenche pas de requête pour le lire
+    champ = FICHIERS_PAR_MODELE[sender._meta.label][0]
+    instance._fichier_initial = instance.__dict__.get(champ)
+
+
+def _compter_fichier(sender, instance, created, **kwargs):
+    champ, proprietaire = FICHIERS_PAR_MODELE[sender._meta.label]
+    fichier = getattr(instance, champ)
+    ancien = None if created else getattr(instance, '_fichier_initial', None)
+    ancien_nom = getattr(ancien, 'name', ancien) or ''
+    if ancien_nom != (fichier.name or ''):
+        # L'ancien fichier n'est supprimé qu'après la validation (comptes.stockage) : sa taille est encore lisible
+        ancienne_taille = fichier.storage.size(ancien_nom) if ancien_nom and fichier.storage.exists(ancien_nom) else 0
+        ajuster_espace(_proprietaire(instance, proprietaire), _taille(fichier) - ancienne_taille)
+    instance._fichier_initial = fichier.name
+
+
+def _decompter_fichier(sender, instance, **kwargs):
+    if getattr(instance, 'depot_en_attente', False):
+        return
+    champ, proprietaire = FICHIERS_PAR_MODELE[sender._meta.label]
+    ajuster_espace(_proprietaire(instance, proprietaire), -_taille(getattr(instance, champ)))
+
+
+for _modele in FICHIERS_PAR_MODELE:
+    post_init.connect(_memoriser_fichier, sender=_modele, dispatch_uid=f'quotas_init_{_modele}')
+    post_save.connect(_compter_fichier, sender=_modele, dispatch_uid=f'quotas_save_{_modele}')
+    post_delete.connect(_decompter_fichier, sender=_modele, dispatch_uid=f'quotas_delete_{_modele}')
@@ -0,0 +1,104 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Lectures de la requête en cours envoyées aux réplicas (vues marquées par lecture_sur_replica)
+_lecture_replica = ContextVar('lecture_replica', default=False)
+
+# Écriture faite pendant la requête en cours (RouteurReplicas.db_for_write), lue par LecturesReplicasMiddleware
+_ecriture = ContextVar('ecriture', default=False)
+
+# Cookie posé après une écriture : l'utilisateur relit la base principale le temps que les réplicas rattrapent
+COOKIE_PRIMAIRE = 'akalan_primaire'
+
+
+def replicas():
+    return getattr(settings, 'DATABASES_REPLICAS', [])
+
+
+def lecture_sur_replica(vue):
+    """
+    Envoie les lectures d'une vue de consultation (dashboard, liste) aux
+    réplicas. Les écritures restent sur la base principale, ainsi que les
+    requêtes autres que GET/HEAD et celles d'un utilisateur qui vient
+    d'écrire (cookie COOKIE_PRIMAIRE).
+    """
+    @wraps(vue)
+    def enveloppe(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or COOKIE_PRIMAIRE in request.COOKIES:
+            return vue(request, *args, **kwargs)
+        jeton = _lecture_replica.set(True)
+        try:
+            return vue(request, *args, **kwargs)
+        finally:
+            _lecture_replica.reset(jeton)
+    return enveloppe
+
+
+@contextmanager
+def sur_primaire():
+    """
+    Lit la base principale dans une vue marquée lecture_sur_replica : données
+    mises en cache ou recalculées puis enregistrées, qui ne doivent pas
+    refléter le retard d'un réplica.
+    """
+    jeton = _lecture_replica.set(False)
+    try:
+        yield
+    finally:
+        _lecture_replica.reset(jeton)
+
+
+class RouteurReplicas:
+    """
+    Routeur de DATABASE_ROUTERS quand DATABASES_REPLICAS n'est pas vide :
+    lectures des vues lecture_sur_replica sur un réplica tiré au hasard,
+    tout le reste (écritures, migrations) sur 'default' (None : choix par défaut de Django).
+    """
+
+    def db_for_read(self, model, **hints):
+        if _lecture_replica.get() and replicas():
+            return random.choice(replicas())
+        return None
+
+    def db_for_write(self, model, **hints):
+        _ecriture.set(True)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données sur toutes les bases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
+
+
+class LecturesReplicasMiddleware:
+    """
+    Pose COOKIE_PRIMAIRE pour REPLICAS_DELAI_PRIMAIRE secondes après chaque
+    requête d'écriture (POST..., ou GET qui a écrit en base comme les
+    suppressions des enseignants) : la page suivante, souvent une liste après
+    une redirection, relit la base principale. Retiré au démarrage sans réplica.
+    """
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        jeton = _ecriture.set(False)
+        try:
+            response = self.get_response(request)
+            ecriture = _ecriture.get()
+        finally:
+            _ecriture.reset(jeton)
+        if ecriture or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                COOKIE_PRIMAIRE, '1', max_age=getattr(settings, 'REPLICAS_DELAI_PRIMAIRE', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,87 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.utils import timezone
+
+
+class SessionStore(CachedDBStore):
+    """
+    Sessions lues dans le cache, écrites en base en différé (SESSION_ENGINE = 'comptes.sessions').
+
+    SESSION_SAVE_EVERY_REQUEST fait glisser l'expiration à chaque page : le
+    cache la suit exactement (durée de vie SESSION_COOKIE_AGE), mais la ligne
+    django_session n'est réécrite que si les données ont changé ou si
+    l'expiration a avancé d'au moins SESSION_SEUIL_PERSISTANCE secondes.
+    L'expiration en base est donc au plus en retard de ce seuil : sans le
+    cache, une session inactive expire un peu plus tôt, jamais plus tard ;
+    une ligne déjà supprimée par nettoyer_sessions est recréée à la
+    prochaine écriture.
+    """
+
+    cache_key_prefix = 'comptes.sessions.'
+
+    def __init__(self, session_key=None):
+        self._expiration_persistee = None
+        super().__init__(session_key)
+
+    def _mettre_en_cache(self, donnees, duree):
+        self._cache.set(self.cache_key, {'donnees': donnees, 'expiration_persistee': self._expiration_persistee}, duree)
+
+    def load(self):
+        try:
+            valeur = self._cache.get(self.cache_key)
+        except Exception:
+            # Clé refusée par le backend : la session est relue en base (voir cached_db)
+            valeur = None
+        if valeur is not None:
+            self._expiration_persistee = valeur['expiration_persistee']
+            return valeur['donnees']
+
+        session = self._get_session_from_db()
+        if session is None:
+            return {}
+        self._expiration_persistee = session.expire_date
+        donnees = self.decode(session.session_data)
+        self._mettre_en_cache(donnees, self.get_expiry_age(expiry=session.expire_date))
+        return donnees
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        donnees = self._get_session(no_load=must_create)
+        expiration = self.get_expiry_date()
+        seuil = timedelta(seconds=getattr(settings, 'SESSION_SEUIL_PERSISTANCE', 300))
+        if (
+            must_create or self.modified or self._expiration_persistee is None
+            or expiration - self._expiration_persistee >= seuil
+        ):
+            try:
+                DBStore.save(self, must_create)
+            except UpdateError:
+                # Ligne supprimée par le nettoyage (expirée en base, pas dans le cache) : recréée
+                DBStore.save(self, must_create=True)
+            self._expiration_persistee = expiration
+        self._mettre_en_cache(donnees, self.get_expiry_age())
+
+    @classmethod
+    def clear_expired(cls):
+        supprimer_sessions_expirees()
+
+
+def supprimer_sessions_expirees(taille_lot=None):
+    """
+    Supprime les sessions expirées par lots de `taille_lot` lignes, pour ne
+    pas verrouiller django_session le temps d'un seul grand DELETE.
+    Retourne le nombre de sessions supprimées.
+    """
+    taille_lot = taille_lot or getattr(settings, 'SESSIONS_TAILLE_LOT', 1000)
+    modele = SessionStore.get_model_class()
+    now = timezone.now()
+    supprimees = 0
+    while True:
+        cles = list(modele.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:taille_lot])
+        if not cles:
+            return supprimees
+        supprimees += modele.objects.filter(session_key__in=cles).delete()[0]
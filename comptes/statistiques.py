@@ -0,0 +1,165 @@
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from .models import Utilisateur, CompteurStatistique
+from .replicas import sur_primaire
+
+# Compteur associé à chaque rôle d'utilisateur
+CLES_ROLES = {
+    'admin': 'total_admins',
+    'enseignant': 'total_enseignants',
+    'etudiant': 'total_etudiants',
+}
+
+CLES = (
+    'total_admins',
+    'total_enseignants',
+    'total_etudiants',
+    'total_cours',
+    'total_devoirs',
+    'total_inscriptions',
+    'total_soumissions',
+    'soumissions_a_temps',
+    'soumissions_en_retard',
+)
+
+
+def calculer_statistiques():
+    """Calcule les valeurs exactes de tous les compteurs à partir des tables"""
+    from cours.models import Cours, Inscription
+    from devoirs.models import Devoir, Soumission
+
+    roles = Utilisateur.objects.aggregate(**{
+        cle: Count('id', filter=Q(role=role)) for role, cle in CLES_ROLES.items()
+    })
+    # Les dépôts en attente sont comptés par le worker quand il les finalise (devoirs.depots)
+    soumissions = Soumission.objects.filter(depot_en_attente=False).aggregate(
+        total_soumissions=Count('id'),
+        soumissions_a_temps=Count('id', filter=Q(en_retard=False)),
+        soumissions_en_retard=Count('id', filter=Q(en_retard=True)),
+    )
+    return {
+        **roles,
+        'total_cours': Cours.objects.count(),
+        'total_devoirs': Devoir.objects.count(),
+        'total_inscriptions': Inscription.objects.count(),
+        **soumissions,
+    }
+
+
+def recalculer_statistiques():
+    """
+    Remplace les compteurs par leurs valeurs exactes pour corriger toute dérive
+    (suppressions en masse, bulk_create, update() sur les tables...).
+    Retourne l'écart constaté pour chaque compteur.
+    """
+    valeurs = calculer_statistiques()
+    actuelles = dict(CompteurStatistique.objects.values_list('cle', 'valeur'))
+    ecarts = {}
+    for cle, valeur in valeurs.items():
+        if actuelles.get(cle) != valeur:
+            ecarts[cle] = valeur - actuelles.get(cle, 0)
+            CompteurStatistique.objects.update_or_create(cle=cle, defaults={'valeur': valeur})
+    return ecarts
+
+
+def lire_statistiques():
+    """Lit tous les compteurs en une seule requête"""
+    valeurs = dict(CompteurStatistique.objects.values_list('cle', 'valeur'))
+    if any(cle not in valeurs for cle in CLES):
+        with sur_primaire():
+            recalculer_statistiques()
+            valeurs = dict(CompteurStatistique.objects.values_list('cle', 'valeur'))
+    return valeurs
+
+
+def incrementer(cle, delta=1):
+    """Met à jour un compteur de manière atomique (UPDATE ... SET valeur = valeur + delta)"""
+    if not delta:
+        return
+    mis_a_jour = CompteurStatistique.objects.filter(cle=cle).update(valeur=F('valeur') + delta)
+    if not mis_a_jour:
+        # Compteurs jamais initialisés : on repart des valeurs exactes
+        recalculer_statistiques()
+
+
+def _cle_soumission(soumission):
+    if soumission.en_retard:
+        return 'soumissions_en_retard'
+    return 'soumissions_a_temps'
+
+
+@receiver(post_init, sender=Utilisateur)
+def memoriser_role(sender, instance, **kwargs):
+    # Le rôle peut être différé (only/defer) : on ne déclenche pas de requête pour le lire
+    instance._role_initial = instance.__dict__.get('role')
+
+
+@receiver(post_save, sender=Utilisateur)
+def compter_utilisateur(sender, instance, created, **kwargs):
+    if created:
+        ancien_role = None
+    else:
+        ancien_role = getattr(instance, '_role_initial', None)
+        if ancien_role is None or ancien_role == instance.role:
+            instance._role_initial = instance.role
+            return
+    if ancien_role in CLES_ROLES:
+        incrementer(CLES_ROLES[ancien_role], -1)
+    if instance.role in CLES_ROLES:
+        incrementer(CLES_ROLES[instance.role])
+    instance._role_initial = instance.role
+
+
+@receiver(post_delete, sender=Utilisateur)
+def decompter_utilisateur(sender, instance, **kwargs):
+    if instance.role in CLES_ROLES:
+        incrementer(CLES_ROLES[instance.role], -1)
+
+
+@receiver(post_save, sender='cours.Cours')
+def compter_cours(sender, instance, created, **kwargs):
+    if created:
+        incrementer('total_cours')
+
+
+@receiver(post_delete, sender='cours.Cours')
+def decompter_cours(sender, instance, **kwargs):
+    incrementer('total_cours', -1)
+
+
+@receiver(post_save, sender='devoirs.Devoir')
+def compter_devoir(sender, instance, created, **kwargs):
+    if created:
+        incrementer('total_devoirs')
+
+
+@receiver(post_delete, sender='devoirs.Devoir')
+def decompter_devoir(sender, instance, **kwargs):
+    incrementer('total_devoirs', -1)
+
+
+@receiver(post_save, sender='cours.Inscription')
+def compter_inscription(sender, instance, created, **kwargs):
+    if created:
+        incrementer('total_inscriptions')
+
+
+@receiver(post_delete, sender='cours.Inscription')
+def decompter_inscription(sender, instance, **kwargs):
+    incrementer('total_inscriptions', -1)
+
+
+@receiver(post_save, sender='devoirs.Soumission')
+def compter_soumission(sender, instance, created, **kwargs):
+    if created:
+        incrementer('total_soumissions')
+        incrementer(_cle_soumission(instance))
+
+
+@receiver(post_delete, sender='devoirs.Soumission')
+def decompter_soumission(sender, instance, **kwargs):
+    if instance.depot_en_attente:
+        return
+    incrementer('total_soumissions', -1)
+    incrementer(_cle_soumission(instance), -1)
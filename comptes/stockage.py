@@ -0,0 +1,282 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import Counter
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from .models import ContenuFichier, ReferenceFichier
+
+# Dossier (relatif à MEDIA_ROOT) où chaque contenu est écrit une seule fois
+DOSSIER_CONTENUS = 'contenus'
+
+TAILLE_LECTURE = 1024 * 1024
+
+# Champs fichiers stockés par contenu : (app.Modèle, champ)
+CHAMPS_FICHIERS = [
+    ('cours.Cours', 'fichier_pdf'),
+    ('devoirs.Devoir', 'fichier'),
+    ('devoirs.Soumission', 'fichier'),
+    ('devoirs.Soumission', 'fichier_web'),
+]
+
+
+class StockageDedoublonne(FileSystemStorage):
+    """
+    Stockage des fichiers déposés, dédoublonnés par contenu.
+
+    Chaque contenu est écrit une seule fois sous contenus/<aa>/<sha256>.
+    Le nom habituel (cours/pdf/..., devoirs/..., soumissions/...) est un lien
+    physique vers ce contenu : les lectures, les URL et X-Accel-Redirect ne
+    changent pas. Les références sont comptées dans ContenuFichier et le
+    contenu est supprimé avec sa dernière référence.
+    """
+
+    def chemin_contenu(self, sha256):
+        return os.path.join(self.location, DOSSIER_CONTENUS, sha256[:2], sha256)
+
+    def _save(self, name, content):
+        dossier = os.path.join(self.location, DOSSIER_CONTENUS)
+        os.makedirs(dossier, exist_ok=True)
+        # Le contenu est écrit une fois à côté des contenus existants pendant le calcul de l'empreinte
+        descripteur, temporaire = tempfile.mkstemp(dir=dossier)
+        try:
+            empreinte = hashlib.sha256()
+            taille = 0
+            with os.fdopen(descripteur, 'wb') as sortie:
+                for bloc in content.chunks():
+                    empreinte.update(bloc)
+                    sortie.write(bloc)
+                    taille += len(bloc)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporaire, self.file_permissions_mode)
+            name = self._referencer(name, empreinte.hexdigest(), taille, temporaire)
+        finally:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+        return str(name).replace('\\', '/')
+
+    def _referencer(self, name, sha256, taille, source, remplacer=False):
+        """
+        Enregistre `name` comme une référence au contenu `sha256`.
+        `source` devient le contenu s'il n'existe pas encore ; sinon, avec
+        `remplacer`, le fichier `name` déjà présent est remplacé par un lien.
+        """
+        chemin_contenu = self.chemin_contenu(sha256)
+        with transaction.atomic():
+            contenu, _ = ContenuFichier.objects.select_for_update().get_or_create(
+                sha256=sha256, defaults={'taille': taille},
+            )
+            if not os.path.exists(chemin_contenu):
+                os.makedirs(os.path.dirname(chemin_contenu), exist_ok=True)
+                if remplacer:
+                    os.link(source, chemin_contenu)
+                else:
+                    os.replace(source, chemin_contenu)
+            elif remplacer and not os.path.samefile(source, chemin_contenu):
+                lien = f'{source}.{sha256[:8]}.lien'
+                os.link(chemin_contenu, lien)
+                os.replace(lien, source)
+            if not remplacer:
+                name = self._lier(chemin_contenu, name)
+            ReferenceFichier.objects.create(nom=name, contenu=contenu)
+            ContenuFichier.objects.filter(id=contenu.id).update(nb_references=F('nb_references') + 1)
+        return name
+
+    def _lier(self, chemin_contenu, name):
+        while True:
+            chemin = self.path(name)
+            os.makedirs(os.path.dirname(chemin), exist_ok=True)
+            try:
+                os.link(chemin_contenu, chemin)
+                return name
+            except FileExistsError:
+                # Nom pris entre get_available_name() et le lien
+                name = self.get_available_name(name)
+
+    def dupliquer(self, name, noms):
+        """
+        Ajoute `noms` comme références au contenu déjà stocké sous `name`,
+        en un nombre constant de requêtes (données générées en masse).
+        Retourne les noms effectivement attribués, dans le même ordre.
+        """
+        contenu = ReferenceFichier.objects.select_related('contenu').get(nom=name).contenu
+        chemin_contenu = self.chemin_contenu(contenu.sha256)
+        noms = [self._lier(chemin_contenu, self.get_available_name(nom)) for nom in noms]
+        with transaction.atomic():
+            ReferenceFichier.objects.bulk_create(
+                [ReferenceFichier(nom=nom, contenu=contenu) for nom in noms], batch_size=1000,
+            )
+            ContenuFichier.objects.filter(id=contenu.id).update(nb_references=F('nb_references') + len(noms))
+        return noms
+
+    def delete(self, name):
+        self.supprimer([name])
+
+    def supprimer(self, noms):
+        """
+        Supprime des fichiers et leurs références en un nombre constant de
+        requêtes ; les contenus qui n'ont plus de référence sont libérés.
+        """
+        noms = set(noms)
+        with transaction.atomic():
+            references = list(ReferenceFichier.objects.filter(nom__in=noms).values_list('id', 'contenu_id'))
+            for nom in noms:
+                super().delete(nom)
+            if not references:
+                return
+            ReferenceFichier.objects.filter(id__in=[reference_id for reference_id, _ in references]).delete()
+            retirees = Counter(contenu_id for _, contenu_id in references)
+            contenus = list(ContenuFichier.objects.select_for_update().filter(id__in=retirees))
+            for contenu in contenus:
+                contenu.nb_references -= retirees[contenu.id]
+            liberes = [contenu for contenu in contenus if contenu.nb_references <= 0]
+            ContenuFichier.objects.bulk_update(
+                [contenu for contenu in contenus if contenu.nb_references > 0], ['nb_references'],
+            )
+            ContenuFichier.objects.filter(id__in=[contenu.id for contenu in liberes]).delete()
+            for contenu in liberes:
+                try:
+                    os.remove(self.chemin_contenu(contenu.sha256))
+                except FileNotFoundError:
+                    pass
+
+    def annuler(self, name):
+        """
+        Retire un fichier enregistré dans une transaction annulée : le ROLLBACK a
+        effacé ses lignes ContenuFichier/ReferenceFichier, mais pas le lien `name`
+        ni le contenu s'il venait d'être écrit.
+        """
+        chemin = self.path(name)
+        if not os.path.exists(chemin) or ReferenceFichier.objects.filter(nom=name).exists():
+            return
+        chemin_contenu = self.chemin_contenu(_empreinte_fichier(chemin))
+        os.remove(chemin)
+        # Contenu sans ligne ni autre lien : il n'existait que pour ce fichier
+        if not ContenuFichier.objects.filter(sha256=os.path.basename(chemin_contenu)).exists():
+            try:
+                if os.stat(chemin_contenu).st_nlink == 1:
+                    os.remove(chemin_contenu)
+            except FileNotFoundError:
+                pass
+
+
+stockage_dedoublonne = StockageDedoublonne()
+
+
+def stockage_fichiers():
+    """Stockage des FileField de cours et devoirs (callable pour que les migrations n'en dépendent pas)"""
+    return stockage_dedoublonne
+
+
+def _empreinte_fichier(chemin):
+    empreinte = hashlib.sha256()
+    with open(chemin, 'rb') as fichier:
+        for bloc in iter(lambda: fichier.read(TAILLE_LECTURE), b''):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def dedoublonner_fichiers_existants(stockage=None):
+    """
+    Rattache au stockage par contenu les fichiers déposés avant sa mise en place.
+    Les doublons sont remplacés par des liens vers un seul contenu.
+    Retourne le nombre de fichiers traités, de fichiers manquants et d'octets libérés.
+    """
+    from django.apps import apps
+
+    stockage = stockage or stockage_dedoublonne
+    noms = set()
+    for modele, champ in CHAMPS_FICHIERS:
+        noms.update(
+            apps.get_model(modele).objects.exclude(**{f'{champ}__isnull': True})
+            .exclude(**{champ: ''}).values_list(champ, flat=True)
+        )
+    noms -= set(ReferenceFichier.objects.values_list('nom', flat=True))
+
+    resultat = {'fichiers': 0, 'manquants': 0, 'octets_liberes': 0}
+    for nom in sorted(noms):
+        chemin = stockage.path(nom)
+        if not os.path.isfile(chemin):
+            resultat['manquants'] += 1
+            continue
+        sha256 = _empreinte_fichier(chemin)
+        taille = os.path.getsize(chemin)
+        doublon = os.path.exists(stockage.chemin_contenu(sha256)) and not os.path.samefile(chemin, stockage.chemin_contenu(sha256))
+        stockage._referencer(nom, sha256, taille, chemin, remplacer=True)
+        resultat['fichiers'] += 1
+        if doublon:
+            resultat['octets_liberes'] += taille
+    return resultat
+
+
+#----------------------------------Signaux----------------------------------
+# Fichiers à supprimer à la validation de la transaction en cours : {stockage: noms}
+_a_supprimer = threading.local()
+
+
+def _planifier_suppression(stockage, nom):
+    if not hasattr(_a_supprimer, 'noms'):
+        _a_supprimer.noms = {}
+    _a_supprimer.noms.setdefault(stockage, set()).add(nom)
+    transaction.on_commit(_supprimer_en_attente)
+
+
+def _supprimer_en_attente():
+    """
+    Supprime en une passe les fichiers retirés ou remplacés dans la
+    transaction, sauf ceux qu'un autre enregistrement référence encore.
+    """
+    from django.apps import apps
+
+    attente, _a_supprimer.noms = getattr(_a_supprimer, 'noms', {}), {}
+    if not attente:
+        return
+    tous = set().union(*attente.values())
+    for modele, champ in CHAMPS_FICHIERS:
+        tous -= set(apps.get_model(modele).objects.filter(**{f'{champ}__in': tous}).values_list(champ, flat=True))
+    for stockage, noms in attente.items():
+        noms &= tous
+        if noms and hasattr(stockage, 'supprimer'):
+            stockage.supprimer(noms)
+        elif noms:
+            for nom in noms:
+                stockage.delete(nom)
+
+
+def _champs(sender):
+    return [champ for modele, champ in CHAMPS_FICHIERS if modele == sender._meta.label]
+
+
+def _memoriser_noms(sender, instance, **kwargs):
+    # Champs différés (only/defer) non lus : leur remplacement n'est pas suivi
+    instance._noms_stockes = {
+        champ: getattr(instance.__dict__[champ], 'name', instance.__dict__[champ]) or ''
+        for champ in _champs(sender) if champ in instance.__dict__
+    }
+
+
+def _liberer_anciens(sender, instance, created, **kwargs):
+    """Un fichier remplacé (formulaire de modification) est supprimé après la validation"""
+    anciens = getattr(instance, '_noms_stockes', {})
+    for champ in _champs(sender):
+        fichier = getattr(instance, champ)
+        ancien = anciens.get(champ, '')
+        if not created and ancien and ancien != (fichier.name or ''):
+            _planifier_suppression(fichier.storage, ancien)
+    _memoriser_noms(sender, instance)
+
+
+def _liberer_supprimes(sender, instance, **kwargs):
+    for champ in _champs(sender):
+        fichier = getattr(instance, champ)
+        if fichier:
+            _planifier_suppression(fichier.storage, fichier.name)
+
+
+for _modele in {modele for modele, _ in CHAMPS_FICHIERS}:
+    post_init.connect(_memoriser_noms, sender=_modele, dispatch_uid=f'stockage_init_{_modele}')
+    post_save.connect(_liberer_anciens, sender=_modele, dispatch_uid=f'stockage_save_{_modele}')
+    post_delete.connect(_liberer_supprimes, sender=_modele, dispatch_uid=f'stockage_delete_{_modele}')
@@ -0,0 +1,135 @@
+from functools import wraps
+from django.conf import settings
+from django.contrib import messages
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.shortcuts import redirect
+from .quotas import espace_disponible
+
+# Marge pour les autres champs du formulaire dans la taille totale de la requête
+MARGE_FORMULAIRE = 64 * 1024
+
+# Signatures en début de fichier : (octets, type MIME)
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'PK\x03\x04', 'application/zip'),  # zip, docx, xlsx, odt...
+    (b'PK\x05\x06', 'application/zip'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword'),  # doc, xls (OLE)
+    (b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+]
+
+# Marques ISO-BMFF des photos HEIF/HEIC (iPhone...)
+MARQUES_HEIF = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'mif1', b'msf1'}
+
+
+def type_contenu(debut):
+    """Type MIME déduit des premiers octets du fichier (le type annoncé par le navigateur est ignoré)"""
+    for signature, type_mime in SIGNATURES:
+        if debut.startswith(signature):
+            return type_mime
+    if debut[:4] == b'RIFF' and debut[8:12] == b'WEBP':
+        return 'image/webp'
+    if debut[4:8] == b'ftyp' and debut[8:12] in MARQUES_HEIF:
+        return 'image/heic'
+    if debut and b'\x00' not in debut:
+        try:
+            # Le bloc peut couper un caractère multi-octets en fin de lecture
+            debut[:-3].decode('utf-8')
+            return 'text/plain'
+        except UnicodeDecodeError:
+            pass
+    return 'application/octet-stream'
+
+
+def limite_champ(nom_champ):
+    """Taille maximale et types autorisés pour un champ fichier"""
+    limites = getattr(settings, 'LIMITES_ENVOI', {})
+    defaut = getattr(settings, 'LIMITE_ENVOI_DEFAUT', {'taille_max': 10 * 1024 * 1024, 'types': None})
+    return {**defaut, **limites.get(nom_champ, {})}
+
+
+def type_autorise(type_mime, types):
+    if types is None:
+        return True
+    return any(
+        type_mime == autorise or (autorise.endswith('/*') and type_mime.startswith(autorise[:-1]))
+        for autorise in types
+    )
+
+
+def _en_mo(taille):
+    return f'{taille / (1024 * 1024):.0f} Mo'
+
+
+class GestionnaireEnvoiLimite(TemporaryFileUploadHandler):
+    """
+    Reçoit les fichiers directement dans un fichier temporaire et les refuse
+    dès le bloc qui dépasse la limite du champ (LIMITES_ENVOI), dès le
+    premier bloc si son type réel n'est pas autorisé, ou dès que le quota de
+    l'utilisateur est atteint.
+
+    La réception s'arrête sans lire la suite de la requête : le motif est
+    placé dans request.refus_envoi et affiché par le décorateur verifier_envoi.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.taille_requete = content_length
+        self.recu_requete = 0
+        self.disponible = False  # calculé au premier fichier
+        return super().handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, field_name, *args, **kwargs):
+        self.limite = limite_champ(field_name)
+        self.recu = 0
+        self.file = None
+        if self.disponible is False:
+            utilisateur = getattr(self.request, 'user', None)
+            self.disponible = espace_disponible(utilisateur) if utilisateur and utilisateur.is_authenticated else None
+
+        # La taille annoncée de la requête suffit souvent à refuser sans rien lire
+        if self.taille_requete and self.taille_requete > self.limite['taille_max'] + MARGE_FORMULAIRE:
+            self._refuser(f"Le fichier dépasse la taille maximale autorisée ({_en_mo(self.limite['taille_max'])}).")
+        if self.disponible is not None and self.taille_requete and self.taille_requete > self.disponible + MARGE_FORMULAIRE:
+            self._refuser("Votre espace de stockage est insuffisant pour ce fichier.")
+        super().new_file(field_name, *args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and not type_autorise(type_contenu(raw_data[:4096]), self.limite['types']):
+            self._refuser("Ce type de fichier n'est pas accepté.")
+        self.recu += len(raw_data)
+        self.recu_requete += len(raw_data)
+        if self.recu > self.limite['taille_max']:
+            self._refuser(f"Le fichier dépasse la taille maximale autorisée ({_en_mo(self.limite['taille_max'])}).")
+        if self.disponible is not None and self.recu_requete > self.disponible:
+            self._refuser("Votre espace de stockage est insuffisant pour ce fichier.")
+        return super().receive_data_chunk(raw_data, start)
+
+    def _refuser(self, motif):
+        self.request.refus_envoi = motif
+        if getattr(self, 'file', None) is not None:
+            # Supprime le fichier temporaire partiel
+            self.file.close()
+        raise StopUpload(connection_reset=True)
+
+
+def verifier_envoi(vue):
+    """
+    Renvoie sur la même page avec le motif du refus quand un fichier de la
+    requête a été refusé pendant la réception.
+    """
+    @wraps(vue)
+    def enveloppe(request, *args, **kwargs):
+        if request.method == 'POST' and request.content_type == 'multipart/form-data':
+            request.FILES  # noqa: B018 - déclenche la réception si elle n'a pas déjà eu lieu
+            refus = getattr(request, 'refus_envoi', None)
+            if refus:
+                messages.error(request, refus)
+                return redirect(request.get_full_path())
+        return vue(request, *args, **kwargs)
+    return enveloppe
@@ -1,3 +1,1385 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from urllib.parse import quote
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .emails import traiter_file
+from .exports import flux_export, lignes_export
+from .generation import PDF_GENERE, generer_etablissement
+from .imports import lire_csv, importer_invitations
+from .apercus import traiter_file as generer_apercus
+from .charge import centile, rapport
+from .acces import cle_acces, contexte_acces
+from .caches import cle_modele
+from .agregats import cle_classe, cle_devoir, cle_etudiant, cles_note, lire_agregats, recalculer_agregats, reconstruire_agregats
+from .models import Utilisateur, Classe, Invitation, EmailSortant, CompteurStatistique, AgregatNotes, Note, ContenuFichier, ReferenceFichier, ApercuFichier
+from .pagination import paginer_par_curseur
+from .profilage import ProfilageRequetesMiddleware, empreinte_sql
+from .quotas import recalculer_espace
+from .replicas import COOKIE_PRIMAIRE, LecturesReplicasMiddleware, RouteurReplicas, lecture_sur_replica, sur_primaire
+from .sessions import SessionStore
+from .statistiques import calculer_statistiques, lire_statistiques, recalculer_statistiques
+from .stockage import dedoublonner_fichiers_existants, stockage_dedoublonne
+from .televersements import type_contenu
+from . import urls as comptes_urls
+from cours.models import Cours, Inscription
+from cours.services import etudiant_a_acces, inscrire_classe_au_cours
+from devoirs.depots import traiter_file as finaliser_depots
+from devoirs.models import Devoir, Soumission
+from enseignants import urls as enseignants_urls
+from etudiants import urls as etudiants_urls
 
-# Create your tests here.
+
+def cache_partage(nom):
+    """Réglages de production (CACHE_REDIS_URL) simulés par un cache mémoire : sessions, accès et fragments en cache"""
+    return override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': nom}},
+        SESSION_ENGINE='comptes.sessions', ACCES_CACHE_DUREE=300, FRAGMENTS_CACHE_DUREE=600,
+    )
+
+
+class FileEmailsTests(TestCase):
+    """Tests de la file d'attente des emails d'invitation"""
+
+    def setUp(self):
+        self.admin = Utilisateur.objects.create_user(
+            username='admin', password='secret', role='admin'
+        )
+        self.client.force_login(self.admin)
+
+    def test_invitation_mise_en_file_sans_envoi_synchrone(self):
+        response = self.client.post(reverse('admin_inviter_enseignant'), {'email': 'prof@example.com'})
+        self.assertRedirects(response, reverse('admin_utilisateurs'), fetch_redirect_response=False)
+        self.assertEqual(len(mail.outbox), 0)
+
+        email = EmailSortant.objects.get()
+        self.assertEqual(email.destinataire, 'prof@example.com')
+        self.assertEqual(email.invitation.statut_envoi, 'en_file')
+
+    def test_worker_envoie_et_met_a_jour_invitation(self):
+        for i in range(3):
+            self.client.post(reverse('admin_inviter_etudiant'), {'email': f'eleve{i}@example.com'})
+
+        self.assertEqual(traiter_file(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(EmailSortant.objects.exclude(statut='envoye').exists())
+        self.assertFalse(Invitation.objects.exclude(statut_envoi='envoyee').exists())
+        # Un second passage ne renvoie rien
+        self.assertEqual(traiter_file(), (0, 0))
+
+    def test_echec_replanifie_avec_delai(self):
+        self.client.post(reverse('admin_inviter_enseignant'), {'email': 'prof@example.com'})
+
+        with mock.patch('comptes.emails.EmailMultiAlternatives.send', side_effect=OSError('SMTP indisponible')):
+            with self.assertLogs('comptes.emails', 'ERROR'):
+                self.assertEqual(traiter_file(), (0, 1))
+
+        email = EmailSortant.objects.get()
+        self.assertEqual(email.statut, 'en_attente')
+        self.assertEqual(email.tentatives, 1)
+        self.assertGreater(email.prochaine_tentative, timezone.now())
+        self.assertEqual(email.invitation.statut_envoi, 'en_file')
+
+        with self.settings(EMAIL_FILE_MAX_TENTATIVES=2):
+            EmailSortant.objects.update(prochaine_tentative=timezone.now())
+            with mock.patch('comptes.emails.EmailMultiAlternatives.send', side_effect=OSError('SMTP indisponible')):
+                with self.assertLogs('comptes.emails', 'ERROR'):
+                    traiter_file()
+
+        email.refresh_from_db()
+        self.assertEqual(email.statut, 'echec')
+        self.assertEqual(email.invitation.statut_envoi, 'echec')
+
+
+class ImportInvitationsTests(TestCase):
+    """Tests de l'import CSV d'invitations"""
+
+    def setUp(self):
+        self.admin = Utilisateur.objects.create_user(
+            username='admin', password='secret', role='admin', email='admin@example.com'
+        )
+        self.classe = Classe.objects.create(nom='Terminale A')
+
+    def csv(self, nb_etudiants, debut=0):
+        lignes = ['email;role;classe']
+        lignes += [f'eleve{i}@example.com;etudiant;Terminale A' for i in range(debut, debut + nb_etudiants)]
+        return '\n'.join(lignes).encode('utf-8')
+
+    def test_resultats_par_ligne(self):
+        contenu = '\n'.join([
+            'email,role,classe',
+            'prof@example.com,enseignant,',
+            'eleve@example.com,étudiant,Terminale A',
+            'eleve@example.com,etudiant,Terminale A',
+            'admin@example.com,enseignant,',
+            'pas-un-email,etudiant,',
+            'autre@example.com,directeur,',
+            'inconnu@example.com,etudiant,Classe fantôme',
+        ])
+        resultats = importer_invitations(lire_csv(contenu), cree_par=self.admin)
+
+        self.assertEqual(
+            [resultat['statut'] for resultat in resultats],
+            ['cree', 'cree', 'erreur', 'erreur', 'erreur', 'erreur', 'erreur'],
+        )
+        self.assertEqual([resultat['ligne'] for resultat in resultats], list(range(2, 9)))
+        invitation = Invitation.objects.get(email='eleve@example.com')
+        self.assertEqual(invitation.classe, self.classe)
+        self.assertEqual(len(invitation.token), 64)
+        self.assertEqual(EmailSortant.objects.filter(invitation__isnull=False).count(), 2)
+
+        # Réimporter le même fichier ignore les invitations déjà en attente
+        resultats = importer_invitations(lire_csv(contenu), cree_par=self.admin)
+        self.assertEqual(resultats[0]['statut'], 'ignore')
+
+    def test_nombre_de_requetes_constant(self):
+        with CaptureQueriesContext(connection) as petit_import:
+            importer_invitations(lire_csv(self.csv(5)), cree_par=self.admin)
+        with CaptureQueriesContext(connection) as grand_import:
+            importer_invitations(lire_csv(self.csv(80, debut=5)), cree_par=self.admin)
+
+        self.assertEqual(len(grand_import.captured_queries), len(petit_import.captured_queries))
+        self.assertEqual(EmailSortant.objects.count(), 85)
+
+    def test_vue_import(self):
+        self.client.force_login(self.admin)
+        fichier = SimpleUploadedFile('promo.csv', self.csv(3), content_type='text/csv')
+        response = self.client.post(reverse('admin_importer_invitations'), {'fichier': fichier})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['nb_crees'], 3)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class PaginationCurseurTests(TestCase):
+    """Tests de la pagination par curseur des listes de l'administration"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        date = timezone.now()
+        # Plusieurs utilisateurs partagent la même date : l'id départage le tri
+        Utilisateur.objects.bulk_create([
+            Utilisateur(username=f'user{i:02d}', role='etudiant', date_joined=date - timedelta(days=i // 3))
+            for i in range(25)
+        ])
+        self.queryset = Utilisateur.objects.all()
+        self.ordre = ['-date_joined', '-id']
+
+    def page(self, url):
+        return paginer_par_curseur(self.queryset, self.factory.get(url), self.ordre, par_page=10)
+
+    def test_parcours_avant_et_arriere(self):
+        attendus = list(self.queryset.order_by(*self.ordre))
+
+        pages = [self.page('/admin/utilisateurs/?role=etudiant')]
+        self.assertIsNone(pages[0].url_precedente)
+        while pages[-1].url_suivante:
+            pages.append(self.page(pages[-1].url_suivante))
+        self.assertEqual([len(page.objets) for page in pages], [10, 10, 5])
+        self.assertEqual([objet for page in pages for objet in page.objets], attendus)
+        self.assertIn('role=etudiant', pages[1].url_suivante)
+
+        precedente = self.page(pages[-1].url_precedente)
+        self.assertEqual(precedente.objets, pages[1].objets)
+        premiere = self.page(precedente.url_precedente)
+        self.assertEqual(premiere.objets, pages[0].objets)
+        self.assertIsNone(premiere.url_precedente)
+
+    def test_curseur_invalide(self):
+        self.assertEqual(len(self.page('/?curseur=invalide').objets), 10)
+
+    def test_vues_listes(self):
+        admin = Utilisateur.objects.create_user(username='admin', password='secret', role='admin')
+        self.client.force_login(admin)
+        for nom_url in ('admin_utilisateurs', 'admin_cours', 'admin_devoirs', 'admin_classes'):
+            response = self.client.get(reverse(nom_url), {'search': 'user'})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('admin_utilisateurs'), {'search': 'user1'})
+        self.assertEqual(len(response.context['utilisateurs']), 10)
+
+        # Totaux par rôle lus dans les compteurs, total d'une recherche plafonné
+        stats = response.context['stats']
+        self.assertEqual((stats['admin'], stats['etudiant']), (1, Utilisateur.objects.filter(role='etudiant').count()))
+        with mock.patch('comptes.views.LIMITE_TOTAL_RECHERCHE', 3):
+            response = self.client.get(reverse('admin_utilisateurs'), {'search': 'user'})
+        self.assertContains(response, '3+')
+        response = self.client.get(reverse('admin_utilisateurs'), {'role': 'admin'})
+        self.assertEqual(response.context['stats']['total'], 1)
+
+
+class StatistiquesDashboardTests(TestCase):
+    """Tests des compteurs du dashboard admin"""
+
+    def setUp(self):
+        self.admin = Utilisateur.objects.create_user(username='admin', password='secret', role='admin')
+        self.enseignant = Utilisateur.objects.create_user(username='prof', role='enseignant')
+        self.classe = Classe.objects.create(nom='Terminale A')
+
+    def creer_donnees(self, nb_etudiants):
+        etudiants = [
+            Utilisateur.objects.create_user(username=f'eleve{Utilisateur.objects.count()}', role='etudiant', classe=self.classe)
+            for _ in range(nb_etudiants)
+        ]
+        cours = Cours.objects.create(titre='Maths', description='', enseignant=self.enseignant, classe=self.classe)
+        inscrire_classe_au_cours(cours)
+        now = timezone.now()
+        passe = Devoir.objects.create(cours=cours, titre='Passé', description='', deadline=now - timedelta(days=1))
+        futur = Devoir.objects.create(cours=cours, titre='Futur', description='', deadline=now + timedelta(days=1))
+        for etudiant in etudiants:
+            Soumission.objects.create(devoir=passe, etudiant=etudiant, fichier='soumissions/a.pdf')
+            Soumission.objects.create(devoir=futur, etudiant=etudiant, fichier='soumissions/b.pdf')
+        return cours
+
+    def test_compteurs_suivent_les_modifications(self):
+        cours = self.creer_donnees(3)
+        self.assertEqual(recalculer_statistiques(), {})
+        stats = lire_statistiques()
+        self.assertEqual(stats['total_etudiants'], 3)
+        self.assertEqual(stats['total_inscriptions'], 3)
+        self.assertEqual(stats['soumissions_en_retard'], 3)
+        self.assertEqual(stats['soumissions_a_temps'], 3)
+
+        Utilisateur.objects.filter(role='etudiant').first().delete()
+        self.enseignant.role = 'admin'
+        self.enseignant.save()
+        Devoir.objects.filter(titre='Futur').get().delete()
+        self.assertEqual(recalculer_statistiques(), {})
+
+        cours.delete()
+        self.assertEqual(recalculer_statistiques(), {})
+        self.assertEqual(lire_statistiques()['total_cours'], 0)
+
+    def test_dashboard_nombre_de_requetes_constant(self):
+        self.client.force_login(self.admin)
+        self.creer_donnees(2)
+        with CaptureQueriesContext(connection) as petit:
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['total_soumissions'], 4)
+
+        self.creer_donnees(10)
+        with CaptureQueriesContext(connection) as grand:
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['total_soumissions'], 24)
+        self.assertEqual(len(grand.captured_queries), len(petit.captured_queries))
+
+    def test_commande_corrige_les_derives(self):
+        self.creer_donnees(2)
+        CompteurStatistique.objects.filter(cle='total_soumissions').update(valeur=0)
+        CompteurStatistique.objects.filter(cle='total_cours').delete()
+
+        call_command('recalculer_statistiques', stdout=io.StringIO())
+        stats = lire_statistiques()
+        self.assertEqual(stats['total_soumissions'], 4)
+        self.assertEqual(stats['total_cours'], 1)
+
+
+class AgregatsNotesTests(TestCase):
+    """Tests des moyennes précalculées"""
+
+    def setUp(self):
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.classe = Classe.objects.create(nom='Terminale A')
+        self.classe.enseignants.add(self.enseignant)
+        self.cours = Cours.objects.create(titre='Maths', description='', enseignant=self.enseignant, classe=self.classe)
+        self.devoir = Devoir.objects.create(
+            cours=self.cours, titre='DM 1', description='', deadline=timezone.now() + timedelta(days=1)
+        )
+        self.etudiants = [
+            Utilisateur.objects.create_user(username=f'eleve{i}', password='secret', role='etudiant', classe=self.classe)
+            for i in range(3)
+        ]
+        self.client.force_login(self.enseignant)
+
+    def ajouter(self, etudiant, valeur):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('enseignants:ajouter_note', args=[self.classe.id]), {
+                'etudiant': etudiant.id, 'devoir': self.devoir.id, 'note': valeur,
+            })
+        return Note.objects.latest('id')
+
+    def test_agregats_suivent_les_ecritures(self):
+        for etudiant, valeur in zip(self.etudiants, ['10', '14', '18']):
+            self.ajouter(etudiant, valeur)
+        agregat = AgregatNotes.objects.get(cle=cle_devoir(self.devoir.id))
+        self.assertEqual((agregat.nb_notes, agregat.moyenne, agregat.mediane), (3, 14, 14))
+        self.assertEqual((agregat.minimum, agregat.maximum), (10, 18))
+
+        note = Note.objects.get(etudiant=self.etudiants[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('enseignants:modifier_note', args=[note.id]), {
+                'etudiant': self.etudiants[2].id, 'devoir': self.devoir.id, 'note': '12',
+            })
+        agregat.refresh_from_db()
+        self.assertEqual((agregat.moyenne, agregat.mediane, agregat.maximum), (12, 12, 14))
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_etudiant(self.etudiants[2].id)).moyenne, 12)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('enseignants:supprimer_note', args=[note.id]))
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_classe(self.classe.id)).moyenne, 12)
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_etudiant(self.etudiants[2].id)).nb_notes, 0)
+
+    def test_pages_notes_en_requetes_constantes(self):
+        self.ajouter(self.etudiants[0], '15')
+        with CaptureQueriesContext(connection) as peu:
+            self.client.get(reverse('enseignants:etudiants_classe', args=[self.classe.id]))
+        for etudiant in self.etudiants:
+            self.ajouter(etudiant, '11')
+        with CaptureQueriesContext(connection) as beaucoup:
+            response = self.client.get(reverse('enseignants:etudiants_classe', args=[self.classe.id]))
+        self.assertEqual(len(beaucoup.captured_queries), len(peu.captured_queries))
+        self.assertEqual(response.context['moyenne_classe'], 12)
+
+        self.client.force_login(self.etudiants[0])
+        response = self.client.get(reverse('etudiants:mes_notes'))
+        self.assertEqual(response.context['moyenne_generale'], 13)
+        self.assertEqual(response.context['agregats_par_devoir']['DM 1'].nb_notes, 4)
+
+    def test_agregat_cree_entre_temps_recalcule(self):
+        note = self.ajouter(self.etudiants[0], '15')
+        # Ligne créée par un autre processus avant que celui-ci ne voie la note : elle est recalculée, pas ignorée
+        AgregatNotes.objects.filter(cle=cle_devoir(self.devoir.id)).update(nb_notes=0, moyenne=None)
+        recalculer_agregats(cles_note(note))
+        agregat = AgregatNotes.objects.get(cle=cle_devoir(self.devoir.id))
+        self.assertEqual((agregat.nb_notes, agregat.moyenne), (1, 15))
+
+    def test_changement_de_classe(self):
+        note = self.ajouter(self.etudiants[0], '10')
+        self.ajouter(self.etudiants[1], '16')
+        autre_classe = Classe.objects.create(nom='Terminale B')
+        etudiant = Utilisateur.objects.get(id=self.etudiants[0].id)
+        etudiant.classe = autre_classe
+        etudiant.save()
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_classe(self.classe.id)).moyenne, 16)
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_classe(autre_classe.id)).moyenne, 10)
+
+        # Une note antérieure modifiée ensuite ne touche que la classe actuelle de l'étudiant
+        note.note = 12
+        note.save()
+        recalculer_agregats(cles_note(Note.objects.get(id=note.id)))
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_classe(self.classe.id)).moyenne, 16)
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_classe(autre_classe.id)).moyenne, 12)
+
+    def test_suppressions_en_cascade(self):
+        self.ajouter(self.etudiants[0], '10')
+        self.ajouter(self.etudiants[1], '14')
+        autre_devoir = Devoir.objects.create(
+            cours=self.cours, titre='DM 2', description='', deadline=timezone.now() + timedelta(days=1)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.create(etudiant=self.etudiants[0], enseignant=self.enseignant, devoir=autre_devoir, note=20)
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_etudiant(self.etudiants[0].id)).moyenne, 15)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('enseignants:supprimer_devoir', args=[autre_devoir.id]))
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_etudiant(self.etudiants[0].id)).moyenne, 10)
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_classe(self.classe.id)).moyenne, 12)
+
+        # Les notes d'un étudiant supprimé quittent la moyenne de sa classe
+        with self.captureOnCommitCallbacks(execute=True):
+            self.etudiants[1].delete()
+        agregat = AgregatNotes.objects.get(cle=cle_classe(self.classe.id))
+        self.assertEqual((agregat.nb_notes, agregat.moyenne), (1, 10))
+
+    def test_note_modifiee_hors_des_vues(self):
+        note = self.ajouter(self.etudiants[0], '10')
+        note = Note.objects.get(id=note.id)
+        note.etudiant = self.etudiants[1]
+        note.note = 16
+        with self.captureOnCommitCallbacks(execute=True):
+            note.save()
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_etudiant(self.etudiants[0].id)).nb_notes, 0)
+        self.assertEqual(AgregatNotes.objects.get(cle=cle_etudiant(self.etudiants[1].id)).moyenne, 16)
+
+    def test_reconstruction(self):
+        self.ajouter(self.etudiants[0], '15')
+        AgregatNotes.objects.all().delete()
+        self.assertEqual(reconstruire_agregats(), 4)
+        self.assertEqual(lire_agregats([cle_etudiant(self.etudiants[0].id)])[cle_etudiant(self.etudiants[0].id)].moyenne, 15)
+
+
+class CarnetNotesTests(TestCase):
+    """Tests du carnet de notes (grille étudiants × devoirs)"""
+
+    def setUp(self):
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.classe = Classe.objects.create(nom='Terminale A')
+        self.classe.enseignants.add(self.enseignant)
+        self.cours = Cours.objects.create(titre='Maths', description='', enseignant=self.enseignant, classe=self.classe)
+        self.devoirs = [
+            Devoir.objects.create(cours=self.cours, titre=f'DM {i}', description='', deadline=timezone.now() + timedelta(days=i))
+            for i in range(2)
+        ]
+        self.etudiants = [
+            Utilisateur.objects.create_user(username=f'eleve{i}', role='etudiant', classe=self.classe)
+            for i in range(4)
+        ]
+        self.url = reverse('enseignants:carnet_notes', args=[self.classe.id])
+        self.client.force_login(self.enseignant)
+
+    def cellule(self, etudiant, devoir):
+        return f'note_{etudiant.id}_{devoir.id}'
+
+    def grille(self, valeur):
+        return {
+            self.cellule(etudiant, devoir): valeur
+            for etudiant in self.etudiants for devoir in self.devoirs
+        }
+
+    def test_enregistrement_par_lot(self):
+        response = self.client.post(self.url, self.grille('12,5'))
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertEqual(Note.objects.filter(note='12.5').count(), 8)
+
+        donnees = self.grille('12.5')
+        donnees[self.cellule(self.etudiants[0], self.devoirs[0])] = '16'
+        donnees[self.cellule(self.etudiants[1], self.devoirs[0])] = ''
+        self.client.post(self.url, donnees)
+        self.assertEqual(Note.objects.count(), 7)
+        self.assertEqual(Note.objects.get(etudiant=self.etudiants[0], devoir=self.devoirs[0]).note, 16)
+        self.assertEqual(lire_agregats([cle_devoir(self.devoirs[0].id)])[cle_devoir(self.devoirs[0].id)].maximum, 16)
+
+    def test_cellule_invalide_annule_tout(self):
+        donnees = self.grille('10')
+        donnees[self.cellule(self.etudiants[2], self.devoirs[1])] = '21'
+        response = self.client.post(self.url, donnees)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Note.objects.exists())
+        cellules = [cellule for ligne in response.context['lignes'] for cellule in ligne['cellules']]
+        self.assertEqual(sum(1 for cellule in cellules if cellule['erreur']), 1)
+        self.assertEqual(cellules[0]['valeur'], '10')
+
+    def test_requetes_constantes(self):
+        # Premier passage : le contexte d'accès de l'enseignant est mis en cache
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as vide:
+            self.client.get(self.url)
+        self.client.post(self.url, self.grille('10'))
+        with CaptureQueriesContext(connection) as petite_saisie:
+            self.client.post(self.url, self.grille('11'))
+
+        for i in range(4, 12):
+            self.etudiants.append(Utilisateur.objects.create_user(username=f'eleve{i}', role='etudiant', classe=self.classe))
+        self.client.post(self.url, self.grille('10'))
+        with CaptureQueriesContext(connection) as rempli:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as grande_saisie:
+            self.client.post(self.url, self.grille('11'))
+
+        self.assertEqual(len(rempli.captured_queries), len(vide.captured_queries))
+        self.assertEqual(len(grande_saisie.captured_queries), len(petite_saisie.captured_queries))
+        self.assertEqual(Note.objects.filter(note=11).count(), 24)
+
+
+class ExportsTests(TestCase):
+    """Tests des exports en flux"""
+
+    def setUp(self):
+        self.admin = Utilisateur.objects.create_user(username='admin', password='secret', role='admin')
+        enseignant = Utilisateur.objects.create_user(username='prof', role='enseignant')
+        self.classe = Classe.objects.create(nom='Terminale A')
+        cours = Cours.objects.create(titre='Maths', description='', enseignant=enseignant, classe=self.classe)
+        devoir = Devoir.objects.create(cours=cours, titre='DM; "1"', description='', deadline=timezone.now())
+        for i in range(5):
+            etudiant = Utilisateur.objects.create_user(username=f'eleve{i}', role='etudiant', classe=self.classe)
+            Note.objects.create(etudiant=etudiant, enseignant=enseignant, devoir=devoir, note=10 + i)
+
+    def test_lecture_par_lots(self):
+        with self.assertNumQueries(3):
+            lignes = list(lignes_export('notes', taille_lot=2))
+        self.assertEqual(len(lignes), 5)
+        self.assertEqual(lignes[0][0], 'eleve0')
+
+    def test_vue_csv(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_exporter', args=['notes']))
+        self.assertTrue(response.streaming)
+        contenu = b''.join(response.streaming_content).decode('utf-8-sig')
+        lignes = contenu.splitlines()
+        self.assertEqual(len(lignes), 6)
+        self.assertTrue(lignes[0].startswith('Étudiant;Nom'))
+        self.assertIn('"DM; ""1"""', lignes[1])
+        self.assertEqual(self.client.get(reverse('admin_exporter', args=['inconnu'])).status_code, 404)
+
+    def test_xlsx_valide(self):
+        contenu = b''.join(flux_export('inscriptions', 'xlsx'))
+        with zipfile.ZipFile(io.BytesIO(contenu)) as archive:
+            self.assertIsNone(archive.testzip())
+            feuille = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(feuille.count('<row '), 6)
+        self.assertIn('Terminale A', feuille)
+
+    def test_commande(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'notes.csv')
+            call_command('exporter_donnees', 'notes', sortie=chemin, stderr=io.StringIO())
+            with open(chemin, encoding='utf-8-sig') as fichier:
+                self.assertEqual(len(fichier.read().splitlines()), 6)
+
+
+class FichiersProtegesTests(TestCase):
+    """Tests de l'accès contrôlé aux fichiers média"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=self.media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.classe = Classe.objects.create(nom='Terminale A')
+        self.cours = Cours(titre='Maths', description='', enseignant=self.enseignant, classe=self.classe)
+        self.cours.fichier_pdf.save('support.pdf', ContentFile(bytes(range(256)) * 4), save=False)
+        self.cours.save()
+        devoir = Devoir.objects.create(cours=self.cours, titre='DM', description='', deadline=timezone.now() + timedelta(days=1))
+        self.eleve = Utilisateur.objects.create_user(username='eleve', password='secret', role='etudiant', classe=self.classe)
+        self.autre_eleve = Utilisateur.objects.create_user(username='autre', password='secret', role='etudiant', classe=self.classe)
+        self.soumission = Soumission(devoir=devoir, etudiant=self.eleve)
+        self.soumission.fichier.save('copie.pdf', ContentFile(b'copie'), save=False)
+        self.soumission.save()
+
+    def url(self, fichier):
+        return reverse('fichier_protege', args=[fichier.name])
+
+    def test_regles_d_acces(self):
+        self.assertEqual(self.client.get(self.url(self.cours.fichier_pdf)).status_code, 302)
+
+        self.client.force_login(self.autre_eleve)
+        self.assertEqual(self.client.get(self.url(self.cours.fichier_pdf)).status_code, 200)
+        self.assertEqual(self.client.get(self.url(self.soumission.fichier)).status_code, 403)
+        self.assertEqual(self.client.get('/media/soumissions/inconnu.pdf').status_code, 404)
+
+        hors_classe = Utilisateur.objects.create_user(username='hors', role='etudiant')
+        self.client.force_login(hors_classe)
+        self.assertEqual(self.client.get(self.url(self.cours.fichier_pdf)).status_code, 403)
+
+        self.client.force_login(self.enseignant)
+        response = self.client.get(self.url(self.soumission.fichier))
+        self.assertEqual(b''.join(response.streaming_content), b'copie')
+
+    def test_plages_et_requetes_conditionnelles(self):
+        self.client.force_login(self.eleve)
+        url = self.url(self.cours.fichier_pdf)
+        response = self.client.get(url)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        partielle = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(partielle.status_code, 206)
+        self.assertEqual(partielle['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(partielle.streaming_content), bytes(range(10, 20)))
+
+        fin = self.client.get(url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(fin.streaming_content), bytes(range(252, 256)))
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=5000-').status_code, 416)
+        # If-Range périmé : fichier complet
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"perime"').status_code, 200)
+
+    @override_settings(MEDIA_ENVOI='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        self.client.force_login(self.eleve)
+        response = self.client.get(self.url(self.soumission.fichier))
+        self.assertEqual(response['X-Accel-Redirect'], f'/media-protege/{self.soumission.fichier.name}')
+        self.assertEqual(response.content, b'')
+
+        # Nom accentué : chemin encodé pour nginx, nom d'origine dans filename*
+        self.soumission.fichier.save('copie élève.pdf', ContentFile(b'copie'))
+        response = self.client.get(self.url(self.soumission.fichier))
+        self.assertEqual(response['X-Accel-Redirect'], '/media-protege/' + quote(self.soumission.fichier.name))
+        self.assertIn('%C3%A9l%C3%A8ve', response['X-Accel-Redirect'])
+        self.assertEqual(response['Content-Disposition'], "inline; filename*=utf-8''copie_%C3%A9l%C3%A8ve.pdf")
+
+
+class StockageDedoublonneTests(TestCase):
+    """Tests du stockage des fichiers déposés par contenu"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=self.media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.contenu = b'%PDF-' + bytes(range(256)) * 20
+
+    def creer_cours(self, titre, contenu):
+        cours = Cours(titre=titre, description='', enseignant=self.enseignant)
+        cours.fichier_pdf.save('support.pdf', ContentFile(contenu), save=False)
+        cours.save()
+        return cours
+
+    def test_meme_contenu_stocke_une_fois(self):
+        premier = self.creer_cours('Maths A', self.contenu)
+        second = self.creer_cours('Maths B', self.contenu)
+        devoir = Devoir(cours=second, titre='DM', description='', deadline=timezone.now())
+        devoir.fichier.save('enonce.pdf', ContentFile(self.contenu), save=False)
+        devoir.save()
+
+        self.assertNotEqual(premier.fichier_pdf.name, second.fichier_pdf.name)
+        contenu = ContenuFichier.objects.get()
+        self.assertEqual(contenu.nb_references, 3)
+        chemin_contenu = stockage_dedoublonne.chemin_contenu(contenu.sha256)
+        self.assertTrue(os.path.samefile(premier.fichier_pdf.path, chemin_contenu))
+        self.assertTrue(os.path.samefile(devoir.fichier.path, chemin_contenu))
+        with second.fichier_pdf.open('rb') as fichier:
+            self.assertEqual(fichier.read(), self.contenu)
+
+        # Le contenu n'est supprimé qu'avec sa dernière référence
+        premier.fichier_pdf.delete(save=False)
+        devoir.fichier.delete(save=False)
+        self.assertEqual(ContenuFichier.objects.get().nb_references, 1)
+        self.assertTrue(os.path.exists(second.fichier_pdf.path))
+        second.fichier_pdf.delete(save=False)
+        self.assertFalse(ContenuFichier.objects.exists())
+        self.assertFalse(os.path.exists(chemin_contenu))
+
+    def test_contenu_libere_avec_le_cours(self):
+        cours = self.creer_cours('Maths', self.contenu)
+        devoir = Devoir(cours=cours, titre='DM', description='', deadline=timezone.now())
+        devoir.fichier.save('enonce.pdf', ContentFile(self.contenu), save=False)
+        devoir.save()
+        chemin_contenu = stockage_dedoublonne.chemin_contenu(ContenuFichier.objects.get().sha256)
+
+        # Fichier remplacé par le formulaire de modification : l'ancien nom est libéré
+        cours = Cours.objects.get(id=cours.id)
+        ancien = cours.fichier_pdf.path
+        cours.fichier_pdf.save('nouveau.pdf', ContentFile(b'%PDF-nouveau'), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            cours.save()
+        self.assertFalse(os.path.exists(ancien))
+        self.assertEqual(ContenuFichier.objects.get(sha256=os.path.basename(chemin_contenu)).nb_references, 1)
+
+        # Suppression en cascade du devoir avec le cours
+        with self.captureOnCommitCallbacks(execute=True):
+            cours.delete()
+        self.assertFalse(ContenuFichier.objects.exists())
+        self.assertFalse(ReferenceFichier.objects.exists())
+        self.assertFalse(os.path.exists(chemin_contenu))
+
+    def test_dedoublonnage_des_fichiers_existants(self):
+        # Fichiers déposés avant le stockage par contenu : copies indépendantes sur le disque
+        noms = ['cours/pdf/support.pdf', 'devoirs/support.pdf', 'soumissions/autre.pdf']
+        for nom, contenu in zip(noms, [self.contenu, self.contenu, b'autre']):
+            os.makedirs(os.path.dirname(os.path.join(self.media, nom)), exist_ok=True)
+            with open(os.path.join(self.media, nom), 'wb') as fichier:
+                fichier.write(contenu)
+        cours = Cours.objects.create(titre='Maths', description='', enseignant=self.enseignant, fichier_pdf=noms[0])
+        devoir = Devoir.objects.create(cours=cours, titre='DM', description='', deadline=timezone.now(), fichier=noms[1])
+        eleve = Utilisateur.objects.create_user(username='eleve', role='etudiant')
+        Soumission.objects.create(devoir=devoir, etudiant=eleve, fichier=noms[2])
+
+        resultat = dedoublonner_fichiers_existants()
+        self.assertEqual(resultat, {'fichiers': 3, 'manquants': 0, 'octets_liberes': len(self.contenu)})
+        self.assertTrue(os.path.samefile(os.path.join(self.media, noms[0]), os.path.join(self.media, noms[1])))
+        self.assertEqual(sorted(ContenuFichier.objects.values_list('nb_references', flat=True)), [1, 2])
+
+        # Relancer la commande ne refait rien
+        self.assertEqual(dedoublonner_fichiers_existants()['fichiers'], 0)
+
+
+@override_settings(APERCU_PDFINFO='pdfinfo-absent', APERCU_PDFTOPPM='pdftoppm-absent')
+class ApercusTests(TestCase):
+    """Tests de la file des aperçus de PDF"""
+
+    PDF = (
+        b'%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n'
+        b'2 0 obj << /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >> endobj\n'
+        b'3 0 obj << /Type /Page /Parent 2 0 R >> endobj\n'
+        b'4 0 obj << /Type/Page /Parent 2 0 R >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n'
+    )
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=self.media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+        self.classe = Classe.objects.create(nom='Terminale A')
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.cours = Cours(titre='Maths', description='', enseignant=self.enseignant, classe=self.classe)
+        self.cours.fichier_pdf.save('support.pdf', ContentFile(self.PDF), save=False)
+        self.cours.save()
+
+    def test_depot_met_en_file_et_worker_genere(self):
+        Cours.objects.create(titre='Sans PDF', description='', enseignant=self.enseignant)
+        apercu = ApercuFichier.objects.get()
+        self.assertEqual((apercu.nom, apercu.statut), (self.cours.fichier_pdf.name, 'en_attente'))
+
+        self.assertEqual(generer_apercus(), (1, 0))
+        apercu.refresh_from_db()
+        self.assertEqual((apercu.statut, apercu.nb_pages), ('pret', 2))
+        self.assertFalse(apercu.image)
+
+    def test_soumissions_sans_apercu(self):
+        devoir = Devoir.objects.create(cours=self.cours, titre='DM', description='', deadline=timezone.now())
+        soumission = Soumission(devoir=devoir, etudiant=Utilisateur.objects.create_user(username='eleve', role='etudiant'))
+        soumission.fichier.save('copie.pdf', ContentFile(self.PDF), save=False)
+        soumission.save()
+        self.assertEqual(ApercuFichier.objects.count(), 1)
+
+    def test_apercu_servi_avec_les_droits_du_pdf(self):
+        apercu = ApercuFichier.objects.get()
+        apercu.image.save('support.png', ContentFile(b'\x89PNG'), save=False)
+        apercu.statut = 'pret'
+        apercu.save()
+        url = reverse('apercu_fichier', args=[self.cours.fichier_pdf.name])
+
+        eleve = Utilisateur.objects.create_user(username='eleve', role='etudiant', classe=self.classe)
+        self.client.force_login(eleve)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'\x89PNG')
+        response = self.client.get(reverse('etudiants:detail_cours', args=[self.cours.id]))
+        self.assertContains(response, url)
+
+        self.client.force_login(Utilisateur.objects.create_user(username='hors', role='etudiant'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(QUOTAS_STOCKAGE={'etudiant': 3000})
+class LimitesEnvoiTests(TestCase):
+    """Tests des limites de taille, de type et d'espace des fichiers déposés"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=self.media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+        classe = Classe.objects.create(nom='Terminale A')
+        enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        cours = Cours.objects.create(titre='Maths', description='', enseignant=enseignant, classe=classe)
+        self.devoirs = [
+            Devoir.objects.create(cours=cours, titre=f'DM {i}', description='', deadline=timezone.now() + timedelta(days=1))
+            for i in range(2)
+        ]
+        self.eleve = Utilisateur.objects.create_user(username='eleve', password='secret', role='etudiant', classe=classe)
+        self.client.force_login(self.eleve)
+
+    def soumettre(self, devoir, nom, contenu):
+        return self.client.post(
+            reverse('etudiants:soumettre_devoir', args=[devoir.id]),
+            {'fichier': SimpleUploadedFile(nom, contenu, content_type='application/pdf')},
+        )
+
+    def test_type_lu_dans_les_premiers_octets(self):
+        self.assertEqual(type_contenu(b'%PDF-1.7\n'), 'application/pdf')
+        self.assertEqual(type_contenu(b'\x00\x00\x00\x18ftypheic\x00\x00'), 'image/heic')
+        self.assertEqual(type_contenu('email;role\nléa@exemple.fr;etudiant\n'.encode()), 'text/plain')
+        self.assertEqual(type_contenu(b'MZ\x90\x00\x03\x00'), 'application/octet-stream')
+
+    def test_fichier_refuse_pendant_la_reception(self):
+        # Un exécutable renommé en .pdf est refusé sur son contenu
+        response = self.soumettre(self.devoirs[0], 'copie.pdf', b'MZ\x90\x00' + b'\x00' * 100)
+        self.assertRedirects(response, reverse('etudiants:soumettre_devoir', args=[self.devoirs[0].id]), fetch_redirect_response=False)
+        self.assertEqual(response.wsgi_request.refus_envoi, "Ce type de fichier n'est pas accepté.")
+        self.assertFalse(Soumission.objects.exists())
+
+        with self.settings(LIMITES_ENVOI={'fichier': {'taille_max': 1000, 'types': None}}):
+            response = self.soumettre(self.devoirs[0], 'copie.pdf', b'%PDF-' + b'x' * 2000)
+        self.assertIn('taille maximale', response.wsgi_request.refus_envoi)
+        self.assertFalse(Soumission.objects.exists())
+
+    def test_quota_tenu_a_jour_et_applique(self):
+        self.soumettre(self.devoirs[0], 'copie.pdf', b'%PDF-' + b'x' * 1995)
+        # L'espace est compté quand le worker range le fichier déposé
+        finaliser_depots()
+        self.eleve.refresh_from_db()
+        self.assertEqual(self.eleve.espace_utilise, 2000)
+
+        # 2000 + 2000 octets dépassent le quota de 3000
+        response = self.soumettre(self.devoirs[1], 'copie.pdf', b'%PDF-' + b'x' * 1995)
+        self.assertIn('espace de stockage', response.wsgi_request.refus_envoi)
+        self.assertEqual(Soumission.objects.count(), 1)
+
+        Soumission.objects.get().delete()
+        self.eleve.refresh_from_db()
+        self.assertEqual(self.eleve.espace_utilise, 0)
+        self.assertEqual(recalculer_espace(), {})
+
+
+class ProfilageRequetesTests(TestCase):
+    """Tests du middleware de profilage SQL"""
+
+    def setUp(self):
+        classe = Classe.objects.create(nom='Terminale A')
+        enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.cours = Cours.objects.create(titre='Maths', description='', enseignant=enseignant, classe=classe)
+        for i in range(6):
+            Devoir.objects.create(cours=self.cours, titre=f'DM {i}', description='', deadline=timezone.now() + timedelta(days=1))
+        self.client.force_login(Utilisateur.objects.create_user(username='eleve', role='etudiant', classe=classe))
+        self.fichier = os.path.join(tempfile.mkdtemp(), 'profils.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.fichier), ignore_errors=True)
+
+    def test_empreinte_sans_valeurs(self):
+        self.assertEqual(
+            empreinte_sql("SELECT * FROM t WHERE id IN (1, 2, 3) AND nom = 'a''b'  LIMIT 21"),
+            empreinte_sql('SELECT * FROM t WHERE id IN (%s) AND nom = %s LIMIT 1'),
+        )
+
+    def test_desactive_par_defaut(self):
+        response = self.client.get(reverse('etudiants:detail_cours', args=[self.cours.id]))
+        self.assertNotIn('X-Requetes-SQL', response)
+
+    def test_boucle_n_plus_1_signalee_et_rapportee(self):
+        def vue_n_plus_1(request):
+            for devoir in Devoir.objects.filter(cours=self.cours):
+                Soumission.objects.filter(devoir=devoir).count()
+            return HttpResponse()
+
+        with self.settings(PROFILAGE_REQUETES=True, PROFILAGE_FICHIER=self.fichier), \
+                self.assertLogs('comptes.profilage', level='WARNING') as journal:
+            response = ProfilageRequetesMiddleware(vue_n_plus_1)(RequestFactory().get('/boucle/'))
+        self.assertGreater(int(response['X-Requetes-SQL']), 6)
+        self.assertIn('/boucle/', journal.output[0])
+        self.assertIn('N+1', journal.output[0])
+
+        sortie = io.StringIO()
+        call_command('rapport_requetes', fichier=self.fichier, depassements=True, stdout=sortie)
+        self.assertIn('/boucle/', sortie.getvalue())
+        self.assertIn('6 x SELECT', sortie.getvalue())
+
+
+@cache_partage('budgets')
+class BudgetsRequetesTests(TestCase):
+    """Nombre maximal de requêtes SQL de chaque vue, pour chaque rôle, indépendant du volume de données"""
+
+    ROLES = ('anonyme', 'admin', 'enseignant', 'etudiant')
+
+    # Redirection vers la connexion : session et utilisateur lus (ou rien pour un visiteur anonyme)
+    BUDGET_REFUS = {'anonyme': 0, 'admin': 5, 'enseignant': 5, 'etudiant': 5}
+
+    # Budgets des rôles qui ont accès à la vue ; les autres rôles sont redirigés (BUDGET_REFUS)
+    BUDGETS = {
+        'home': {},
+        'admin_redirect': {},
+        'admin_login': {},
+        'admin_logout': {},
+        'admin_dashboard': {'admin': 8},
+        'admin_utilisateurs': {'admin': 8},
+        'admin_inviter_enseignant': {},
+        'admin_inviter_etudiant': {'admin': 6},
+        'admin_importer_invitations': {},
+        'admin_exporter': {'admin': 6},
+        'apercu_fichier': {'admin': 7, 'enseignant': 7, 'etudiant': 7},
+        'fichier_protege': {'admin': 8, 'enseignant': 8, 'etudiant': 8},
+        'accepter_invitation': {'anonyme': 2, 'admin': 8, 'enseignant': 7, 'etudiant': 7},
+        'admin_classes': {'admin': 6},
+        'admin_ajouter_classe': {},
+        'admin_assigner_enseignant': {'admin': 7},
+        'admin_detail_classe': {'admin': 9},
+        'admin_modifier_classe': {'admin': 8},
+        'admin_supprimer_classe': {'admin': 9},
+        'admin_retirer_enseignant': {'admin': 7},
+        'admin_cours': {'admin': 6},
+        'admin_detail_cours': {'admin': 11},
+        'admin_modifier_cours': {'admin': 8},
+        'admin_supprimer_cours': {'admin': 7},
+        'admin_devoirs': {'admin': 6},
+        'admin_detail_devoir': {'admin': 9},
+        'admin_telecharger_soumissions': {'admin': 7},
+        'admin_modifier_devoir': {'admin': 8},
+        'admin_supprimer_devoir': {'admin': 7},
+        'admin_detail_utilisateur': {'admin': 9},
+        'admin_modifier_utilisateur': {'admin': 8},
+        'admin_supprimer_utilisateur': {'admin': 6},
+        'enseignants:enseignant_login': {},
+        'enseignants:dashboard_enseignant': {'enseignant': 13},
+        'enseignants:mes_classes': {'enseignant': 6},
+        'enseignants:detail_classe': {'enseignant': 9},
+        'enseignants:etudiants_classe': {'enseignant': 16},
+        'enseignants:carnet_notes': {'enseignant': 10},
+        'enseignants:ajouter_note': {'enseignant': 9},
+        'enseignants:ajouter_note_etudiant': {'enseignant': 10},
+        'enseignants:modifier_note': {'enseignant': 10},
+        'enseignants:supprimer_note': {'enseignant': 10},
+        'enseignants:mes_cours': {'enseignant': 6},
+        'enseignants:detail_cours': {'enseignant': 9},
+        'enseignants:ajouter_cours': {'enseignant': 6},
+        'enseignants:demarrer_envoi_cours': {},
+        'enseignants:envoi_cours': {'enseignant': 6},
+        'enseignants:modifier_cours': {'enseignant': 7},
+        # Suppressions en cascade (cours, devoir) : compteurs et quotas sont mis à jour pour chaque ligne supprimée,
+        # les notes sont relues pour les signaux des fragments en cache ;
+        # le coût suit le contenu du cours ou du devoir supprimé et non le volume de la base
+        'enseignants:supprimer_cours': {'enseignant': 66},
+        'enseignants:mes_devoirs': {'enseignant': 6},
+        'enseignants:ajouter_devoir': {'enseignant': 6},
+        'enseignants:modifier_devoir': {'enseignant': 9},
+        'enseignants:supprimer_devoir': {'enseignant': 28},
+        'enseignants:telecharger_soumissions': {'enseignant': 7},
+        'etudiants:etudiant_login': {},
+        'etudiants:dashboard_etudiant': {'etudiant': 13},
+        'etudiants:mes_cours': {'etudiant': 9},
+        'etudiants:detail_cours': {'etudiant': 11},
+        'etudiants:mes_devoirs': {'etudiant': 8},
+        'etudiants:soumettre_devoir': {'etudiant': 9},
+        'etudiants:demarrer_envoi_devoir': {},
+        'etudiants:envoi_devoir': {'etudiant': 6},
+        'etudiants:mes_notes': {'etudiant': 14},
+        'etudiants:mes_soumissions': {'etudiant': 7},
+    }
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        reglages = override_settings(MEDIA_ROOT=self.media_root, PROFILAGE_REQUETES=False)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.now = timezone.now()
+        self.admin = Utilisateur.objects.create_user(username='admin', password='secret', role='admin', is_staff=True)
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.lot = 0
+        self.peupler()
+
+        self.classe, classe_fixe = Classe.objects.order_by('id')[:2]
+        self.collegue = self.classe.enseignants.exclude(id=self.enseignant.id).get()
+        self.etudiant = self.classe.utilisateur_set.order_by('id').first()
+        self.cours = Cours.objects.filter(classe=self.classe, enseignant=self.enseignant).first()
+        self.devoir = Devoir.objects.filter(cours=self.cours).order_by('id').first()
+        self.soumission = Soumission.objects.get(devoir=self.devoir, etudiant=self.etudiant)
+        self.note = Note.objects.get(devoir=self.devoir, etudiant=self.etudiant)
+        self.invitation = Invitation.objects.filter(classe=self.classe).get()
+        apercu = ApercuFichier.objects.get(nom=self.cours.fichier_pdf.name)
+        apercu.image.save('support.png', ContentFile(b'\x89PNG\r\n\x1a\n'), save=False)
+        apercu.statut = 'pret'
+        apercu.save()
+        # Les suppressions (GET) visent une classe qui ne grossit pas : leur coût suit ce qui est supprimé
+        self.cours_supprime = Cours.objects.filter(classe=classe_fixe, enseignant=self.enseignant).first()
+        self.devoir_supprime = Devoir.objects.filter(cours=self.cours_supprime).order_by('id').first()
+        self.note_supprimee = Note.objects.filter(devoir=self.devoir_supprime).order_by('id').first()
+
+    def peupler(self, nb_classes=2):
+        """Ajoute des classes complètes, chacune avec un collègue et une invitation en attente"""
+        self.lot += 1
+        for i in range(nb_classes):
+            classe = Classe.objects.create(nom=f'Classe {self.lot}-{i}')
+            collegue = Utilisateur.objects.create_user(username=f'collegue{self.lot}-{i}', password='secret', role='enseignant')
+            classe.enseignants.add(self.enseignant, collegue)
+            self.remplir_classe(classe, collegue)
+            Invitation.objects.create(
+                email=f'invite{self.lot}-{i}@example.com', role='etudiant', classe=classe,
+                token=f'jeton-{self.lot}-{i}', date_expiration=self.now + timedelta(days=7), cree_par=self.admin,
+            )
+
+    def remplir_classe(self, classe, collegue, nb_etudiants=4, nb_cours=2, nb_devoirs=3):
+        """Ajoute des étudiants à la classe, puis des cours dont tous les devoirs sont rendus et notés"""
+        for j in range(nb_etudiants):
+            Utilisateur.objects.create_user(
+                username=f'eleve{self.lot}-{classe.id}-{j}', password='secret', role='etudiant', classe=classe,
+            )
+        for k in range(nb_cours):
+            cours = Cours(titre=f'Cours {self.lot}-{classe.id}-{k}', description='Description',
+                          enseignant=self.enseignant if k % 2 == 0 else collegue, classe=classe)
+            cours.fichier_pdf.save('support.pdf', ContentFile(b'%PDF-1.4 support'), save=False)
+            cours.save()
+            self.ajouter_devoirs(cours, nb_devoirs)
+
+    def ajouter_devoirs(self, cours, nb_devoirs):
+        etudiants = list(cours.classe.utilisateur_set.filter(role='etudiant'))
+        for d in range(nb_devoirs):
+            devoir = Devoir.objects.create(
+                cours=cours, titre=f'Devoir {self.lot}-{cours.id}-{d}', description='Description',
+                deadline=self.now + timedelta(days=1 if d % 2 else -1),
+            )
+            for etudiant in etudiants:
+                soumission = Soumission(devoir=devoir, etudiant=etudiant)
+                soumission.fichier.save('copie.pdf', ContentFile(b'%PDF-1.4 copie'), save=False)
+                soumission.save()
+                Note.objects.create(etudiant=etudiant, enseignant=cours.enseignant, devoir=devoir, note=12)
+
+    def agrandir(self):
+        """Double à peu près le volume : nouvelles classes, et plus d'étudiants, de cours et de devoirs dans la classe suivie"""
+        self.peupler()
+        self.remplir_classe(self.classe, self.collegue)
+        self.ajouter_devoirs(self.cours, 3)
+
+    def urls(self):
+        """Arguments de chaque route des trois interfaces, par nom d'URL"""
+        classe, cours, devoir, note = self.classe.id, self.cours.id, self.devoir.id, self.note.id
+        return {
+            'home': {}, 'admin_redirect': {}, 'admin_login': {}, 'admin_logout': {},
+            'admin_dashboard': {}, 'admin_utilisateurs': {}, 'admin_inviter_enseignant': {},
+            'admin_inviter_etudiant': {}, 'admin_importer_invitations': {},
+            'admin_exporter': {'nom': 'notes'},
+            'apercu_fichier': {'chemin': self.cours.fichier_pdf.name},
+            'fichier_protege': {'chemin': self.soumission.fichier.name},
+            'accepter_invitation': {'token': self.invitation.token},
+            'admin_classes': {}, 'admin_ajouter_classe': {}, 'admin_assigner_enseignant': {},
+            'admin_detail_classe': {'classe_id': classe}, 'admin_modifier_classe': {'classe_id': classe},
+            'admin_supprimer_classe': {'classe_id': classe},
+            'admin_retirer_enseignant': {'classe_id': classe, 'enseignant_id': self.enseignant.id},
+            'admin_cours': {}, 'admin_detail_cours': {'cours_id': cours},
+            'admin_modifier_cours': {'cours_id': cours}, 'admin_supprimer_cours': {'cours_id': cours},
+            'admin_devoirs': {}, 'admin_detail_devoir': {'devoir_id': devoir},
+            'admin_telecharger_soumissions': {'devoir_id': devoir},
+            'admin_modifier_devoir': {'devoir_id': devoir}, 'admin_supprimer_devoir': {'devoir_id': devoir},
+            'admin_detail_utilisateur': {'utilisateur_id': self.etudiant.id},
+            'admin_modifier_utilisateur': {'utilisateur_id': self.etudiant.id},
+            'admin_supprimer_utilisateur': {'utilisateur_id': self.etudiant.id},
+            'enseignants:enseignant_login': {}, 'enseignants:dashboard_enseignant': {},
+            'enseignants:mes_classes': {}, 'enseignants:detail_classe': {'classe_id': classe},
+            'enseignants:etudiants_classe': {'classe_id': classe}, 'enseignants:carnet_notes': {'classe_id': classe},
+            'enseignants:ajouter_note': {'classe_id': classe},
+            'enseignants:ajouter_note_etudiant': {'classe_id': classe, 'etudiant_id': self.etudiant.id},
+            'enseignants:modifier_note': {'note_id': note},
+            'enseignants:supprimer_note': {'note_id': self.note_supprimee.id},
+            'enseignants:mes_cours': {}, 'enseignants:detail_cours': {'cours_id': cours},
+            'enseignants:ajouter_cours': {}, 'enseignants:modifier_cours': {'cours_id': cours},
+            'enseignants:demarrer_envoi_cours': {}, 'enseignants:envoi_cours': {'token': 'inconnu'},
+            'enseignants:supprimer_cours': {'cours_id': self.cours_supprime.id}, 'enseignants:mes_devoirs': {},
+            'enseignants:ajouter_devoir': {}, 'enseignants:modifier_devoir': {'devoir_id': devoir},
+            'enseignants:supprimer_devoir': {'devoir_id': self.devoir_supprime.id},
+            'enseignants:telecharger_soumissions': {'devoir_id': devoir},
+            'etudiants:etudiant_login': {}, 'etudiants:dashboard_etudiant': {}, 'etudiants:mes_cours': {},
+            'etudiants:detail_cours': {'cours_id': cours}, 'etudiants:mes_devoirs': {},
+            'etudiants:soumettre_devoir': {'devoir_id': devoir},
+            'etudiants:demarrer_envoi_devoir': {'devoir_id': devoir},
+            'etudiants:envoi_devoir': {'devoir_id': devoir, 'token': 'inconnu'},
+            'etudiants:mes_notes': {}, 'etudiants:mes_soumissions': {},
+        }
+
+    def nb_requetes(self, role, nom, arguments):
+        self.client.logout()
+        if role != 'anonyme':
+            self.client.force_login(getattr(self, role))
+        # Les vues de suppression agissent sur GET : chaque mesure est annulée
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as contexte:
+                response = self.client.get(reverse(nom, kwargs=arguments))
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 500, f'{nom} ({role})')
+        return len(contexte.captured_queries)
+
+    def mesurer(self):
+        return {
+            (nom, role): self.nb_requetes(role, nom, arguments)
+            for nom, arguments in self.urls().items()
+            for role in self.ROLES
+        }
+
+    def test_toutes_les_routes_ont_un_budget(self):
+        for module, espace in [(comptes_urls, ''), (enseignants_urls, 'enseignants:'), (etudiants_urls, 'etudiants:')]:
+            for motif in module.urlpatterns:
+                self.assertIn(espace + motif.name, self.BUDGETS)
+                self.assertIn(espace + motif.name, self.urls())
+
+    def test_budgets_par_role(self):
+        for (nom, role), nombre in self.mesurer().items():
+            with self.subTest(vue=nom, role=role):
+                self.assertLessEqual(nombre, self.BUDGETS[nom].get(role, self.BUDGET_REFUS[role]))
+
+    def test_budgets_independants_du_volume(self):
+        avant = self.mesurer()
+        self.agrandir()
+        apres = self.mesurer()
+        for (nom, role), nombre in avant.items():
+            with self.subTest(vue=nom, role=role):
+                self.assertEqual(apres[nom, role], nombre)
+
+
+class GenerationEtablissementTests(TestCase):
+    """Tests du générateur d'établissement fictif et du rapport de charge"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        reglages = override_settings(MEDIA_ROOT=self.media_root)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def generer(self, prefixe, nb_etudiants):
+        return generer_etablissement(
+            nb_classes=2, nb_enseignants=3, nb_etudiants=nb_etudiants, cours_par_classe=2, devoirs_par_cours=3,
+            taux_soumission=1, taux_notes=1, nb_invitations=4, prefixe=prefixe, graine=1,
+        )
+
+    def test_etablissement_complet_et_coherent(self):
+        crees = self.generer('essai', nb_etudiants=10)
+
+        self.assertEqual(crees['inscriptions'], 20)
+        self.assertEqual(Inscription.objects.count(), 20)
+        self.assertEqual(Soumission.objects.count(), 60)
+        self.assertEqual(crees['notes'], Note.objects.count())
+        self.assertFalse(EmailSortant.objects.exists())
+        # Un seul contenu stocké, référencé par chaque support de cours et chaque soumission
+        contenu = ContenuFichier.objects.get()
+        self.assertEqual(contenu.nb_references, 64)
+        soumission = Soumission.objects.first()
+        self.assertEqual(soumission.fichier.read(), PDF_GENERE)
+        # Compteurs, agrégats et espaces utilisés calculés malgré l'absence de signaux
+        self.assertEqual(lire_statistiques(), calculer_statistiques())
+        self.assertEqual(AgregatNotes.objects.filter(portee='devoir').count(), Note.objects.values('devoir').distinct().count())
+        self.assertEqual(recalculer_espace(), {})
+
+        etudiant = Utilisateur.objects.get(username='essai_etudiant_1')
+        self.assertTrue(etudiant.check_password('motdepasse'))
+        with self.assertRaises(ValueError):
+            self.generer('essai', nb_etudiants=10)
+
+    def test_requetes_par_lots(self):
+        with CaptureQueriesContext(connection) as contexte:
+            crees = self.generer('essai', nb_etudiants=80)
+        self.assertEqual(crees['soumissions'], 480)
+        # Le coût fixe (lots, compteurs, agrégats) ne dépend pas du nombre de lignes insérées
+        self.assertLess(len(contexte.captured_queries), 150)
+
+    def test_rapport_centiles(self):
+        mesures = [('etudiants:mes_cours', 200, duree / 1000) for duree in range(1, 101)]
+        mesures.append(('etudiants:mes_cours', 500, 0.2))
+        ligne, = rapport(mesures)
+        self.assertEqual(ligne['requetes'], 101)
+        self.assertEqual(ligne['erreurs'], 1)
+        self.assertEqual(round(ligne['p50']), 51)
+        self.assertEqual(round(ligne['p95']), 96)
+        self.assertEqual(round(ligne['p99']), 100)
+        self.assertEqual(round(ligne['max']), 200)
+        self.assertIsNone(centile([], 50))
+
+
+@cache_partage('acces')
+class ContexteAccesTests(TestCase):
+    """Tests du contexte d'accès en cache (classe, cours suivis, classes enseignées)"""
+
+    def setUp(self):
+        cache.clear()
+        self.classe = Classe.objects.create(nom='Terminale A')
+        self.autre_classe = Classe.objects.create(nom='Terminale B')
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.classe.enseignants.add(self.enseignant)
+        self.cours = Cours.objects.create(titre='Maths', description='', enseignant=self.enseignant, classe=self.classe)
+        # Étudiant d'une autre classe inscrit individuellement au cours
+        self.externe = Utilisateur.objects.create_user(username='externe', role='etudiant', classe=self.autre_classe)
+        Inscription.objects.create(cours=self.cours, etudiant=self.externe)
+
+    def recharger(self, utilisateur):
+        # Nouvelle requête : nouvel objet utilisateur, le contexte vient du cache
+        return Utilisateur.objects.get(id=utilisateur.id)
+
+    def test_verifications_sans_requete(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(etudiant_a_acces(self.externe, self.cours))
+            self.assertTrue(etudiant_a_acces(self.externe, self.cours, creer_inscription=True))
+        externe, enseignant = self.recharger(self.externe), self.recharger(self.enseignant)
+        contexte_acces(enseignant)
+        enseignant = self.recharger(self.enseignant)
+        with self.assertNumQueries(0):
+            self.assertTrue(etudiant_a_acces(externe, self.cours))
+            self.assertTrue(contexte_acces(enseignant).enseigne(self.classe))
+            self.assertFalse(contexte_acces(enseignant).enseigne(self.autre_classe))
+
+    def test_invalidation_par_les_signaux(self):
+        contexte_acces(self.externe)
+        contexte_acces(self.enseignant)
+
+        Inscription.objects.filter(etudiant=self.externe).delete()
+        self.assertFalse(etudiant_a_acces(self.recharger(self.externe), self.cours))
+        self.classe.enseignants.remove(self.enseignant)
+        self.assertFalse(contexte_acces(self.recharger(self.enseignant)).enseigne(self.classe))
+        self.enseignant.classes_enseignees.add(self.autre_classe)
+        self.assertTrue(contexte_acces(self.recharger(self.enseignant)).enseigne(self.autre_classe))
+
+        # Changement de classe : l'étudiant entre dans la classe du cours
+        Utilisateur.objects.filter(id=self.externe.id).update(classe=self.classe)
+        self.assertTrue(etudiant_a_acces(self.recharger(self.externe), self.cours))
+
+        self.client.force_login(self.enseignant)
+        response = self.client.get(reverse('enseignants:detail_classe', args=[self.classe.id]))
+        self.assertRedirects(response, reverse('enseignants:mes_classes'), fetch_redirect_response=False)
+
+    def test_invalidation_apres_commit(self):
+        contexte_acces(self.enseignant)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.classe.enseignants.remove(self.enseignant)
+            # Requête concurrente avant le COMMIT : elle relit et remet en cache l'ancienne affectation
+            cache.set(cle_acces(self.enseignant.id), {
+                'classe_id': None, 'cours_inscrits': [], 'classes_enseignees': [self.classe.id],
+            })
+        self.assertFalse(contexte_acces(self.recharger(self.enseignant)).enseigne(self.classe))
+
+
+@cache_partage('fragments')
+class FragmentsCacheTests(TestCase):
+    """Tests des clés versionnées et des fragments de pages en cache"""
+
+    def setUp(self):
+        self.classe = Classe.objects.create(nom='Terminale A')
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.classe.enseignants.add(self.enseignant)
+        self.cours = Cours.objects.create(titre='Maths', description='', enseignant=self.enseignant, classe=self.classe)
+        self.etudiant = Utilisateur.objects.create_user(username='eleve', role='etudiant', classe=self.classe)
+
+    def test_cle_versionnee(self):
+        cle = cle_modele('cours.Cours', self.cours.id)
+        self.assertEqual(cle_modele('cours.Cours', self.cours.id), cle)
+        self.cours.save()
+        self.assertNotEqual(cle_modele('cours.Cours', self.cours.id), cle)
+
+    def test_version_changee_apres_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cours.save()
+            # Clé sous laquelle une requête concurrente rangerait un fragment calculé avant le COMMIT
+            cle = cle_modele('cours.Cours', self.cours.id)
+        self.assertNotEqual(cle_modele('cours.Cours', self.cours.id), cle)
+
+    def test_liste_des_cours_en_cache(self):
+        self.client.force_login(self.etudiant)
+        url = reverse('etudiants:mes_cours')
+        with CaptureQueriesContext(connection) as premiere:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as seconde:
+            response = self.client.get(url)
+        self.assertLess(len(seconde.captured_queries), len(premiere.captured_queries))
+        self.assertFalse([requete for requete in seconde.captured_queries if 'cours_inscription' in requete['sql']])
+        self.assertEqual(response.context['cours_avec_stats'][0]['nb_devoirs'], 0)
+
+        devoir = Devoir.objects.create(cours=self.cours, titre='DM', description='', deadline=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.client.get(url).context['cours_avec_stats'][0]['nb_devoirs'], 1)
+        Soumission.objects.create(devoir=devoir, etudiant=self.etudiant, fichier='soumissions/copie.pdf')
+        self.assertEqual(self.client.get(url).context['cours_avec_stats'][0]['nb_soumissions'], 1)
+
+    def test_cartes_des_classes_par_utilisateur(self):
+        self.client.force_login(self.enseignant)
+        url = reverse('enseignants:mes_classes')
+        self.assertEqual(self.client.get(url).context['classes_avec_stats'][0]['nb_etudiants'], 1)
+        Utilisateur.objects.create_user(username='eleve2', role='etudiant', classe=self.classe)
+        self.assertEqual(self.client.get(url).context['classes_avec_stats'][0]['nb_etudiants'], 2)
+
+        # Un autre enseignant ne relit jamais le fragment du premier
+        collegue = Utilisateur.objects.create_user(username='collegue', password='secret', role='enseignant')
+        self.client.force_login(collegue)
+        self.assertEqual(self.client.get(url).context['classes_avec_stats'], [])
+        self.classe.enseignants.add(collegue)
+        self.assertEqual(len(self.client.get(url).context['classes_avec_stats']), 1)
+
+
+@cache_partage('sessions')
+class SessionsCacheTests(TestCase):
+    """Tests des sessions en cache écrites en base en différé"""
+
+    def setUp(self):
+        self.etudiant = Utilisateur.objects.create_user(username='eleve', password='secret', role='etudiant')
+        self.client.force_login(self.etudiant)
+        self.url = reverse('etudiants:mes_cours')
+
+    def ecritures_session(self, requetes):
+        return [requete for requete in requetes if 'django_session' in requete['sql']]
+
+    def expiration_en_base(self):
+        return SessionStore.get_model_class().objects.get(session_key=self.client.session.session_key).expire_date
+
+    def test_pages_sans_ecriture_de_session(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ecritures_session(requetes.captured_queries), [])
+
+    def test_expiration_persistee_au_dela_du_seuil(self):
+        expiration = self.expiration_en_base()
+        plus_tard = timezone.now() + timedelta(seconds=301)
+        with mock.patch('django.contrib.sessions.backends.base.timezone.now', return_value=plus_tard):
+            with CaptureQueriesContext(connection) as requetes:
+                self.client.get(self.url)
+        self.assertTrue(self.ecritures_session(requetes.captured_queries))
+        self.assertGreater(self.expiration_en_base(), expiration + timedelta(seconds=300))
+
+    def test_ligne_supprimee_par_le_nettoyage_recreee(self):
+        self.client.get(self.url)
+        cle = self.client.session.session_key
+        # Expirée en base (en retard sur le cache) puis supprimée par nettoyer_sessions
+        SessionStore.get_model_class().objects.filter(session_key=cle).delete()
+        plus_tard = timezone.now() + timedelta(seconds=400)
+        with mock.patch('django.contrib.sessions.backends.base.timezone.now', return_value=plus_tard):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session.session_key, cle)
+        self.assertGreater(self.expiration_en_base(), plus_tard)
+
+    def test_session_inactive_expiree(self):
+        # 30 minutes sans requête : le cache a expiré et la ligne en base aussi
+        cache.clear()
+        plus_tard = timezone.now() + timedelta(seconds=1801)
+        with mock.patch('django.utils.timezone.now', return_value=plus_tard):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_nettoyage_par_lots(self):
+        modele = SessionStore.get_model_class()
+        passee = timezone.now() - timedelta(minutes=1)
+        modele.objects.bulk_create([
+            modele(session_key=f'expiree{numero:02d}', session_data='', expire_date=passee) for numero in range(5)
+        ])
+        sortie = io.StringIO()
+        with CaptureQueriesContext(connection) as requetes:
+            call_command('nettoyer_sessions', '--lot', '2', stdout=sortie)
+        self.assertIn('5 session(s)', sortie.getvalue())
+        self.assertEqual(len([requete for requete in requetes.captured_queries if requete['sql'].startswith('DELETE')]), 3)
+        self.assertTrue(modele.objects.filter(session_key=self.client.session.session_key).exists())
+
+
+@override_settings(DATABASES_REPLICAS=['replica1', 'replica2'])
+class ReplicasTests(TestCase):
+    """Tests du routage des lectures de consultation vers les réplicas"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.routeur = RouteurReplicas()
+
+        @lecture_sur_replica
+        def vue(request):
+            with sur_primaire():
+                primaire = self.routeur.db_for_read(Cours)
+            return HttpResponse(f'{self.routeur.db_for_read(Cours)}:{self.routeur.db_for_write(Cours)}:{primaire}')
+        self.vue = vue
+
+    def test_lectures_des_vues_marquees(self):
+        self.assertIn(self.vue(self.factory.get('/')).content, [b'replica1:None:None', b'replica2:None:None'])
+        self.assertIsNone(self.routeur.db_for_read(Cours))
+        self.assertFalse(self.routeur.allow_migrate('replica1', 'cours'))
+        self.assertTrue(self.routeur.allow_migrate('default', 'cours'))
+
+    def test_base_principale_apres_une_ecriture(self):
+        self.assertEqual(self.vue(self.factory.post('/')).content, b'None:None:None')
+        middleware = LecturesReplicasMiddleware(lambda request: HttpResponse())
+        self.assertIn(COOKIE_PRIMAIRE, middleware(self.factory.post('/')).cookies)
+        self.assertNotIn(COOKIE_PRIMAIRE, middleware(self.factory.get('/')).cookies)
+
+        # GET qui écrit (suppressions des enseignants) : la liste affichée ensuite relit la principale
+        def supprimer(request):
+            self.routeur.db_for_write(Cours)
+            return HttpResponse()
+        self.assertIn(COOKIE_PRIMAIRE, LecturesReplicasMiddleware(supprimer)(self.factory.get('/')).cookies)
+        self.assertNotIn(COOKIE_PRIMAIRE, middleware(self.factory.get('/')).cookies)
+
+        requete = self.factory.get('/')
+        requete.COOKIES[COOKIE_PRIMAIRE] = '1'
+        self.assertEqual(self.vue(requete).content, b'None:None:None')
+
+    @override_settings(DATABASES_REPLICAS=[])
+    def test_sans_replica(self):
+        self.assertEqual(self.vue(self.factory.get('/')).content, b'None:None:None')
+        with self.assertRaises(MiddlewareNotUsed):
+            LecturesReplicasMiddleware(lambda request: HttpResponse())
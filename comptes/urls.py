@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from django.views.generic import RedirectView
 from . import views
@@ -14,6 +15,11 @@ urlpatterns = [
     path('admin/utilisateurs/', views.admin_utilisateurs, name='admin_utilisateurs'),
     path('admin/inviter-enseignant/', views.admin_inviter_enseignant, name='admin_inviter_enseignant'),
     path('admin/inviter-etudiant/', views.admin_inviter_etudiant, name='admin_inviter_etudiant'),
+    path('admin/importer-invitations/', views.admin_importer_invitations, name='admin_importer_invitations'),
+    path('admin/exports/<str:nom>/', views.admin_exporter, name='admin_exporter'),
+    # Fichiers média (cours, devoirs, soumissions) servis après contrôle d'accès
+    path('apercus/<path:chemin>', views.apercu_fichier, name='apercu_fichier'),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:chemin>", views.fichier_protege, name='fichier_protege'),
     path('admin/accepter-invitation/<str:token>/', views.accepter_invitation, name='accepter_invitation'),
     path('admin/classes/', views.admin_classes, name='admin_classes'),
     path('admin/ajouter-classe/', views.admin_ajouter_classe, name='admin_ajouter_classe'),
@@ -28,6 +34,7 @@ urlpatterns = [
     path('admin/cours/<int:cours_id>/supprimer/', views.admin_supprimer_cours, name='admin_supprimer_cours'),
     path('admin/devoirs/', views.admin_devoirs, name='admin_devoirs'),
     path('admin/devoir/<int:devoir_id>/', views.admin_detail_devoir, name='admin_detail_devoir'),
+    path('admin/devoir/<int:devoir_id>/soumissions.zip', views.admin_telecharger_soumissions, name='admin_telecharger_soumissions'),
     path('admin/devoir/<int:devoir_id>/modifier/', views.admin_modifier_devoir, name='admin_modifier_devoir'),
     path('admin/devoir/<int:devoir_id>/supprimer/', views.admin_supprimer_devoir, name='admin_supprimer_devoir'),
     path('admin/utilisateur/<int:utilisateur_id>/', views.admin_detail_utilisateur, name='admin_detail_utilisateur'),
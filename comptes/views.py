@@ -1,15 +1,24 @@
+import csv
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Count, Q, F
+from django.http import Http404, HttpResponseForbidden, StreamingHttpResponse
+from django.db.models import Count, Q, Exists, OuterRef
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
-from django.template.loader import render_to_string
-from .models import Utilisateur, Classe, Invitation
+from .models import Utilisateur, Classe, Invitation, ApercuFichier
+from .emails import mettre_invitation_en_file
+from .exports import EXPORTS, FORMATS, flux_export, nom_fichier_export
+from .imports import lire_csv, importer_invitations
+from .medias import fichier_autorise, servir_fichier
+from .pagination import paginer_par_curseur
+from .replicas import lecture_sur_replica
+from .statistiques import CLES_ROLES, lire_statistiques
+from .televersements import verifier_envoi
 from cours.models import Cours, Inscription
 from devoirs.models import Devoir, Soumission
+from devoirs.archives import flux_archive_soumissions, nom_archive_soumissions
+from devoirs.services import mettre_a_jour_retards
 
 #----------------------------------Gestion des permissions----------------------------------
 def is_admin(user):
@@ -19,20 +28,11 @@ def is_admin(user):
 #----------------------------------Gestion de la page d'accueil----------------------------------
 @login_required
 @user_passes_test(is_admin, login_url='/admin/login/')
+@lecture_sur_replica
 def admin_dashboard(request):
     """Dashboard principal de l'administrateur"""
-    # Statistiques
-    total_etudiants = Utilisateur.objects.filter(role='etudiant').count()
-    total_enseignants = Utilisateur.objects.filter(role='enseignant').count()
-    total_cours = Cours.objects.count()
-    total_devoirs = Devoir.objects.count()
-    total_inscriptions = Inscription.objects.count()
-    total_soumissions = Soumission.objects.count()
-    
-    # Statistiques des soumissions
-    now = timezone.now()
-    soumissions_a_temps = Soumission.objects.filter(date_soumission__lte=F('devoir__deadline')).count()
-    soumissions_en_retard = Soumission.objects.filter(date_soumission__gt=F('devoir__deadline')).count()
+    # Compteurs maintenus par les signaux : une seule requête quel que soit le volume
+    stats = lire_statistiques()
     
     # Cours récents
     cours_recents = Cours.objects.select_related('enseignant').order_by('-created_at')[:5]
@@ -44,51 +44,66 @@ def admin_dashboard(request):
     utilisateurs_recents = Utilisateur.objects.order_by('-date_joined')[:5]
     
     context = {
-        'total_etudiants': total_etudiants,
-        'total_enseignants': total_enseignants,
-        'total_cours': total_cours,
-        'total_devoirs': total_devoirs,
-        'total_inscriptions': total_inscriptions,
-        'total_soumissions': total_soumissions,
-        'soumissions_a_temps': soumissions_a_temps,
-        'soumissions_en_retard': soumissions_en_retard,
+        'total_etudiants': stats['total_etudiants'],
+        'total_enseignants': stats['total_enseignants'],
+        'total_cours': stats['total_cours'],
+        'total_devoirs': stats['total_devoirs'],
+        'total_inscriptions': stats['total_inscriptions'],
+        'total_soumissions': stats['total_soumissions'],
+        'soumissions_a_temps': stats['soumissions_a_temps'],
+        'soumissions_en_retard': stats['soumissions_en_retard'],
         'cours_recents': cours_recents,
         'devoirs_recents': devoirs_recents,
         'utilisateurs_recents': utilisateurs_recents,
+        'exports': [('notes', 'Notes'), ('soumissions', 'Soumissions'), ('inscriptions', 'Inscriptions')],
     }
     return render(request, 'admin/dashboard.html', context)
 
 #----------------------------------Gestion de la page des utilisateurs----------------------------------
+# Nombre maximal de résultats comptés pour une recherche dans la liste des utilisateurs
+LIMITE_TOTAL_RECHERCHE = 1000
+
+
 @login_required
 @user_passes_test(is_admin, login_url='/admin/login/')
+@lecture_sur_replica
 def admin_utilisateurs(request):
     """Gestion des utilisateurs"""
     role_filter = request.GET.get('role', '')
-    search_query = request.GET.get('search', '')
+    search_query = request.GET.get('search', '').strip()
     
-    utilisateurs = Utilisateur.objects.all()
+    utilisateurs = Utilisateur.objects.select_related('classe')
     
     if role_filter:
         utilisateurs = utilisateurs.filter(role=role_filter)
     
     if search_query:
+        # Recherche par préfixe : chaque colonne est indexée, pas de LIKE '%x%'
         utilisateurs = utilisateurs.filter(
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query)
+            Q(username__istartswith=search_query) |
+            Q(email__istartswith=search_query) |
+            Q(first_name__istartswith=search_query) |
+            Q(last_name__istartswith=search_query)
         )
     
-    # Statistiques par rôle
-    stats = {
-        'total': utilisateurs.count(),
-        'admin': Utilisateur.objects.filter(role='admin').count(),
-        'enseignant': Utilisateur.objects.filter(role='enseignant').count(),
-        'etudiant': Utilisateur.objects.filter(role='etudiant').count(),
-    }
+    # Totaux par rôle lus dans les compteurs du dashboard, sans parcourir la table
+    compteurs = lire_statistiques()
+    stats = {role: compteurs[cle] for role, cle in CLES_ROLES.items()}
+    if search_query:
+        # Total de la recherche plafonné : au-delà, « N+ »
+        nombre = utilisateurs.order_by()[:LIMITE_TOTAL_RECHERCHE + 1].count()
+        stats['total'] = min(nombre, LIMITE_TOTAL_RECHERCHE)
+        stats['total_plafonne'] = nombre > LIMITE_TOTAL_RECHERCHE
+    elif role_filter:
+        stats['total'] = stats.get(role_filter, 0)
+    else:
+        stats['total'] = sum(stats[role] for role in CLES_ROLES)
+    
+    page = paginer_par_curseur(utilisateurs, request, ordre=['-date_joined', '-id'])
     
     context = {
-        'utilisateurs': utilisateurs,
+        'utilisateurs': page.objets,
+        'page': page,
         'stats': stats,
         'role_filter': role_filter,
         'search_query': search_query,
@@ -98,23 +113,26 @@ def admin_utilisateurs(request):
 
 @login_required
 @user_passes_test(is_admin, login_url='/admin/login/')
+@lecture_sur_replica
 def admin_cours(request):
     """Gestion des cours"""
-    search_query = request.GET.get('search', '')
+    search_query = request.GET.get('search', '').strip()
     
     cours = Cours.objects.select_related('enseignant').annotate(
         nb_inscriptions=Count('inscription')
-    ).order_by('-created_at')
+    )
     
     if search_query:
         cours = cours.filter(
-            Q(titre__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(enseignant__username__icontains=search_query)
+            Q(titre__istartswith=search_query) |
+            Q(enseignant__username__istartswith=search_query)
         )
     
+    page = paginer_par_curseur(cours, request, ordre=['-created_at', '-id'])
+    
     context = {
-        'cours': cours,
+        'cours': page.objets,
+        'page': page,
         'search_query': search_query,
     }
     return render(request, 'admin/cours.html', context)
@@ -122,23 +140,27 @@ def admin_cours(request):
 
 @login_required
 @user_passes_test(is_admin, login_url='/admin/login/')
+@lecture_sur_replica
 def admin_devoirs(request):
     """Gestion des devoirs"""
-    search_query = request.GET.get('search', '')
+    search_query = request.GET.get('search', '').strip()
     
     devoirs = Devoir.objects.select_related('cours', 'cours__enseignant').annotate(
         nb_soumissions=Count('soumission')
-    ).order_by('-created_at')
+    )
     
     if search_query:
         devoirs = devoirs.filter(
-            Q(titre__icontains=search_query) |
-            Q(cours__titre__icontains=search_query)
+            Q(titre__istartswith=search_query) |
+            Q(cours__titre__istartswith=search_query)
         )
     
+    page = paginer_par_curseur(devoirs, request, ordre=['-created_at', '-id'])
+    
     now = timezone.now()
     context = {
-        'devoirs': devoirs,
+        'devoirs': page.objets,
+        'page': page,
         'search_query': search_query,
         'now': now,
     }
@@ -233,28 +255,13 @@ def admin_inviter_enseignant(request):
                 cree_par=request.user
             )
             
-            # Envoyer l'email d'invitation
-            lien_invitation = f"{settings.SITE_URL}/admin/accepter-invitation/{invitation.token}/"
-            sujet = "Invitation à rejoindre AKalan en tant qu'enseignant"
-            message_html = render_to_string('admin/email_invitation.html', {
-                'invitation': invitation,
-                'lien': lien_invitation,
-                'role': 'enseignant'
-            })
-            
-            send_mail(
-                sujet,
-                f"Vous avez été invité à rejoindre AKalan en tant qu'enseignant. Cliquez sur ce lien pour créer votre compte: {lien_invitation}",
-                settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@akalan.com',
-                [email],
-                html_message=message_html,
-                fail_silently=False,
-            )
+            # Mettre l'email d'invitation en file : il sera envoyé par la commande envoyer_emails
+            mettre_invitation_en_file(invitation)
             
-            messages.success(request, f'Invitation envoyée avec succès à {email}!')
+            messages.success(request, f'Invitation créée pour {email}, l\'email va être envoyé.')
             return redirect('admin_utilisateurs')
         except Exception as e:
-            messages.error(request, f'Une erreur est survenue lors de l\'envoi de l\'invitation: {str(e)}')
+            messages.error(request, f'Une erreur est survenue lors de la création de l\'invitation: {str(e)}')
     
     return render(request, 'admin/inviter_enseignant.html')
 
@@ -300,35 +307,103 @@ def admin_inviter_etudiant(request):
                 cree_par=request.user
             )
             
-            # Envoyer l'email d'invitation
-            lien_invitation = f"{settings.SITE_URL}/admin/accepter-invitation/{invitation.token}/"
-            sujet = "Invitation à rejoindre AKalan en tant qu'étudiant"
-            message_html = render_to_string('admin/email_invitation.html', {
-                'invitation': invitation,
-                'lien': lien_invitation,
-                'role': 'étudiant'
-            })
+            # Mettre l'email d'invitation en file : il sera envoyé par la commande envoyer_emails
+            mettre_invitation_en_file(invitation)
             
-            send_mail(
-                sujet,
-                f"Vous avez été invité à rejoindre AKalan en tant qu'étudiant. Cliquez sur ce lien pour créer votre compte: {lien_invitation}",
-                settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@akalan.com',
-                [email],
-                html_message=message_html,
-                fail_silently=False,
-            )
-            
-            messages.success(request, f'Invitation envoyée avec succès à {email}!')
+            messages.success(request, f'Invitation créée pour {email}, l\'email va être envoyé.')
             # Rediriger vers la page de la classe si une classe a été assignée
             if classe:
                 return redirect('admin_detail_classe', classe_id=classe.id)
             return redirect('admin_utilisateurs')
         except Exception as e:
-            messages.error(request, f'Une erreur est survenue lors de l\'envoi de l\'invitation: {str(e)}')
+            messages.error(request, f'Une erreur est survenue lors de la création de l\'invitation: {str(e)}')
     
     return render(request, 'admin/inviter_etudiant.html', {'classes': classes})
 
 
+#----------------------------------Gestion de l'import CSV d'invitations----------------------------------
+@login_required
+@user_passes_test(is_admin, login_url='/admin/login/')
+@verifier_envoi
+def admin_importer_invitations(request):
+    """Importer un fichier CSV d'invitations (colonnes email, role, classe)"""
+    context = {}
+    
+    if request.method == 'POST':
+        fichier = request.FILES.get('fichier')
+        if not fichier:
+            messages.error(request, 'Veuillez sélectionner un fichier CSV.')
+            return render(request, 'admin/importer_invitations.html', context)
+        
+        try:
+            lignes = lire_csv(fichier.read())
+        except (UnicodeDecodeError, csv.Error):
+            messages.error(request, 'Le fichier doit être un CSV encodé en UTF-8.')
+            return render(request, 'admin/importer_invitations.html', context)
+        
+        resultats = importer_invitations(lignes, cree_par=request.user)
+        nb_crees = sum(1 for resultat in resultats if resultat['statut'] == 'cree')
+        nb_erreurs = sum(1 for resultat in resultats if resultat['statut'] == 'erreur')
+        if nb_crees:
+            messages.success(request, f'{nb_crees} invitation(s) créée(s), les emails vont être envoyés.')
+        if nb_erreurs:
+            messages.warning(request, f'{nb_erreurs} ligne(s) en erreur.')
+        
+        context = {
+            'resultats': resultats,
+            'nb_crees': nb_crees,
+            'nb_erreurs': nb_erreurs,
+        }
+    
+    return render(request, 'admin/importer_invitations.html', context)
+
+
+@login_required
+@user_passes_test(is_admin, login_url='/admin/login/')
+def admin_exporter(request, nom):
+    """Exporter les notes, soumissions ou inscriptions en CSV ou XLSX"""
+    if nom not in EXPORTS:
+        raise Http404("Export inconnu")
+    format_export = request.GET.get('format', 'csv')
+    if format_export not in FORMATS:
+        format_export = 'csv'
+    
+    # Les lignes sont envoyées au fur et à mesure de leur lecture, par lots
+    response = StreamingHttpResponse(
+        flux_export(nom, format_export),
+        content_type=FORMATS[format_export][0],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier_export(nom, format_export)}"'
+    return response
+
+
+#----------------------------------Gestion des fichiers protégés----------------------------------
+@login_required
+def fichier_protege(request, chemin):
+    """Servir un fichier média (cours, devoir ou soumission) après vérification des droits"""
+    autorise = fichier_autorise(request.user, chemin)
+    if autorise is None:
+        raise Http404("Fichier introuvable")
+    if not autorise:
+        return HttpResponseForbidden("Vous n'avez pas accès à ce fichier.")
+    response = servir_fichier(request, chemin)
+    if response is None:
+        raise Http404("Fichier introuvable")
+    return response
+
+
+@login_required
+def apercu_fichier(request, chemin):
+    """Servir l'aperçu de la première page d'un PDF, avec les mêmes droits que le PDF"""
+    if not fichier_autorise(request.user, chemin):
+        raise Http404("Aperçu introuvable")
+    apercu = ApercuFichier.objects.filter(nom=chemin, statut='pret').exclude(image='').first()
+    response = servir_fichier(request, apercu.image.name) if apercu else None
+    if response is None:
+        raise Http404("Aperçu introuvable")
+    return response
+
+
 #----------------------------------Gestion de l'acceptation d'invitation----------------------------------
 def accepter_invitation(request, token):
     """Permet à un utilisateur d'accepter une invitation et de créer son compte"""
@@ -406,21 +481,28 @@ def accepter_invitation(request, token):
 @user_passes_test(is_admin, login_url='/admin/login/')
 def admin_classes(request):
     """Gestion des classes"""
-    search_query = request.GET.get('search', '')
+    search_query = request.GET.get('search', '').strip()
     
-    classes = Classe.objects.prefetch_related('enseignants').annotate(
-        nb_etudiants=Count('utilisateur', filter=Q(utilisateur__role='etudiant'))
-    ).order_by('nom')
+    classes = Classe.objects.annotate(
+        nb_etudiants=Count('utilisateur', filter=Q(utilisateur__role='etudiant'), distinct=True),
+        nb_enseignants=Count('enseignants', distinct=True),
+    )
     
     if search_query:
+        enseignants_correspondants = Classe.enseignants.through.objects.filter(
+            classe_id=OuterRef('pk'),
+            utilisateur__username__istartswith=search_query,
+        )
         classes = classes.filter(
-            Q(nom__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(enseignants__username__icontains=search_query)
+            Q(nom__istartswith=search_query) |
+            Exists(enseignants_correspondants)
         )
     
+    page = paginer_par_curseur(classes, request, ordre=['nom', 'id'])
+    
     context = {
-        'classes': classes,
+        'classes': page.objets,
+        'page': page,
         'search_query': search_query,
     }
     return render(request, 'admin/classes.html', context)
@@ -615,6 +697,16 @@ def admin_detail_devoir(request, devoir_id):
     return render(request, 'admin/detail_devoir.html', context)
 
 
+@login_required
+@user_passes_test(is_admin, login_url='/admin/login/')
+def admin_telecharger_soumissions(request, devoir_id):
+    """Télécharger toutes les soumissions d'un devoir dans une archive zip"""
+    devoir = get_object_or_404(Devoir, id=devoir_id)
+    response = StreamingHttpResponse(flux_archive_soumissions(devoir), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{nom_archive_soumissions(devoir)}"'
+    return response
+
+
 #----------------------------------Gestion des modifications (CRUD)----------------------------------
 @login_required
 @user_passes_test(is_admin, login_url='/admin/login/')
@@ -682,7 +774,8 @@ def admin_supprimer_utilisateur(request, utilisateur_id):
 @user_passes_test(is_admin, login_url='/admin/login/')
 def admin_modifier_classe(request, classe_id):
     """Modifier une classe"""
-    classe = get_object_or_404(Classe, id=classe_id)
+    # Enseignants préchargés : la case de chaque enseignant est cochée sans requête
+    classe = get_object_or_404(Classe.objects.prefetch_related('enseignants'), id=classe_id)
     enseignants = Utilisateur.objects.filter(role='enseignant')
     
     if request.method == 'POST':
@@ -801,8 +894,11 @@ def admin_modifier_devoir(request, devoir_id):
             devoir.titre = titre
             devoir.description = description
             devoir.cours = Cours.objects.get(id=cours_id)
+            ancienne_deadline = devoir.deadline
             devoir.deadline = parse_datetime(deadline)
             devoir.save()
+            if devoir.deadline != ancienne_deadline:
+                mettre_a_jour_retards(devoir)
             messages.success(request, f'Devoir "{devoir.titre}" modifié avec succès!')
             return redirect('admin_detail_devoir', devoir_id=devoir.id)
         except Exception as e:
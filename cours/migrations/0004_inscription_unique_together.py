@@ -0,0 +1,33 @@
+# Generated manually
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def supprimer_doublons(apps, schema_editor):
+    """Supprime les inscriptions en double avant d'ajouter la contrainte d'unicité"""
+    Inscription = apps.get_model('cours', 'Inscription')
+    doublons = (
+        Inscription.objects.values('cours_id', 'etudiant_id')
+        .annotate(premiere=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for doublon in doublons:
+        Inscription.objects.filter(
+            cours_id=doublon['cours_id'],
+            etudiant_id=doublon['etudiant_id'],
+        ).exclude(id=doublon['premiere']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cours', '0003_cours_fichier_pdf'),
+    ]
+
+    operations = [
+        migrations.RunPython(supprimer_doublons, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='inscription',
+            unique_together={('cours', 'etudiant')},
+        ),
+    ]
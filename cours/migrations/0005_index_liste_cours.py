@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 20:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0010_index_recherche_utilisateur'),
+        ('cours', '0004_inscription_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cours',
+            index=models.Index(fields=['created_at', 'id'], name='cours_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cours',
+            index=models.Index(fields=['titre'], name='cours_titre_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 11:05
+
+import comptes.stockage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cours', '0005_index_liste_cours'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cours',
+            name='fichier_pdf',
+            field=models.FileField(blank=True, null=True, storage=comptes.stockage.stockage_fichiers, upload_to='cours/pdf/', verbose_name='Fichier PDF'),
+        ),
+    ]
@@ -2,27 +2,29 @@ from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from comptes.models import Utilisateur, Classe
+from comptes.stockage import stockage_fichiers
 
 class Cours(models.Model):
     titre = models.CharField(max_length=150)
     description = models.TextField()
     enseignant = models.ForeignKey(Utilisateur, on_delete=models.CASCADE,limit_choices_to={'role': 'enseignant'})
     classe = models.ForeignKey(Classe, on_delete=models.CASCADE, verbose_name="Classe", related_name='cours', null=True, blank=True)
-    fichier_pdf = models.FileField(upload_to='cours/pdf/', verbose_name="Fichier PDF", null=True, blank=True)
+    fichier_pdf = models.FileField(upload_to='cours/pdf/', storage=stockage_fichiers, verbose_name="Fichier PDF", null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='cours_created_id_idx'),
+            models.Index(fields=['titre'], name='cours_titre_idx'),
+        ]
+
     def __str__(self):
         return self.titre
 
     def inscrire_etudiants_classe(self):
         """Inscrit automatiquement tous les étudiants de la classe à ce cours"""
-        if self.classe:
-            etudiants_classe = Utilisateur.objects.filter(classe=self.classe, role='etudiant')
-            for etudiant in etudiants_classe:
-                Inscription.objects.get_or_create(
-                    cours=self,
-                    etudiant=etudiant
-                )
+        from .services import inscrire_classe_au_cours
+        return inscrire_classe_au_cours(self)
 
 
 class Inscription(models.Model):
@@ -41,5 +43,5 @@ class Inscription(models.Model):
 @receiver(post_save, sender=Cours)
 def inscrire_etudiants_automatiquement(sender, instance, created, **kwargs):
     """Inscrit automatiquement tous les étudiants de la classe au cours"""
-    if created and instance.classe:
+    if created and instance.classe_id:
         instance.inscrire_etudiants_classe()
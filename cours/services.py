@@ -0,0 +1,79 @@
+from comptes.acces import contexte_acces, invalider_acces
+from comptes.caches import invalider_modele
+from comptes.models import Utilisateur
+from .models import Cours, Inscription
+
+# Nombre d'inscriptions insérées par requête INSERT
+TAILLE_LOT_INSCRIPTIONS = 500
+
+
+def inscrire(cours_ids, etudiant_ids, taille_lot=TAILLE_LOT_INSCRIPTIONS):
+    """
+    Inscrit chaque étudiant à chaque cours en un nombre constant de requêtes.
+
+    Les paires (cours, étudiant) manquantes sont calculées par différence
+    d'ensembles avec les inscriptions existantes, puis insérées par lots.
+    Retourne le nombre d'inscriptions créées.
+    """
+    cours_ids = set(cours_ids)
+    etudiant_ids = set(etudiant_ids)
+    if not cours_ids or not etudiant_ids:
+        return 0
+
+    existantes = set(
+        Inscription.objects.filter(
+            cours_id__in=cours_ids,
+            etudiant_id__in=etudiant_ids,
+        ).values_list('cours_id', 'etudiant_id')
+    )
+    manquantes = {
+        (cours_id, etudiant_id)
+        for cours_id in cours_ids
+        for etudiant_id in etudiant_ids
+    } - existantes
+
+    Inscription.objects.bulk_create(
+        [Inscription(cours_id=cours_id, etudiant_id=etudiant_id) for cours_id, etudiant_id in sorted(manquantes)],
+        batch_size=taille_lot,
+        ignore_conflicts=True,
+    )
+    # bulk_create n'envoie pas post_save : compteur du dashboard, contextes d'accès et fragments sont mis à jour ici
+    from comptes.statistiques import incrementer
+    incrementer('total_inscriptions', len(manquantes))
+    invalider_acces({etudiant_id for _, etudiant_id in manquantes})
+    if manquantes:
+        invalider_modele('cours.Inscription')
+    return len(manquantes)
+
+
+def inscrire_classe_au_cours(cours):
+    """Inscrit tous les étudiants de la classe du cours à ce cours"""
+    if not cours.classe_id:
+        return 0
+    etudiant_ids = Utilisateur.objects.filter(
+        classe_id=cours.classe_id,
+        role='etudiant',
+    ).values_list('id', flat=True)
+    return inscrire([cours.id], etudiant_ids)
+
+
+def inscrire_etudiant_aux_cours(etudiant):
+    """Inscrit un étudiant à tous les cours de sa classe"""
+    if etudiant.role != 'etudiant' or not etudiant.classe_id:
+        return 0
+    cours_ids = Cours.objects.filter(classe_id=etudiant.classe_id).values_list('id', flat=True)
+    return inscrire(cours_ids, [etudiant.id])
+
+
+def etudiant_a_acces(etudiant, cours, creer_inscription=False):
+    """
+    Règle d'accès d'un étudiant à un cours et à ses devoirs : être dans la classe
+    du cours ou y être inscrit. Avec `creer_inscription`, l'inscription manquante d'un
+    étudiant de la classe est créée. Les inscriptions sont lues dans le
+    contexte d'accès en cache (comptes.acces).
+    """
+    if cours.classe_id and etudiant.classe_id == cours.classe_id:
+        if creer_inscription and cours.id not in contexte_acces(etudiant).cours_inscrits:
+            Inscription.objects.get_or_create(cours=cours, etudiant=etudiant)
+        return True
+    return cours.id in contexte_acces(etudiant).cours_inscrits
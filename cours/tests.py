@@ -1,3 +1,46 @@
 from django.test import TestCase
+from comptes.models import Utilisateur, Classe
+from .models import Cours, Inscription
+from .services import inscrire, inscrire_classe_au_cours
 
-# Create your tests here.
+
+class InscriptionServiceTests(TestCase):
+    """Tests du service d'inscription en masse"""
+
+    def setUp(self):
+        self.classe = Classe.objects.create(nom='Terminale A')
+        self.enseignant = Utilisateur.objects.create_user(
+            username='prof', password='secret', role='enseignant'
+        )
+        Utilisateur.objects.bulk_create([
+            Utilisateur(username=f'eleve{i}', role='etudiant', classe=self.classe)
+            for i in range(300)
+        ])
+
+    def test_creation_cours_inscrit_la_classe_en_requetes_constantes(self):
+        # Insertion du cours + signal : ids des étudiants, inscriptions existantes, un INSERT,
+        # puis la mise à jour des compteurs du dashboard (cours et inscriptions)
+        with self.assertNumQueries(6):
+            cours = Cours.objects.create(
+                titre='Mathématiques',
+                description='Description',
+                enseignant=self.enseignant,
+                classe=self.classe,
+            )
+        self.assertEqual(Inscription.objects.filter(cours=cours).count(), 300)
+
+    def test_inscription_idempotente(self):
+        cours = Cours.objects.create(
+            titre='Physique',
+            description='Description',
+            enseignant=self.enseignant,
+            classe=self.classe,
+        )
+        self.assertEqual(inscrire_classe_au_cours(cours), 0)
+
+        nouvel_etudiant = Utilisateur.objects.create_user(
+            username='nouveau', password='secret', role='etudiant', classe=self.classe
+        )
+        self.assertTrue(Inscription.objects.filter(cours=cours, etudiant=nouvel_etudiant).exists())
+        self.assertEqual(inscrire([cours.id], [nouvel_etudiant.id]), 0)
+        self.assertEqual(Inscription.objects.filter(cours=cours).count(), 301)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Devoir, Soumission
+from .models import ConversionImage, Devoir, Soumission
+from .services import mettre_a_jour_retards
 
 
 @admin.register(Devoir)
@@ -9,11 +10,23 @@ class DevoirAdmin(admin.ModelAdmin):
     search_fields = ('titre', 'description', 'cours__titre')
     date_hierarchy = 'created_at'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'deadline' in form.changed_data:
+            mettre_a_jour_retards(obj)
+
 
 @admin.register(Soumission)
 class SoumissionAdmin(admin.ModelAdmin):
     list_display = ('etudiant', 'devoir', 'date_soumission', 'statut')
-    list_filter = ('date_soumission', 'devoir')
+    list_filter = ('en_retard', 'date_soumission', 'devoir')
     search_fields = ('etudiant__username', 'devoir__titre')
     date_hierarchy = 'date_soumission'
     readonly_fields = ('statut',)
+
+
+@admin.register(ConversionImage)
+class ConversionImageAdmin(admin.ModelAdmin):
+    list_display = ('soumission', 'statut', 'tentatives', 'prochaine_tentative', 'date_mise_a_jour')
+    list_filter = ('statut',)
+    readonly_fields = ('soumission', 'tentatives', 'derniere_erreur', 'date_mise_a_jour')
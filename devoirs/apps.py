@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class DevoirsConfig(AppConfig):
     name = 'devoirs'
+
+    def ready(self):
+        # Met les photos soumises dans la file de conversion
+        from . import images  # noqa: F401
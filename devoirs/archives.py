@@ -0,0 +1,68 @@
+import os
+import zipfile
+from django.utils import timezone
+from django.utils.text import slugify
+from comptes.exports import TamponFlux
+from .models import Soumission
+
+# Taille des blocs lus sur le disque et envoyés au client
+TAILLE_BLOC = 1024 * 1024
+
+
+def nom_fichier_soumission(soumission, noms_utilises):
+    """Nom du fichier dans l'archive : nom_prenom_identifiant.ext, unique dans l'archive"""
+    etudiant = soumission.etudiant
+    parties = [etudiant.last_name, etudiant.first_name, etudiant.username]
+    base = '_'.join(slugify(partie) for partie in parties if partie) or f'soumission-{soumission.id}'
+    if soumission.en_retard:
+        base += '_retard'
+    extension = os.path.splitext(soumission.fichier.name)[1].lower()
+    nom = f'{base}{extension}'
+    numero = 2
+    while nom in noms_utilises:
+        nom = f'{base}-{numero}{extension}'
+        numero += 1
+    noms_utilises.add(nom)
+    return nom
+
+
+def flux_archive_soumissions(devoir):
+    """
+    Génère une archive zip des fichiers rendus pour un devoir, au fil de l'eau.
+
+    Les fichiers sont recopiés par blocs sans compression (les PDF et images le
+    sont déjà) : ni l'archive ni un fichier entier ne sont gardés en mémoire, et
+    rien n'est écrit sur le disque. Les fichiers absents du stockage sont listés
+    dans FICHIERS_MANQUANTS.txt.
+    """
+    soumissions = (
+        Soumission.objects.filter(devoir=devoir)
+        .select_related('etudiant')
+        .order_by('etudiant__last_name', 'etudiant__first_name', 'etudiant__username')
+    )
+    tampon = TamponFlux()
+    noms_utilises = set()
+    manquants = []
+    with zipfile.ZipFile(tampon, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for soumission in soumissions:
+            if not soumission.fichier:
+                continue
+            nom = nom_fichier_soumission(soumission, noms_utilises)
+            try:
+                source = soumission.fichier.storage.open(soumission.fichier.name, 'rb')
+            except FileNotFoundError:
+                manquants.append(nom)
+                continue
+            info = zipfile.ZipInfo(nom, date_time=timezone.localtime(soumission.date_soumission).timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with source, archive.open(info, 'w', force_zip64=True) as destination:
+                for bloc in iter(lambda: source.read(TAILLE_BLOC), b''):
+                    destination.write(bloc)
+                    yield tampon.vider()
+        if manquants:
+            archive.writestr('FICHIERS_MANQUANTS.txt', '\n'.join(manquants) + '\n')
+    yield tampon.vider()
+
+
+def nom_archive_soumissions(devoir):
+    return f"soumissions_{slugify(devoir.titre) or devoir.id}.zip"
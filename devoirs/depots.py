@@ -0,0 +1,150 @@
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.db import IntegrityError, router, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from django.utils.text import get_valid_filename
+from comptes.caches import invalider_modele
+from comptes.files_attente import traiter_lots
+from cours.services import etudiant_a_acces
+from .models import Soumission
+
+# Dossier (relatif à MEDIA_ROOT) où les fichiers soumis attendent le worker
+DOSSIER_DEPOTS = 'depots'
+
+
+def nom_depot(nom_fichier, longueur_max=100):
+    """Nom unique du fichier dans le dossier des dépôts : <jeton>_<nom d'origine>, tronqué à la longueur du champ"""
+    prefixe = f'{DOSSIER_DEPOTS}/{get_random_string(12)}_'
+    racine, extension = os.path.splitext(get_valid_filename(os.path.basename(nom_fichier)) or 'fichier')
+    return prefixe + racine[:max(longueur_max - len(prefixe) - len(extension), 1)] + extension
+
+
+def nom_origine(nom):
+    """Nom d'origine d'un fichier du dossier des dépôts (sans le jeton)"""
+    return os.path.basename(nom).split('_', 1)[-1]
+
+
+def deposer(devoir, etudiant, fichier):
+    """
+    Chemin rapide d'une soumission, pour les rushs avant une deadline.
+
+    Le fichier reçu (déjà sur le disque, voir GestionnaireEnvoiLimite) est
+    déplacé dans le dossier des dépôts, puis la soumission est créée par un
+    seul INSERT : la contrainte (devoir, étudiant) écarte les doublons sans
+    vérification préalable. Les signaux de création (compteurs, espace
+    utilisé, aperçu, variante web) sont envoyés par le worker, une fois le
+    fichier à sa place. Retourne False si le devoir était déjà soumis.
+    """
+    soumission = Soumission(devoir=devoir, etudiant=etudiant, depot_en_attente=True)
+    champ = soumission.fichier.field
+    nom = nom_depot(fichier.name, champ.max_length)
+    chemin = champ.storage.path(nom)
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    if hasattr(fichier, 'temporary_file_path'):
+        # Simple renommage quand le dossier temporaire est sur le même disque que MEDIA_ROOT
+        file_move_safe(fichier.temporary_file_path(), chemin)
+    else:
+        with open(chemin, 'wb') as sortie:
+            for bloc in fichier.chunks():
+                sortie.write(bloc)
+    if champ.storage.file_permissions_mode is not None:
+        os.chmod(chemin, champ.storage.file_permissions_mode)
+    soumission.fichier.name = nom
+
+    try:
+        with transaction.atomic():
+            # bulk_create : un INSERT, sans save() ni signaux
+            Soumission.objects.bulk_create([soumission])
+    except IntegrityError:
+        os.remove(chemin)
+        return False
+    # La soumission apparaît tout de suite dans les listes en cache (comptes.caches)
+    invalider_modele('devoirs.Soumission')
+    return True
+
+
+def finaliser_depot(soumission_id):
+    """
+    Déplace le fichier d'un dépôt dans le stockage final (soumissions/...),
+    crée l'inscription manquante d'un étudiant de la classe, puis envoie le
+    signal de création de la soumission. Retourne False si le dépôt est déjà
+    pris par un autre worker, finalisé ou supprimé.
+    """
+    nom = None
+    try:
+        with transaction.atomic():
+            # Seule la ligne de la soumission est verrouillée : les dépôts en cours ne l'attendent pas
+            soumission = (
+                Soumission.objects.select_for_update(skip_locked=True)
+                .filter(id=soumission_id, depot_en_attente=True).first()
+            )
+            if soumission is None:
+                return False
+            stockage = soumission.fichier.storage
+            depot = soumission.fichier.name
+            champ = soumission.fichier.field
+            with stockage.open(depot, 'rb') as fichier:
+                nom = stockage.save(champ.generate_filename(soumission, nom_origine(depot)), fichier)
+            # Retard recalculé ici : la deadline a pu changer pendant l'attente (devoirs.services)
+            soumission.en_retard = soumission.date_soumission > soumission.devoir.deadline
+            Soumission.objects.filter(id=soumission.id).update(
+                fichier=nom, depot_en_attente=False, en_retard=soumission.en_retard,
+            )
+            soumission.fichier.name = nom
+            soumission.depot_en_attente = False
+
+            etudiant_a_acces(soumission.etudiant, soumission.devoir.cours, creer_inscription=True)
+            post_save.send(
+                sender=Soumission, instance=soumission, created=True, update_fields=None, raw=False,
+                using=router.db_for_write(Soumission),
+            )
+    except Exception:
+        if nom is not None:
+            # Le ROLLBACK a retiré les références du fichier rangé, pas le fichier lui-même
+            getattr(stockage, 'annuler', stockage.delete)(nom)
+        raise
+    try:
+        os.remove(stockage.path(depot))
+    except FileNotFoundError:
+        pass
+    return True
+
+
+def _marquer_echec(soumission, erreur):
+    tentatives = soumission.depot_tentatives + 1
+    abandon = tentatives >= getattr(settings, 'DEPOTS_MAX_TENTATIVES', 5)
+    Soumission.objects.filter(id=soumission.id, depot_en_attente=True).update(
+        depot_tentatives=tentatives,
+        depot_derniere_erreur=str(erreur),
+        depot_prochaine_tentative=None if abandon else timezone.now() + timedelta(minutes=tentatives),
+    )
+
+
+def traiter_file(taille_lot=None):
+    """
+    Finalise les dépôts en attente, lot par lot. Un dépôt en échec est
+    retenté après un délai croissant, puis abandonné au bout de
+    DEPOTS_MAX_TENTATIVES (l'erreur reste dans depot_derniere_erreur).
+    Retourne le nombre de dépôts finalisés et le nombre d'échecs.
+    """
+    taille_lot = taille_lot or getattr(settings, 'DEPOTS_TAILLE_LOT', 100)
+    a_traiter = Soumission.objects.filter(
+        Q(depot_prochaine_tentative__isnull=True) | Q(depot_prochaine_tentative__lte=timezone.now()),
+        depot_en_attente=True, depot_tentatives__lt=getattr(settings, 'DEPOTS_MAX_TENTATIVES', 5),
+    ).only('id', 'depot_tentatives').order_by('id')
+    dernier_id = 0
+
+    def reserver():
+        nonlocal dernier_id
+        # Parcours par id croissant (index soumission_depot_idx) : un échec n'est pas repris pendant ce passage
+        lot = list(a_traiter.filter(id__gt=dernier_id)[:taille_lot])
+        if lot:
+            dernier_id = lot[-1].id
+        return lot
+
+    return traiter_lots(reserver, lambda soumission: finaliser_depot(soumission.id), _marquer_echec)
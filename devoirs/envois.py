@@ -0,0 +1,249 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from comptes.quotas import espace_disponible
+from comptes.televersements import limite_champ, type_autorise, type_contenu
+from cours.services import etudiant_a_acces
+from .models import EnvoiFractionne, Soumission
+
+TAILLE_LECTURE = 64 * 1024
+
+
+class ErreurEnvoi(Exception):
+    """Erreur d'un envoi fractionné, avec le code HTTP à renvoyer au client"""
+
+    def __init__(self, message, statut=400, envoi=None):
+        super().__init__(message)
+        self.statut = statut
+        self.envoi = envoi
+
+    def donnees(self):
+        donnees = {'erreur': str(self)}
+        if self.envoi is not None:
+            # Le client reprend l'envoi à partir de ce qui a déjà été reçu
+            donnees.update(etat_envoi(self.envoi))
+        return donnees
+
+
+def taille_bloc():
+    """Taille maximale d'un bloc envoyé en une requête"""
+    return getattr(settings, 'ENVOI_TAILLE_BLOC', 1024 * 1024)
+
+
+def taille_maximale():
+    """Taille maximale d'un fichier envoyé par blocs"""
+    return getattr(settings, 'ENVOI_TAILLE_MAX', 200 * 1024 * 1024)
+
+
+def dossier_envois():
+    """Dossier où les fichiers partiels sont assemblés, hors du stockage des médias servis"""
+    dossier = getattr(settings, 'ENVOI_DOSSIER', None) or os.path.join(settings.MEDIA_ROOT, 'envois_en_cours')
+    os.makedirs(dossier, exist_ok=True)
+    return dossier
+
+
+def chemin_partiel(envoi):
+    return os.path.join(dossier_envois(), f'{envoi.token}.part')
+
+
+def etat_envoi(envoi):
+    """État renvoyé au client (JSON) pour poursuivre ou reprendre l'envoi"""
+    return {
+        'token': envoi.token,
+        'recu': envoi.recu,
+        'taille': envoi.taille,
+        'taille_bloc': taille_bloc(),
+    }
+
+
+def _supprimer(envoi):
+    try:
+        os.remove(chemin_partiel(envoi))
+    except FileNotFoundError:
+        pass
+    envoi.delete()
+
+
+def _controler_devoir(envoi):
+    """
+    Refuse et abandonne l'envoi d'une soumission devenue impossible (date
+    limite passée, accès retiré), comme un envoi classique à ce moment-là.
+    """
+    devoir = envoi.devoir
+    if timezone.now() > devoir.deadline:
+        motif = "La date limite de soumission est dépassée."
+    elif not etudiant_a_acces(envoi.utilisateur, devoir.cours):
+        motif = "Vous n'avez pas accès à ce devoir."
+    else:
+        return
+    _supprimer(envoi)
+    raise ErreurEnvoi(motif, statut=403)
+
+
+def demarrer_envoi(devoir, utilisateur, nom_fichier, taille, sha256, champ='fichier'):
+    """
+    Ouvre la session d'envoi de l'utilisateur pour ce devoir (devoir None :
+    PDF de cours, avec champ='fichier_pdf').
+
+    Si une session existe déjà pour le même fichier (même taille et même
+    empreinte SHA-256), elle est reprise là où elle s'était arrêtée ; une
+    session pour un autre fichier est abandonnée.
+    """
+    sha256 = (sha256 or '').lower()
+    if len(sha256) != 64 or any(caractere not in '0123456789abcdef' for caractere in sha256):
+        raise ErreurEnvoi("Empreinte SHA-256 invalide.")
+    if taille <= 0:
+        raise ErreurEnvoi("Le fichier est vide.")
+    if taille > min(taille_maximale(), limite_champ(champ)['taille_max']):
+        raise ErreurEnvoi("Le fichier est trop volumineux.", statut=413)
+    disponible = espace_disponible(utilisateur)
+    if disponible is not None and taille > disponible:
+        raise ErreurEnvoi("Votre espace de stockage est insuffisant pour ce fichier.", statut=413)
+
+    with transaction.atomic():
+        envoi = EnvoiFractionne.objects.select_for_update().filter(
+            devoir=devoir, utilisateur=utilisateur, champ=champ
+        ).first()
+        if envoi is not None:
+            if envoi.taille == taille and envoi.sha256 == sha256 and os.path.exists(chemin_partiel(envoi)):
+                return envoi
+            _supprimer(envoi)
+        envoi = EnvoiFractionne.objects.create(
+            token=get_random_string(64),
+            devoir=devoir,
+            utilisateur=utilisateur,
+            champ=champ,
+            nom_fichier=os.path.basename(nom_fichier)[:255] or 'fichier',
+            taille=taille,
+            sha256=sha256,
+        )
+        open(chemin_partiel(envoi), 'wb').close()
+    return envoi
+
+
+def recevoir_bloc(envoi, debut, flux, longueur, sha256_bloc=None):
+    """
+    Ajoute un bloc au fichier partiel. Le bloc est d'abord lu dans un fichier
+    temporaire (la connexion du client peut être lente) puis ajouté sous verrou
+    si `debut` correspond bien à ce qui a déjà été reçu. Le dernier bloc
+    déclenche l'assemblage final. Retourne l'envoi et la soumission éventuelle
+    (aucune pour un PDF de cours, joint ensuite par joindre_envoi).
+    """
+    if envoi.devoir_id is not None:
+        _controler_devoir(envoi)
+    if longueur <= 0 or longueur > taille_bloc():
+        raise ErreurEnvoi("Taille de bloc invalide.", statut=413, envoi=envoi)
+    if debut + longueur > envoi.taille:
+        raise ErreurEnvoi("Le bloc dépasse la taille annoncée du fichier.", envoi=envoi)
+
+    empreinte = hashlib.sha256()
+    with tempfile.TemporaryFile(dir=dossier_envois()) as bloc:
+        restant = longueur
+        while restant > 0:
+            donnees = flux.read(min(TAILLE_LECTURE, restant))
+            if not donnees:
+                break
+            empreinte.update(donnees)
+            bloc.write(donnees)
+            restant -= len(donnees)
+        if restant:
+            raise ErreurEnvoi("Bloc incomplet.", envoi=envoi)
+        if sha256_bloc and empreinte.hexdigest() != sha256_bloc.lower():
+            raise ErreurEnvoi("Empreinte du bloc incorrecte.", statut=422, envoi=envoi)
+        if debut == 0:
+            # Même contrôle du type réel que pour un envoi classique (comptes.televersements)
+            bloc.seek(0)
+            if not type_autorise(type_contenu(bloc.read(4096)), limite_champ(envoi.champ)['types']):
+                raise ErreurEnvoi("Ce type de fichier n'est pas accepté.", statut=415, envoi=envoi)
+
+        with transaction.atomic():
+            envoi = EnvoiFractionne.objects.select_for_update().get(id=envoi.id)
+            if debut != envoi.recu:
+                # Bloc déjà reçu ou envoyé dans le désordre : le client reprend à `recu`
+                raise ErreurEnvoi("Position du bloc incorrecte.", statut=409, envoi=envoi)
+            bloc.seek(0)
+            with open(chemin_partiel(envoi), 'r+b') as partiel:
+                partiel.truncate(envoi.recu)
+                partiel.seek(envoi.recu)
+                shutil.copyfileobj(bloc, partiel, TAILLE_LECTURE)
+            envoi.recu += longueur
+            envoi.save(update_fields=['recu', 'date_mise_a_jour'])
+
+    if not envoi.termine:
+        return envoi, None
+    if envoi.devoir_id is None:
+        _controler_empreinte(envoi)
+        return envoi, None
+    return envoi, terminer_envoi(envoi)
+
+
+def _controler_empreinte(envoi):
+    empreinte = hashlib.sha256()
+    with open(chemin_partiel(envoi), 'rb') as partiel:
+        for donnees in iter(lambda: partiel.read(TAILLE_LECTURE), b''):
+            empreinte.update(donnees)
+    if empreinte.hexdigest() != envoi.sha256:
+        _supprimer(envoi)
+        raise ErreurEnvoi("Le fichier reçu ne correspond pas à l'empreinte annoncée, l'envoi doit être recommencé.", statut=422)
+
+
+def _enregistrer(envoi, fichier):
+    """Copie le fichier assemblé dans le stockage du champ `fichier` (FieldFile), sans sauvegarder l'instance"""
+    with open(chemin_partiel(envoi), 'rb') as partiel:
+        fichier.save(envoi.nom_fichier, File(partiel), save=False)
+    return fichier.name
+
+
+def terminer_envoi(envoi):
+    """
+    Vérifie l'empreinte du fichier assemblé, l'enregistre dans le stockage des
+    médias puis crée la soumission, si la date limite n'est pas passée entre-temps.
+    """
+    # La date limite a pu passer pendant la réception du dernier bloc
+    _controler_devoir(envoi)
+    _controler_empreinte(envoi)
+
+    soumission = Soumission(devoir=envoi.devoir, etudiant=envoi.utilisateur)
+    nom = _enregistrer(envoi, soumission.fichier)
+    try:
+        with transaction.atomic():
+            soumission.save()
+    except IntegrityError:
+        # Une soumission classique est arrivée entre-temps (contrainte devoir/étudiant)
+        soumission.fichier.storage.delete(nom)
+        _supprimer(envoi)
+        raise ErreurEnvoi("Vous avez déjà soumis ce devoir.", statut=409)
+    _supprimer(envoi)
+    return soumission
+
+
+def envoi_termine(utilisateur, token, champ):
+    """Envoi sans devoir terminé par l'utilisateur (token posté avec le formulaire), ou None"""
+    envoi = EnvoiFractionne.objects.filter(token=token, utilisateur=utilisateur, devoir=None, champ=champ).first()
+    return envoi if envoi is not None and envoi.termine else None
+
+
+def joindre_envoi(envoi, fichier):
+    """
+    Enregistre un envoi terminé dans le champ fichier (FieldFile) d'une
+    instance, par exemple le PDF d'un cours, puis supprime l'envoi.
+    L'instance reste à sauvegarder.
+    """
+    _enregistrer(envoi, fichier)
+    _supprimer(envoi)
+
+
+def nettoyer_envois(age=timedelta(days=2)):
+    """Supprime les envois abandonnés depuis plus de `age`. Retourne leur nombre."""
+    limite = timezone.now() - age
+    envois = list(EnvoiFractionne.objects.filter(date_mise_a_jour__lt=limite))
+    for envoi in envois:
+        _supprimer(envoi)
+    return len(envois)
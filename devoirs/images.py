@@ -0,0 +1,116 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from comptes.files_attente import marquer_echec, reserver_lot, traiter_lots
+from comptes.televersements import type_contenu
+from .models import ConversionImage, Soumission
+
+# Photos converties en variante web ; les autres fichiers sont servis tels quels
+EXTENSIONS_IMAGES = {'.heic', '.heif', '.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff', '.bmp'}
+
+
+def est_image(nom):
+    return os.path.splitext(nom or '')[1].lower() in EXTENSIONS_IMAGES
+
+
+# Codeur ImageMagick imposé pour chaque type reconnu aux premiers octets : jamais déduit du
+# contenu, qui pourrait désigner un codeur de script (MVG, SVG, MSL...) sous une extension .jpg
+CODEURS_IMAGES = {
+    'image/jpeg': 'jpeg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/heic': 'heic',
+    'image/tiff': 'tiff',
+}
+
+
+def codeur_image(fichier):
+    """Codeur ImageMagick d'un fichier ouvert, d'après ses premiers octets, ou None si ce n'est pas une photo"""
+    return CODEURS_IMAGES.get(type_contenu(fichier.read(64)))
+
+
+def convertisseur():
+    """Chemin d'ImageMagick (magick, ou convert pour la version 6), ou None"""
+    return shutil.which(getattr(settings, 'IMAGE_MAGICK', 'magick')) or shutil.which('convert')
+
+
+def convertir_image(chemin):
+    """
+    Variante web d'une photo : première image seulement, orientation EXIF
+    appliquée, réduite à IMAGE_WEB_DIMENSION pixels, métadonnées retirées.
+    Retourne les octets au format IMAGE_WEB_FORMAT (WebP par défaut). Le
+    codeur de lecture est celui du type reconnu aux premiers octets.
+    """
+    with open(chemin, 'rb') as fichier:
+        codeur = codeur_image(fichier)
+    if codeur is None:
+        raise ValueError(f"{os.path.basename(chemin)} n'est pas une image reconnue.")
+    magick = convertisseur()
+    if not magick:
+        raise RuntimeError("ImageMagick est introuvable (paramètre IMAGE_MAGICK).")
+    dimension = getattr(settings, 'IMAGE_WEB_DIMENSION', 1600)
+    format_web = getattr(settings, 'IMAGE_WEB_FORMAT', 'webp')
+    with tempfile.TemporaryDirectory() as dossier:
+        sortie = os.path.join(dossier, f'image.{format_web}')
+        subprocess.run(
+            [
+                magick, f'{codeur}:{chemin}[0]', '-auto-orient', '-resize', f'{dimension}x{dimension}>',
+                '-strip', '-quality', str(getattr(settings, 'IMAGE_WEB_QUALITE', 80)), f'{format_web}:{sortie}',
+            ],
+            capture_output=True, check=True, timeout=getattr(settings, 'IMAGE_DELAI_MAX', 120),
+        )
+        with open(sortie, 'rb') as image:
+            return image.read()
+
+
+def traiter_conversion(conversion):
+    """Produit la variante web d'une soumission et l'enregistre à côté de l'original"""
+    soumission = conversion.soumission
+    image = convertir_image(soumission.fichier.path)
+    nom = os.path.splitext(os.path.basename(soumission.fichier.name))[0]
+    format_web = getattr(settings, 'IMAGE_WEB_FORMAT', 'webp')
+    if soumission.fichier_web:
+        soumission.fichier_web.delete(save=False)
+    soumission.fichier_web.save(f'{nom}.{format_web}', ContentFile(image), save=False)
+    Soumission.objects.filter(id=soumission.id).update(fichier_web=soumission.fichier_web.name)
+    conversion.statut = 'pret'
+    conversion.derniere_erreur = ''
+    conversion.save(update_fields=['statut', 'derniere_erreur', 'date_mise_a_jour'])
+
+
+def _marquer_echec(conversion, erreur):
+    # L'original reste servi : l'échec ne bloque pas la correction
+    marquer_echec(
+        conversion, erreur, getattr(settings, 'IMAGE_MAX_TENTATIVES', 3), lambda tentatives: timedelta(minutes=tentatives),
+        definitif=isinstance(erreur, ValueError),
+    )
+
+
+def traiter_file(taille_lot=None):
+    """
+    Convertit les photos en attente, lot par lot.
+    Retourne le nombre de conversions réussies et le nombre d'échecs.
+    """
+    taille_lot = taille_lot or getattr(settings, 'IMAGE_TAILLE_LOT', 20)
+    return traiter_lots(
+        lambda: reserver_lot(ConversionImage.objects.select_related('soumission'), taille_lot),
+        traiter_conversion, _marquer_echec,
+    )
+
+
+# La soumission ne fait qu'ajouter une ligne à la file : la photo est convertie par le worker
+@receiver(post_save, sender=Soumission)
+def _conversion_soumission(sender, instance, created, **kwargs):
+    if not created or not est_image(instance.fichier.name):
+        return
+    # L'extension ne suffit pas : seules les photos reconnues à leurs premiers octets sont converties
+    with instance.fichier.storage.open(instance.fichier.name, 'rb') as fichier:
+        if codeur_image(fichier) is None:
+            return
+    ConversionImage.objects.bulk_create([ConversionImage(soumission=instance)], ignore_conflicts=True)
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cours', '0005_index_liste_cours'),
+        ('devoirs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='devoir',
+            index=models.Index(fields=['created_at', 'id'], name='devoir_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devoir',
+            index=models.Index(fields=['titre'], name='devoir_titre_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 11:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def initialiser_retards(apps, schema_editor):
+    Soumission = apps.get_model('devoirs', 'Soumission')
+    Soumission.objects.filter(date_soumission__gt=F('devoir__deadline')).update(en_retard=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devoirs', '0002_index_liste_devoirs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soumission',
+            name='en_retard',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='soumission',
+            index=models.Index(fields=['en_retard', 'date_soumission'], name='soumission_retard_idx'),
+        ),
+        migrations.RunPython(initialiser_retards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-17 10:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devoirs', '0003_soumission_en_retard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvoiFractionne',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('nom_fichier', models.CharField(max_length=255)),
+                ('taille', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('recu', models.BigIntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('devoir', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envois_fractionnes', to='devoirs.devoir')),
+                ('etudiant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envois_fractionnes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date_mise_a_jour'], name='envoi_mise_a_jour_idx')],
+                'unique_together': {('devoir', 'etudiant')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 11:05
+
+import comptes.stockage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devoirs', '0004_envoifractionne'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='devoir',
+            name='fichier',
+            field=models.FileField(blank=True, null=True, storage=comptes.stockage.stockage_fichiers, upload_to='devoirs/'),
+        ),
+        migrations.AlterField(
+            model_name='soumission',
+            name='fichier',
+            field=models.FileField(storage=comptes.stockage.stockage_fichiers, upload_to='soumissions/'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 13:40
+
+import comptes.stockage
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devoirs', '0005_alter_devoir_fichier_alter_soumission_fichier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soumission',
+            name='fichier_web',
+            field=models.FileField(blank=True, storage=comptes.stockage.stockage_fichiers, upload_to='soumissions/web/'),
+        ),
+        migrations.CreateModel(
+            name='ConversionImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('pret', 'Prête'), ('echec', 'Échec')], default='en_attente', max_length=20)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('soumission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='conversion_image', to='devoirs.soumission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='conversion_a_traiter')],
+            },
+        ),
+    ]
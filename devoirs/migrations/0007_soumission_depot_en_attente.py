@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 15:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devoirs', '0006_conversion_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soumission',
+            name='depot_en_attente',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='soumission',
+            index=models.Index(fields=['depot_en_attente', 'id'], name='soumission_depot_idx'),
+        ),
+    ]
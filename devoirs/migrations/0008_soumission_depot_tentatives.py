@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devoirs', '0007_soumission_depot_en_attente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soumission',
+            name='depot_derniere_erreur',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='soumission',
+            name='depot_prochaine_tentative',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='soumission',
+            name='depot_tentatives',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
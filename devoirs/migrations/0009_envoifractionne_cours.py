@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-17 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devoirs', '0008_soumission_depot_tentatives'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='envoifractionne',
+            old_name='etudiant',
+            new_name='utilisateur',
+        ),
+        migrations.AlterUniqueTogether(
+            name='envoifractionne',
+            unique_together={('devoir', 'utilisateur')},
+        ),
+        migrations.AlterField(
+            model_name='envoifractionne',
+            name='devoir',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='envois_fractionnes', to='devoirs.devoir'),
+        ),
+        migrations.AddField(
+            model_name='envoifractionne',
+            name='champ',
+            field=models.CharField(default='fichier', max_length=50),
+        ),
+    ]
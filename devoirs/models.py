@@ -1,15 +1,23 @@
 from django.db import models
+from django.utils import timezone
 from cours.models import Cours
 from comptes.models import Utilisateur
+from comptes.stockage import stockage_fichiers
 
 class Devoir(models.Model):
     cours = models.ForeignKey(Cours, on_delete=models.CASCADE)
     titre = models.CharField(max_length=150)
     description = models.TextField()
     deadline = models.DateTimeField()
-    fichier = models.FileField(upload_to='devoirs/', null=True, blank=True)
+    fichier = models.FileField(upload_to='devoirs/', storage=stockage_fichiers, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='devoir_created_id_idx'),
+            models.Index(fields=['titre'], name='devoir_titre_idx'),
+        ]
+
 class Soumission(models.Model):
     devoir = models.ForeignKey(Devoir, on_delete=models.CASCADE)
     etudiant = models.ForeignKey(
@@ -17,14 +25,88 @@ class Soumission(models.Model):
         on_delete=models.CASCADE,
         limit_choices_to={'role': 'etudiant'}
     )
-    fichier = models.FileField(upload_to='soumissions/')
+    fichier = models.FileField(upload_to='soumissions/', storage=stockage_fichiers)
     date_soumission = models.DateTimeField(auto_now_add=True)
+    # Fixé à la soumission puis recalculé quand la deadline du devoir change (devoirs.services)
+    en_retard = models.BooleanField(default=False)
+    # Variante web réduite des photos (devoirs.images) ; l'original reste dans `fichier`
+    fichier_web = models.FileField(upload_to='soumissions/web/', storage=stockage_fichiers, blank=True)
+    # Fichier encore dans le dossier des dépôts : déplacé dans le stockage final par le worker (devoirs.depots)
+    depot_en_attente = models.BooleanField(default=False)
+    # Échecs du worker sur ce dépôt : nouvelle tentative à depot_prochaine_tentative, abandon après DEPOTS_MAX_TENTATIVES
+    depot_tentatives = models.PositiveIntegerField(default=0)
+    depot_prochaine_tentative = models.DateTimeField(null=True, blank=True)
+    depot_derniere_erreur = models.TextField(blank=True)
+
+    @property
+    def fichier_affiche(self):
+        """Fichier servi par défaut : la variante web quand elle existe"""
+        return self.fichier_web or self.fichier
 
     @property
     def statut(self):
-        if self.date_soumission > self.devoir.deadline:
+        if self.en_retard:
             return "En retard"
         return "Soumis"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.en_retard = (self.date_soumission or timezone.now()) > self.devoir.deadline
+        super().save(*args, **kwargs)
+
     class Meta:
-        unique_together = ('devoir', 'etudiant')
\ No newline at end of file
+        unique_together = ('devoir', 'etudiant')
+        indexes = [
+            models.Index(fields=['en_retard', 'date_soumission'], name='soumission_retard_idx'),
+            models.Index(fields=['depot_en_attente', 'id'], name='soumission_depot_idx'),
+        ]
+
+
+class ConversionImage(models.Model):
+    """File des photos soumises à convertir en variante web, vidée par la commande convertir_images"""
+    STATUT_CHOICES = (
+        ('en_attente', 'En attente'),
+        ('pret', 'Prête'),
+        ('echec', 'Échec'),
+    )
+
+    soumission = models.OneToOneField(Soumission, on_delete=models.CASCADE, related_name='conversion_image')
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    tentatives = models.PositiveIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(blank=True)
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative'], name='conversion_a_traiter'),
+        ]
+
+
+class EnvoiFractionne(models.Model):
+    """
+    Envoi d'un fichier en plusieurs blocs, reprenable : soumission d'un devoir
+    (créée au dernier bloc) ou PDF de cours sans devoir (joint au cours par
+    le formulaire une fois l'envoi terminé).
+    """
+    token = models.CharField(max_length=64, unique=True)
+    devoir = models.ForeignKey(Devoir, on_delete=models.CASCADE, related_name='envois_fractionnes', null=True, blank=True)
+    utilisateur = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='envois_fractionnes')
+    # Champ fichier dont les limites s'appliquent (LIMITES_ENVOI)
+    champ = models.CharField(max_length=50, default='fichier')
+    nom_fichier = models.CharField(max_length=255)
+    taille = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    recu = models.BigIntegerField(default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('devoir', 'utilisateur')
+        indexes = [
+            models.Index(fields=['date_mise_a_jour'], name='envoi_mise_a_jour_idx'),
+        ]
+
+    @property
+    def termine(self):
+        return self.recu >= self.taille
@@ -0,0 +1,29 @@
+from django.db import transaction
+from .models import Soumission
+
+
+def mettre_a_jour_retards(devoir):
+    """
+    Recalcule le retard des soumissions d'un devoir après un changement de deadline.
+
+    Deux UPDATE en masse ne touchent que les soumissions dont le statut change ;
+    les compteurs du dashboard admin sont ajustés du même écart. Les dépôts
+    en attente sont laissés au worker, qui calcule leur retard (devoirs.depots).
+    Retourne le nombre de soumissions modifiées.
+    """
+    from comptes.caches import invalider_modele
+    from comptes.statistiques import incrementer
+
+    with transaction.atomic():
+        passees_en_retard = Soumission.objects.filter(
+            devoir=devoir, depot_en_attente=False, en_retard=False, date_soumission__gt=devoir.deadline,
+        ).update(en_retard=True)
+        passees_a_temps = Soumission.objects.filter(
+            devoir=devoir, depot_en_attente=False, en_retard=True, date_soumission__lte=devoir.deadline,
+        ).update(en_retard=False)
+        ecart = passees_en_retard - passees_a_temps
+        incrementer('soumissions_en_retard', ecart)
+        incrementer('soumissions_a_temps', -ecart)
+    if passees_en_retard or passees_a_temps:
+        invalider_modele('devoirs.Soumission')
+    return passees_en_retard + passees_a_temps
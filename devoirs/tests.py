@@ -1,3 +1,450 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from comptes.models import Utilisateur, Classe
+from comptes.statistiques import lire_statistiques, recalculer_statistiques
+from cours.models import Cours, Inscription
+from .depots import traiter_file as finaliser_depots
+from .envois import chemin_partiel
+from .services import mettre_a_jour_retards
+from .images import traiter_file as convertir_images
+from .models import ConversionImage, Devoir, EnvoiFractionne, Soumission
 
-# Create your tests here.
+
+class RetardSoumissionTests(TestCase):
+    """Tests du retard enregistré sur les soumissions"""
+
+    def setUp(self):
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.admin = Utilisateur.objects.create_user(username='admin', password='secret', role='admin')
+        self.cours = Cours.objects.create(titre='Maths', description='', enseignant=self.enseignant)
+        self.devoir = Devoir.objects.create(
+            cours=self.cours, titre='DM', description='', deadline=timezone.now() + timedelta(days=1)
+        )
+        self.etudiants = [
+            Utilisateur.objects.create_user(username=f'eleve{i}', role='etudiant') for i in range(3)
+        ]
+        for etudiant in self.etudiants:
+            Soumission.objects.create(devoir=self.devoir, etudiant=etudiant, fichier='soumissions/a.pdf')
+
+    def test_retard_fixe_a_la_soumission(self):
+        self.assertFalse(Soumission.objects.filter(en_retard=True).exists())
+        devoir_passe = Devoir.objects.create(
+            cours=self.cours, titre='Passé', description='', deadline=timezone.now() - timedelta(hours=1)
+        )
+        soumission = Soumission.objects.create(devoir=devoir_passe, etudiant=self.etudiants[0], fichier='soumissions/b.pdf')
+        self.assertTrue(soumission.en_retard)
+        self.assertEqual(soumission.statut, 'En retard')
+
+    def test_modification_deadline_enseignant(self):
+        self.client.force_login(self.enseignant)
+        deadline = timezone.localtime(timezone.now() - timedelta(days=2))
+        response = self.client.post(reverse('enseignants:modifier_devoir', args=[self.devoir.id]), {
+            'titre': 'DM', 'description': 'Sujet', 'cours': self.cours.id,
+            'deadline': deadline.strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertRedirects(response, reverse('enseignants:mes_devoirs'), fetch_redirect_response=False)
+        self.assertEqual(Soumission.objects.filter(en_retard=True).count(), 3)
+        self.assertEqual(lire_statistiques()['soumissions_en_retard'], 3)
+        self.assertEqual(recalculer_statistiques(), {})
+
+    def test_modification_deadline_admin(self):
+        Soumission.objects.update(en_retard=True)
+        recalculer_statistiques()
+        self.client.force_login(self.admin)
+        deadline = timezone.localtime(timezone.now() + timedelta(days=5))
+        self.client.post(reverse('admin_modifier_devoir', args=[self.devoir.id]), {
+            'titre': 'DM', 'cours': self.cours.id, 'deadline': deadline.strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertFalse(Soumission.objects.filter(en_retard=True).exists())
+        self.assertEqual(lire_statistiques()['soumissions_a_temps'], 3)
+        self.assertEqual(recalculer_statistiques(), {})
+
+
+class ArchiveSoumissionsTests(TestCase):
+    """Tests du téléchargement groupé des soumissions"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=self.media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+        self.enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.cours = Cours.objects.create(titre='Maths', description='', enseignant=self.enseignant)
+        self.devoir = Devoir.objects.create(
+            cours=self.cours, titre='DM 1', description='', deadline=timezone.now() + timedelta(days=1)
+        )
+        for i, nom in enumerate(['Durand', 'Martin']):
+            etudiant = Utilisateur.objects.create_user(username=f'eleve{i}', role='etudiant', last_name=nom, first_name='Léa')
+            soumission = Soumission(devoir=self.devoir, etudiant=etudiant)
+            soumission.fichier.save('copie.pdf', ContentFile(b'%PDF-' + bytes([i]) * 3000), save=False)
+            soumission.save()
+
+    def test_archive_nommee_par_etudiant(self):
+        self.client.force_login(self.enseignant)
+        response = self.client.get(reverse('enseignants:telecharger_soumissions', args=[self.devoir.id]))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['durand_lea_eleve0.pdf', 'martin_lea_eleve1.pdf'])
+            self.assertEqual(archive.read('martin_lea_eleve1.pdf'), b'%PDF-' + b'\x01' * 3000)
+
+    def test_fichier_manquant_et_acces(self):
+        Soumission.objects.get(etudiant__username='eleve0').fichier.delete(save=False)
+        admin = Utilisateur.objects.create_user(username='admin', password='secret', role='admin')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin_telecharger_soumissions', args=[self.devoir.id]))
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.read('FICHIERS_MANQUANTS.txt'), b'durand_lea_eleve0.pdf\n')
+
+        autre = Utilisateur.objects.create_user(username='prof2', password='secret', role='enseignant')
+        self.client.force_login(autre)
+        response = self.client.get(reverse('enseignants:telecharger_soumissions', args=[self.devoir.id]))
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(ENVOI_TAILLE_BLOC=1000)
+class EnvoiFractionneTests(TestCase):
+    """Tests de l'envoi des soumissions par blocs"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=self.media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+        self.classe = classe = Classe.objects.create(nom='Terminale A')
+        self.enseignant = enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        cours = Cours.objects.create(titre='Maths', description='', enseignant=enseignant, classe=classe)
+        self.devoir = Devoir.objects.create(
+            cours=cours, titre='DM 1', description='', deadline=timezone.now() + timedelta(days=1)
+        )
+        self.etudiant = Utilisateur.objects.create_user(username='eleve', role='etudiant', classe=classe)
+        self.client.force_login(self.etudiant)
+        self.contenu = b'%PDF-' + bytes(range(256)) * 10
+
+    def demarrer(self, contenu=None):
+        contenu = self.contenu if contenu is None else contenu
+        response = self.client.post(
+            reverse('etudiants:demarrer_envoi_devoir', args=[self.devoir.id]),
+            {'nom': 'copie.pdf', 'taille': len(contenu), 'sha256': hashlib.sha256(contenu).hexdigest()},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def envoyer(self, token, debut, bloc):
+        return self.client.post(
+            reverse('etudiants:envoi_devoir', args=[self.devoir.id, token]),
+            bloc, content_type='application/octet-stream', HTTP_X_DEBUT=str(debut),
+        )
+
+    def test_soumission_creee_au_dernier_bloc(self):
+        etat = self.demarrer()
+        self.assertEqual((etat['recu'], etat['taille_bloc']), (0, 1000))
+        for debut in range(0, len(self.contenu), 1000):
+            self.assertFalse(Soumission.objects.exists())
+            response = self.envoyer(etat['token'], debut, self.contenu[debut:debut + 1000])
+            self.assertEqual(response.status_code, 200)
+
+        self.assertTrue(response.json()['termine'])
+        soumission = Soumission.objects.get(devoir=self.devoir, etudiant=self.etudiant)
+        self.assertFalse(soumission.en_retard)
+        with soumission.fichier.open('rb') as fichier:
+            self.assertEqual(fichier.read(), self.contenu)
+        self.assertFalse(EnvoiFractionne.objects.exists())
+
+    def test_reprise_apres_coupure(self):
+        etat = self.demarrer()
+        self.envoyer(etat['token'], 0, self.contenu[:1000])
+
+        # Le même fichier reprend la session ; un bloc déjà reçu est refusé avec la position attendue
+        reprise = self.demarrer()
+        self.assertEqual((reprise['token'], reprise['recu']), (etat['token'], 1000))
+        response = self.envoyer(etat['token'], 0, self.contenu[:1000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['recu'], 1000)
+
+        response = self.client.get(reverse('etudiants:envoi_devoir', args=[self.devoir.id, etat['token']]))
+        self.assertEqual(response.json()['recu'], 1000)
+
+    def test_empreinte_incorrecte(self):
+        etat = self.demarrer()
+        envoi = EnvoiFractionne.objects.get()
+        altere = self.contenu[:-1] + b'X'
+        for debut in range(0, len(altere), 1000):
+            response = self.envoyer(etat['token'], debut, altere[debut:debut + 1000])
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Soumission.objects.exists())
+        self.assertFalse(EnvoiFractionne.objects.exists())
+        self.assertFalse(os.path.exists(chemin_partiel(envoi)))
+
+    def test_refus_apres_deadline_et_bloc_trop_grand(self):
+        etat = self.demarrer()
+        response = self.envoyer(etat['token'], 0, self.contenu[:1001])
+        self.assertEqual(response.status_code, 413)
+
+        Devoir.objects.filter(id=self.devoir.id).update(deadline=timezone.now() - timedelta(minutes=1))
+        response = self.client.post(
+            reverse('etudiants:demarrer_envoi_devoir', args=[self.devoir.id]),
+            {'nom': 'copie.pdf', 'taille': 10, 'sha256': '0' * 64},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_deadline_passee_pendant_l_envoi(self):
+        etat = self.demarrer()
+        for debut in range(0, len(self.contenu) - 1000, 1000):
+            self.envoyer(etat['token'], debut, self.contenu[debut:debut + 1000])
+
+        Devoir.objects.filter(id=self.devoir.id).update(deadline=timezone.now() - timedelta(minutes=1))
+        debut = len(self.contenu) - len(self.contenu) % 1000
+        response = self.envoyer(etat['token'], debut, self.contenu[debut:])
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Soumission.objects.exists())
+        self.assertFalse(EnvoiFractionne.objects.exists())
+
+    def test_pdf_de_cours_joint_par_le_formulaire(self):
+        self.enseignant.classes_enseignees.add(self.classe)
+        self.client.force_login(self.enseignant)
+        response = self.client.post(
+            reverse('enseignants:demarrer_envoi_cours'),
+            {'nom': 'chapitre.pdf', 'taille': len(self.contenu), 'sha256': hashlib.sha256(self.contenu).hexdigest()},
+            content_type='application/json',
+        )
+        token = response.json()['token']
+        for debut in range(0, len(self.contenu), 1000):
+            response = self.client.post(
+                reverse('enseignants:envoi_cours', args=[token]),
+                self.contenu[debut:debut + 1000], content_type='application/octet-stream', HTTP_X_DEBUT=str(debut),
+            )
+        self.assertEqual(response.json(), {'termine': True, 'token': token})
+
+        # Le formulaire poste le token à la place du fichier
+        formulaire = {'titre': 'Physique', 'description': 'Optique', 'classe': self.classe.id}
+        response = self.client.post(reverse('enseignants:ajouter_cours'), {**formulaire, 'envoi': 'inconnu'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Cours.objects.filter(titre='Physique').exists())
+
+        response = self.client.post(reverse('enseignants:ajouter_cours'), {**formulaire, 'envoi': token})
+        self.assertRedirects(response, reverse('enseignants:mes_cours'), fetch_redirect_response=False)
+        cours = Cours.objects.get(titre='Physique')
+        self.assertTrue(cours.fichier_pdf.name.startswith('cours/pdf/chapitre'))
+        with cours.fichier_pdf.open('rb') as fichier:
+            self.assertEqual(fichier.read(), self.contenu)
+        self.assertFalse(EnvoiFractionne.objects.exists())
+
+    def test_pdf_de_cours_type_refuse(self):
+        self.client.force_login(self.enseignant)
+        contenu = b'PK\x03\x04' + bytes(100)
+        response = self.client.post(
+            reverse('enseignants:demarrer_envoi_cours'),
+            {'nom': 'chapitre.pdf', 'taille': len(contenu), 'sha256': hashlib.sha256(contenu).hexdigest()},
+            content_type='application/json',
+        )
+        response = self.client.post(
+            reverse('enseignants:envoi_cours', args=[response.json()['token']]),
+            contenu, content_type='application/octet-stream', HTTP_X_DEBUT='0',
+        )
+        self.assertEqual(response.status_code, 415)
+
+
+# Début d'une photo HEIC (boîte ftyp de marque heic)
+PHOTO_HEIC = b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00mif1heic' + b'\x00' * 64
+
+
+class ConversionImageTests(TestCase):
+    """Tests de la variante web des photos soumises"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=self.media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+        enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        cours = Cours.objects.create(titre='Maths', description='', enseignant=enseignant)
+        self.devoir = Devoir.objects.create(
+            cours=cours, titre='DM 1', description='', deadline=timezone.now() + timedelta(days=1)
+        )
+        self.etudiant = Utilisateur.objects.create_user(username='eleve', role='etudiant')
+
+    def soumettre(self, nom, etudiant=None, contenu=PHOTO_HEIC):
+        soumission = Soumission(devoir=self.devoir, etudiant=etudiant or self.etudiant)
+        soumission.fichier.save(nom, ContentFile(contenu), save=False)
+        soumission.save()
+        return soumission
+
+    def faux_convertisseur(self):
+        # Écrit « WEBP » dans le fichier de sortie, dernier argument de la commande ImageMagick
+        script = os.path.join(self.media, 'magick')
+        with open(script, 'w') as fichier:
+            fichier.write(
+                '#!/bin/sh\necho "$@" > "$(dirname "$0")/arguments"\n'
+                'for a; do dernier=$a; done\nprintf WEBP > "${dernier#webp:}"\n'
+            )
+        os.chmod(script, 0o755)
+        return script
+
+    def test_photo_convertie_et_servie_par_defaut(self):
+        self.soumettre('copie.pdf', Utilisateur.objects.create_user(username='autre', role='etudiant'))
+        soumission = self.soumettre('alassane.heic')
+        self.assertEqual(ConversionImage.objects.get().soumission, soumission)
+
+        with self.settings(IMAGE_MAGICK=self.faux_convertisseur()):
+            self.assertEqual(convertir_images(), (1, 0))
+        soumission.refresh_from_db()
+        self.assertEqual(soumission.fichier.name, 'soumissions/alassane.heic')
+        self.assertEqual(soumission.fichier_web.name, 'soumissions/web/alassane.webp')
+        self.assertEqual(soumission.fichier_affiche, soumission.fichier_web)
+        # Codeur imposé d'après les premiers octets
+        with open(os.path.join(self.media, 'arguments')) as arguments:
+            self.assertIn(f'heic:{soumission.fichier.path}[0]', arguments.read())
+
+        self.client.force_login(self.etudiant)
+        response = self.client.get(reverse('fichier_protege', args=[soumission.fichier_web.name]))
+        self.assertEqual(b''.join(response.streaming_content), b'WEBP')
+
+    def test_extension_seule_ignoree(self):
+        # Texte MVG/SVG sous une extension de photo : jamais lu par ImageMagick
+        self.soumettre('photo.jpg', contenu=b'<svg xmlns="http://www.w3.org/2000/svg"></svg>')
+        self.assertFalse(ConversionImage.objects.exists())
+
+    def test_echec_garde_l_original(self):
+        soumission = self.soumettre('photo.jpg')
+        with self.settings(IMAGE_MAGICK='magick-absent', IMAGE_MAX_TENTATIVES=1), \
+                mock.patch('devoirs.images.shutil.which', return_value=None), \
+                self.assertLogs('comptes.files_attente', 'ERROR'):
+            self.assertEqual(convertir_images(), (0, 1))
+        self.assertEqual(ConversionImage.objects.get().statut, 'echec')
+        soumission.refresh_from_db()
+        self.assertEqual(soumission.fichier_affiche, soumission.fichier)
+
+
+class DepotSoumissionTests(TestCase):
+    """Tests du chemin rapide de soumission et du worker qui range les fichiers"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=self.media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+        classe = Classe.objects.create(nom='Terminale A')
+        enseignant = Utilisateur.objects.create_user(username='prof', password='secret', role='enseignant')
+        self.cours = Cours.objects.create(titre='Maths', description='', enseignant=enseignant, classe=classe)
+        self.devoir = Devoir.objects.create(
+            cours=self.cours, titre='DM 1', description='', deadline=timezone.now() + timedelta(days=1)
+        )
+        self.etudiant = Utilisateur.objects.create_user(username='eleve', role='etudiant', classe=classe)
+        self.client.force_login(self.etudiant)
+        recalculer_statistiques()
+
+    def soumettre(self, contenu=b'%PDF-copie'):
+        return self.client.post(
+            reverse('etudiants:soumettre_devoir', args=[self.devoir.id]),
+            {'fichier': SimpleUploadedFile('copie.pdf', contenu, content_type='application/pdf')},
+        )
+
+    def test_depot_puis_finalisation(self):
+        Inscription.objects.all().delete()
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.soumettre()
+        self.assertRedirects(response, reverse('etudiants:mes_devoirs'), fetch_redirect_response=False)
+        # Ni inscription ni recherche de soumission existante : un seul INSERT
+        sql = [requete['sql'] for requete in requetes.captured_queries]
+        self.assertEqual(sum(1 for ligne in sql if ligne.startswith('INSERT INTO "devoirs_soumission"')), 1)
+        self.assertFalse([ligne for ligne in sql if 'devoirs_soumission' in ligne and not ligne.startswith('INSERT')])
+        self.assertFalse([ligne for ligne in sql if 'cours_inscription' in ligne])
+
+        soumission = Soumission.objects.get()
+        self.assertTrue(soumission.depot_en_attente)
+        self.assertTrue(soumission.fichier.name.startswith('depots/'))
+        depot = soumission.fichier.path
+        # Servie dès le dépôt ; comptée quand elle est rangée
+        response = self.client.get(reverse('fichier_protege', args=[soumission.fichier.name]))
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-copie')
+        self.assertEqual(lire_statistiques()['total_soumissions'], 0)
+
+        response = self.soumettre(b'%PDF-autre')
+        self.assertRedirects(response, reverse('etudiants:mes_devoirs'), fetch_redirect_response=False)
+        self.assertEqual(Soumission.objects.count(), 1)
+        self.assertEqual(len(os.listdir(os.path.dirname(depot))), 1)
+
+        self.assertEqual(finaliser_depots(), (1, 0))
+        self.assertEqual(finaliser_depots(), (0, 0))
+        soumission.refresh_from_db()
+        self.assertFalse(soumission.depot_en_attente)
+        self.assertEqual(soumission.fichier.name, 'soumissions/copie.pdf')
+        with soumission.fichier.open('rb') as fichier:
+            self.assertEqual(fichier.read(), b'%PDF-copie')
+        self.assertFalse(os.path.exists(depot))
+        self.assertTrue(Inscription.objects.filter(cours=self.cours, etudiant=self.etudiant).exists())
+        self.assertEqual(lire_statistiques()['total_soumissions'], 1)
+        self.etudiant.refresh_from_db()
+        self.assertEqual(self.etudiant.espace_utilise, len(b'%PDF-copie'))
+        self.assertEqual(recalculer_statistiques(), {})
+
+    def test_deadline_modifiee_pendant_l_attente(self):
+        self.soumettre()
+        Devoir.objects.filter(id=self.devoir.id).update(deadline=timezone.now() - timedelta(days=1))
+        self.devoir.refresh_from_db()
+        self.assertEqual(mettre_a_jour_retards(self.devoir), 0)
+
+        self.assertEqual(finaliser_depots(), (1, 0))
+        self.assertTrue(Soumission.objects.get().en_retard)
+        self.assertEqual(lire_statistiques()['soumissions_en_retard'], 1)
+        self.assertEqual(recalculer_statistiques(), {})
+
+    def test_echec_enregistre_et_fichier_range_retire(self):
+        self.soumettre()
+        with mock.patch('devoirs.depots.etudiant_a_acces', side_effect=RuntimeError('base indisponible')), \
+                self.assertLogs('comptes.files_attente', 'ERROR'):
+            self.assertEqual(finaliser_depots(), (0, 1))
+        soumission = Soumission.objects.get()
+        self.assertTrue(soumission.depot_en_attente)
+        self.assertEqual((soumission.depot_tentatives, soumission.depot_derniere_erreur), (1, 'base indisponible'))
+        # Ni lien ni contenu laissés par la transaction annulée
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'soumissions', 'copie.pdf')))
+        self.assertEqual([fichiers for _, _, fichiers in os.walk(os.path.join(self.media, 'contenus')) if fichiers], [])
+
+        # Retenté après le délai seulement
+        self.assertEqual(finaliser_depots(), (0, 0))
+        Soumission.objects.update(depot_prochaine_tentative=timezone.now())
+        self.assertEqual(finaliser_depots(), (1, 0))
+        self.assertEqual(Soumission.objects.get().fichier.name, 'soumissions/copie.pdf')
+
+    def test_suppression_avant_finalisation(self):
+        self.soumettre()
+        Soumission.objects.get().delete()
+        self.assertEqual(finaliser_depots(), (0, 0))
+        self.assertEqual(lire_statistiques()['total_soumissions'], 0)
+        self.assertEqual(recalculer_statistiques(), {})
+        self.etudiant.refresh_from_db()
+        self.assertEqual(self.etudiant.espace_utilise, 0)
+
+    @override_settings(DEPOTS_DIFFERES=False)
+    def test_soumission_immediate(self):
+        self.soumettre()
+        soumission = Soumission.objects.get()
+        self.assertFalse(soumission.depot_en_attente)
+        self.assertEqual(soumission.fichier.name, 'soumissions/copie.pdf')
+        self.assertEqual(lire_statistiques()['total_soumissions'], 1)
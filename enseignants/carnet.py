@@ -0,0 +1,116 @@
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from comptes.agregats import planifier_recalcul
+from comptes.caches import invalider_modele
+from comptes.models import Note
+from devoirs.models import Devoir
+
+NOTE_MAX = Decimal('20')
+TAILLE_LOT_NOTES = 500
+
+
+def nom_cellule(etudiant_id, devoir_id):
+    return f'note_{etudiant_id}_{devoir_id}'
+
+
+class CarnetNotes:
+    """
+    Grille étudiants × devoirs d'une classe pour un enseignant.
+
+    Se charge en trois requêtes (étudiants, devoirs, notes) quelle que soit la
+    taille de la classe. Lorsqu'un étudiant a plusieurs notes pour un même
+    devoir, la grille affiche et modifie la plus récente.
+    """
+
+    def __init__(self, classe, enseignant):
+        self.classe = classe
+        self.enseignant = enseignant
+        self.etudiants = list(classe.utilisateur_set.filter(role='etudiant').order_by('username'))
+        self.devoirs = list(
+            Devoir.objects.filter(cours__classe=classe, cours__enseignant=enseignant)
+            .select_related('cours')
+            .order_by('deadline', 'id')
+        )
+        etudiants = {etudiant.id: etudiant for etudiant in self.etudiants}
+        self.notes = {}
+        notes = Note.objects.filter(
+            etudiant__in=self.etudiants, devoir__in=self.devoirs, enseignant=enseignant,
+        ).order_by('date_attribution', 'id')
+        for note in notes:
+            note.etudiant = etudiants[note.etudiant_id]
+            self.notes[(note.etudiant_id, note.devoir_id)] = note
+        self.erreurs = {}
+        self.saisies = {}
+
+    def lignes(self):
+        """Lignes de la grille prêtes pour le template"""
+        lignes = []
+        for etudiant in self.etudiants:
+            cellules = []
+            for devoir in self.devoirs:
+                nom = nom_cellule(etudiant.id, devoir.id)
+                note = self.notes.get((etudiant.id, devoir.id))
+                if nom in self.saisies:
+                    valeur = self.saisies[nom]
+                else:
+                    valeur = note.note if note else ''
+                cellules.append({'nom': nom, 'valeur': valeur, 'erreur': self.erreurs.get(nom)})
+            lignes.append({'etudiant': etudiant, 'cellules': cellules})
+        return lignes
+
+    def _lire_note(self, nom, saisie):
+        try:
+            valeur = Decimal(saisie.replace(',', '.'))
+        except InvalidOperation:
+            self.erreurs[nom] = 'Note invalide.'
+            return None
+        if not valeur.is_finite() or valeur < 0 or valeur > NOTE_MAX:
+            self.erreurs[nom] = 'La note doit être comprise entre 0 et 20.'
+            return None
+        if valeur != valeur.quantize(Decimal('0.01')):
+            self.erreurs[nom] = 'Deux décimales au maximum.'
+            return None
+        return valeur
+
+    def enregistrer(self, donnees):
+        """
+        Valide toutes les cellules envoyées puis enregistre celles qui ont changé
+        dans une seule transaction (bulk_create, bulk_update et suppression des
+        cellules vidées). Rien n'est enregistré si une cellule est invalide.
+        Retourne le nombre de notes créées, modifiées et supprimées.
+        """
+        a_creer, a_modifier, a_supprimer = [], [], []
+        for etudiant in self.etudiants:
+            for devoir in self.devoirs:
+                nom = nom_cellule(etudiant.id, devoir.id)
+                if nom not in donnees:
+                    continue
+                saisie = donnees[nom].strip()
+                self.saisies[nom] = saisie
+                note = self.notes.get((etudiant.id, devoir.id))
+                if not saisie:
+                    if note:
+                        a_supprimer.append(note)
+                    continue
+                valeur = self._lire_note(nom, saisie)
+                if valeur is None:
+                    continue
+                if note is None:
+                    a_creer.append(Note(etudiant=etudiant, devoir=devoir, enseignant=self.enseignant, note=valeur))
+                elif note.note != valeur:
+                    note.note = valeur
+                    a_modifier.append(note)
+
+        if self.erreurs:
+            return None
+
+        with transaction.atomic():
+            Note.objects.bulk_create(a_creer, batch_size=TAILLE_LOT_NOTES)
+            Note.objects.bulk_update(a_modifier, ['note'], batch_size=TAILLE_LOT_NOTES)
+            # Les suppressions passent par les signaux de Note, pas les écritures en masse
+            planifier_recalcul(a_creer + a_modifier)
+            if a_supprimer:
+                Note.objects.filter(id__in=[note.id for note in a_supprimer]).delete()
+        if a_creer or a_modifier or a_supprimer:
+            invalider_modele('comptes.Note')
+        return len(a_creer), len(a_modifier), len(a_supprimer)
@@ -3,15 +3,19 @@ from .views import (
     enseignant_login,
     dashboard_enseignant,
     ajouter_cours,
+    demarrer_envoi_cours,
+    envoi_cours,
     ajouter_devoir,
     supprimer_cours,
     supprimer_devoir,
+    telecharger_soumissions,
     modifier_cours,
     modifier_devoir,
     mes_classes,
     detail_classe,
     detail_cours,
     etudiants_classe,
+    carnet_notes,
     ajouter_note,
     modifier_note,
     supprimer_note,
@@ -25,6 +29,7 @@ urlpatterns = [
     path('mes-classes/', mes_classes, name='mes_classes'),
     path('classe/<int:classe_id>/', detail_classe, name='detail_classe'),
     path('classe/<int:classe_id>/etudiants/', etudiants_classe, name='etudiants_classe'),
+    path('classe/<int:classe_id>/carnet-de-notes/', carnet_notes, name='carnet_notes'),
     path('classe/<int:classe_id>/ajouter-note/', ajouter_note, name='ajouter_note'),
     path('classe/<int:classe_id>/ajouter-note/<int:etudiant_id>/', ajouter_note, name='ajouter_note_etudiant'),
     path('modifier-note/<int:note_id>/', modifier_note, name='modifier_note'),
@@ -32,11 +37,14 @@ urlpatterns = [
     path('cours/', mes_cours, name='mes_cours'),
     path('cours/<int:cours_id>/', detail_cours, name='detail_cours'),
     path('cours/ajouter/', ajouter_cours, name='ajouter_cours'),
+    path('cours/envoi/', demarrer_envoi_cours, name='demarrer_envoi_cours'),
+    path('cours/envoi/<str:token>/', envoi_cours, name='envoi_cours'),
     path('cours/<int:cours_id>/modifier/', modifier_cours, name='modifier_cours'),
     path('cours/<int:cours_id>/supprimer/', supprimer_cours, name='supprimer_cours'),
     path('devoirs/', mes_devoirs, name='mes_devoirs'),
     path('devoirs/ajouter/', ajouter_devoir, name='ajouter_devoir'),
     path('devoirs/<int:devoir_id>/modifier/', modifier_devoir, name='modifier_devoir'),
     path('devoirs/<int:devoir_id>/supprimer/', supprimer_devoir, name='supprimer_devoir'),
+    path('devoirs/<int:devoir_id>/soumissions.zip', telecharger_soumissions, name='telecharger_soumissions'),
 ]
 
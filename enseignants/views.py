@@ -1,13 +1,26 @@
+import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login
 from django.contrib import messages
 from django.utils import timezone
-from django.http import HttpResponseForbidden
-from django.db.models import Avg, Count
+from django.http import HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from django.db.models import Count, Q
 from cours.models import Cours, Inscription
-from devoirs.models import Devoir, Soumission
+from cours.services import inscrire_classe_au_cours
+from devoirs.envois import ErreurEnvoi, demarrer_envoi, envoi_termine, etat_envoi, joindre_envoi, recevoir_bloc
+from devoirs.models import Devoir, Soumission, EnvoiFractionne
+from devoirs.archives import flux_archive_soumissions, nom_archive_soumissions
+from devoirs.services import mettre_a_jour_retards
+from comptes.acces import contexte_acces
+from comptes.caches import fragment_en_cache
 from comptes.models import Utilisateur, Classe, Note
+from comptes.replicas import lecture_sur_replica
+from comptes.agregats import cle_classe, cle_etudiant_enseignant, lire_agregats
+from comptes.apercus import apercus_par_nom
+from comptes.televersements import verifier_envoi
+from .carnet import CarnetNotes
 from .forms import CoursForm, DevoirForm, NoteForm
 
 
@@ -51,6 +64,7 @@ def enseignant_login(request):
 
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@lecture_sur_replica
 def dashboard_enseignant(request):
     """Dashboard de l'enseignant"""
     enseignant = request.user
@@ -73,8 +87,8 @@ def dashboard_enseignant(request):
     total_soumissions = Soumission.objects.filter(devoir__cours__enseignant=enseignant).count()
     total_classes = enseignant.classes_enseignees.count()
     
-    # Devoirs de l'enseignant
-    devoirs = Devoir.objects.filter(cours__enseignant=enseignant).order_by('-deadline')
+    # Devoirs de l'enseignant (avec leur cours, affiché pour chaque devoir)
+    devoirs = Devoir.objects.filter(cours__enseignant=enseignant).select_related('cours').order_by('-deadline')
     
     # Devoirs en retard
     now = timezone.now()
@@ -99,6 +113,7 @@ def dashboard_enseignant(request):
 
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@verifier_envoi
 def ajouter_cours(request):
     """Ajouter un cours"""
     enseignant = request.user
@@ -110,24 +125,24 @@ def ajouter_cours(request):
             cours.enseignant = enseignant
             
             # Vérifier que l'enseignant est assigné à la classe sélectionnée
-            if enseignant not in cours.classe.enseignants.all():
+            if not contexte_acces(enseignant).enseigne(cours.classe):
                 messages.error(request, "Vous n'êtes pas assigné à cette classe.")
                 form.fields['classe'].queryset = enseignant.classes_enseignees.all()
                 return render(request, 'enseignant/ajouter_cours.html', {'form': form})
             
+            envoi, refus = _pdf_envoye(request)
+            if refus:
+                messages.error(request, refus)
+                form.fields['classe'].queryset = enseignant.classes_enseignees.all()
+                return render(request, 'enseignant/ajouter_cours.html', {'form': form})
+            if envoi is not None:
+                joindre_envoi(envoi, cours.fichier_pdf)
+            
             cours.save()
             
-            # Inscrire automatiquement tous les étudiants de la classe
+            # Les étudiants de la classe sont inscrits en masse par le signal post_save du cours
             if cours.classe:
-                etudiants_classe = cours.classe.utilisateur_set.filter(role='etudiant')
-                nb_inscrits = 0
-                for etudiant in etudiants_classe:
-                    inscription, created = Inscription.objects.get_or_create(
-                        cours=cours,
-                        etudiant=etudiant
-                    )
-                    if created:
-                        nb_inscrits += 1
+                nb_inscrits = Inscription.objects.filter(cours=cours).count()
                 
                 if nb_inscrits > 0:
                     messages.success(request, f'Cours "{cours.titre}" ajouté avec succès! {nb_inscrits} étudiant(s) de la classe "{cours.classe.nom}" inscrit(s) automatiquement.')
@@ -136,7 +151,7 @@ def ajouter_cours(request):
             else:
                 messages.success(request, f'Cours "{cours.titre}" ajouté avec succès!')
             
-                return redirect('enseignants:mes_cours')
+            return redirect('enseignants:mes_cours')
     else:
         form = CoursForm()
         # Filtrer les classes pour n'afficher que celles où l'enseignant est assigné
@@ -145,8 +160,72 @@ def ajouter_cours(request):
     return render(request, 'enseignant/ajouter_cours.html', {'form': form})
 
 
+def _pdf_envoye(request):
+    """
+    PDF du cours envoyé par blocs avant le formulaire (envoi_fractionne.js
+    poste alors le token de l'envoi à la place du fichier).
+    Retourne l'envoi terminé (ou None) et le motif d'un refus éventuel.
+    """
+    token = request.POST.get('envoi')
+    if not token:
+        return None, None
+    envoi = envoi_termine(request.user, token, 'fichier_pdf')
+    if envoi is None:
+        return None, "L'envoi du fichier PDF n'a pas abouti, sélectionnez-le de nouveau."
+    return envoi, None
+
+
+@login_required
+@user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@require_POST
+def demarrer_envoi_cours(request):
+    """Ouvrir (ou reprendre) l'envoi par blocs du PDF d'un cours"""
+    try:
+        donnees = json.loads(request.body)
+        nom_fichier, taille, sha256 = str(donnees['nom']), int(donnees['taille']), str(donnees['sha256'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'erreur': 'Requête invalide.'}, status=400)
+    
+    try:
+        envoi = demarrer_envoi(None, request.user, nom_fichier, taille, sha256, champ='fichier_pdf')
+    except ErreurEnvoi as erreur:
+        return JsonResponse(erreur.donnees(), status=erreur.statut)
+    return JsonResponse(etat_envoi(envoi))
+
+
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+def envoi_cours(request, token):
+    """
+    GET : état de l'envoi (octets déjà reçus) pour le reprendre.
+    POST : un bloc brut (application/octet-stream) commençant à l'octet X-Debut.
+    Le dernier bloc renvoie le token, que le formulaire du cours poste ensuite.
+    """
+    envoi = get_object_or_404(EnvoiFractionne, token=token, devoir=None, utilisateur=request.user)
+    if request.method == 'GET':
+        return JsonResponse(etat_envoi(envoi))
+    if request.method != 'POST':
+        return JsonResponse({'erreur': 'Méthode non autorisée.'}, status=405)
+    
+    try:
+        debut = int(request.headers['X-Debut'])
+        longueur = int(request.META.get('CONTENT_LENGTH') or 0)
+    except (KeyError, ValueError):
+        return JsonResponse({'erreur': 'Requête invalide.'}, status=400)
+    
+    try:
+        envoi, _ = recevoir_bloc(envoi, debut, request, longueur, request.headers.get('X-Bloc-Sha256'))
+    except ErreurEnvoi as erreur:
+        return JsonResponse(erreur.donnees(), status=erreur.statut)
+    
+    if not envoi.termine:
+        return JsonResponse(etat_envoi(envoi))
+    return JsonResponse({'termine': True, 'token': envoi.token})
+
+
+@login_required
+@user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@verifier_envoi
 def ajouter_devoir(request):
     """Ajouter un devoir"""
     enseignant = request.user
@@ -215,11 +294,27 @@ def supprimer_devoir(request, devoir_id):
     devoir.delete()
     messages.success(request, f'Devoir "{titre}" supprimé avec succès!')
     
-    return redirect('mes_devoirs')
+    return redirect('enseignants:mes_devoirs')
+
+
+@login_required
+@user_passes_test(is_enseignant, login_url='/enseignant/login/')
+def telecharger_soumissions(request, devoir_id):
+    """Télécharger toutes les soumissions d'un devoir dans une archive zip"""
+    enseignant = request.user
+    devoir = get_object_or_404(Devoir.objects.select_related('cours'), id=devoir_id)
+    
+    if devoir.cours.enseignant_id != enseignant.id:
+        return HttpResponseForbidden("Action non autorisée")
+    
+    response = StreamingHttpResponse(flux_archive_soumissions(devoir), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{nom_archive_soumissions(devoir)}"'
+    return response
 
 
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@verifier_envoi
 def modifier_cours(request, cours_id):
     """Modifier un cours"""
     enseignant = request.user
@@ -230,7 +325,7 @@ def modifier_cours(request, cours_id):
         if form.is_valid():
             # Vérifier que l'enseignant est assigné à la classe sélectionnée
             nouvelle_classe = form.cleaned_data['classe']
-            if enseignant not in nouvelle_classe.enseignants.all():
+            if not contexte_acces(enseignant).enseigne(nouvelle_classe):
                 messages.error(request, "Vous n'êtes pas assigné à cette classe.")
                 form.fields['classe'].queryset = enseignant.classes_enseignees.all()
                 return render(request, 'enseignant/modifier_cours.html', {
@@ -238,8 +333,19 @@ def modifier_cours(request, cours_id):
                     'cours': cours
                 })
             
+            envoi, refus = _pdf_envoye(request)
+            if refus:
+                messages.error(request, refus)
+                form.fields['classe'].queryset = enseignant.classes_enseignees.all()
+                return render(request, 'enseignant/modifier_cours.html', {
+                    'form': form,
+                    'cours': cours
+                })
+            
             # Sauvegarder l'ancienne classe pour gérer les inscriptions
             ancienne_classe = cours.classe
+            if envoi is not None:
+                joindre_envoi(envoi, form.instance.fichier_pdf)
             form.save()
             
             # Si la classe a changé, mettre à jour les inscriptions
@@ -251,15 +357,7 @@ def modifier_cours(request, cours_id):
                 
                 # Inscrire les étudiants de la nouvelle classe
                 if nouvelle_classe:
-                    etudiants_nouvelle_classe = nouvelle_classe.utilisateur_set.filter(role='etudiant')
-                    nb_inscrits = 0
-                    for etudiant in etudiants_nouvelle_classe:
-                        inscription, created = Inscription.objects.get_or_create(
-                            cours=cours,
-                            etudiant=etudiant
-                        )
-                        if created:
-                            nb_inscrits += 1
+                    nb_inscrits = inscrire_classe_au_cours(cours)
                     
                     if nb_inscrits > 0:
                         messages.success(request, f'Cours "{cours.titre}" modifié avec succès! {nb_inscrits} étudiant(s) de la classe "{nouvelle_classe.nom}" inscrit(s) automatiquement.')
@@ -270,15 +368,7 @@ def modifier_cours(request, cours_id):
             else:
                 # Si la classe n'a pas changé, s'assurer que tous les étudiants de la classe sont inscrits
                 if nouvelle_classe:
-                    etudiants_classe = nouvelle_classe.utilisateur_set.filter(role='etudiant')
-                    nb_inscrits = 0
-                    for etudiant in etudiants_classe:
-                        inscription, created = Inscription.objects.get_or_create(
-                            cours=cours,
-                            etudiant=etudiant
-                        )
-                        if created:
-                            nb_inscrits += 1
+                    nb_inscrits = inscrire_classe_au_cours(cours)
                     
                     if nb_inscrits > 0:
                         messages.success(request, f'Cours "{cours.titre}" modifié avec succès! {nb_inscrits} étudiant(s) supplémentaire(s) inscrit(s).')
@@ -287,7 +377,7 @@ def modifier_cours(request, cours_id):
                 else:
                     messages.success(request, f'Cours "{cours.titre}" modifié avec succès!')
             
-                return redirect('enseignants:mes_cours')
+            return redirect('enseignants:mes_cours')
     else:
         form = CoursForm(instance=cours)
         # Filtrer les classes pour n'afficher que celles où l'enseignant est assigné
@@ -301,6 +391,7 @@ def modifier_cours(request, cours_id):
 
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@verifier_envoi
 def modifier_devoir(request, devoir_id):
     """Modifier un devoir"""
     enseignant = request.user
@@ -316,6 +407,8 @@ def modifier_devoir(request, devoir_id):
             if form.cleaned_data['cours'].enseignant != enseignant:
                 return HttpResponseForbidden("Action non autorisée")
             form.save()
+            if 'deadline' in form.changed_data:
+                mettre_a_jour_retards(devoir)
             messages.success(request, f'Devoir "{devoir.titre}" modifié avec succès!')
             return redirect('enseignants:mes_devoirs')
     else:
@@ -342,34 +435,26 @@ def modifier_devoir(request, devoir_id):
     })
 
 
+@fragment_en_cache('cartes_classes', ['comptes.Classe', 'cours.Cours'])
+def _cartes_classes(enseignant):
+    """Classes de l'enseignant avec leur nombre d'étudiants et de cours, en une requête"""
+    classes = enseignant.classes_enseignees.annotate(
+        nb_etudiants=Count('utilisateur', filter=Q(utilisateur__role='etudiant'), distinct=True),
+        nb_cours=Count('cours', filter=Q(cours__enseignant=enseignant), distinct=True),
+    ).order_by('nom')
+    return [
+        {'classe': classe, 'nb_etudiants': classe.nb_etudiants, 'nb_cours': classe.nb_cours}
+        for classe in classes
+    ]
+
+
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@lecture_sur_replica
 def mes_classes(request):
     """Afficher les classes de l'enseignant"""
     enseignant = request.user
-    
-    # Récupérer toutes les classes où l'enseignant est assigné
-    classes = enseignant.classes_enseignees.all().order_by('nom')
-    
-    # Pour chaque classe, récupérer le nombre d'étudiants et de cours
-    classes_avec_stats = []
-    for classe in classes:
-        # Récupérer les étudiants de cette classe
-        etudiants_classe = classe.utilisateur_set.filter(role='etudiant')
-        # Récupérer les cours de l'enseignant pour cette classe
-        # Utiliser try/except pour gérer le cas où le champ classe n'existe pas encore
-        try:
-            cours_classe = Cours.objects.filter(classe=classe, enseignant=enseignant)
-            nb_cours = cours_classe.count()
-        except Exception:
-            # Si le champ classe n'existe pas encore, retourner 0
-            nb_cours = 0
-        
-        classes_avec_stats.append({
-            'classe': classe,
-            'nb_etudiants': etudiants_classe.count(),
-            'nb_cours': nb_cours,
-        })
+    classes_avec_stats = _cartes_classes(enseignant)
     
     context = {
         'enseignant': enseignant,
@@ -388,30 +473,27 @@ def detail_classe(request, classe_id):
     
     # Vérifier que l'enseignant est assigné à cette classe
     classe = get_object_or_404(Classe, id=classe_id)
-    if enseignant not in classe.enseignants.all():
+    if not contexte_acces(enseignant).enseigne(classe):
         messages.error(request, "Vous n'êtes pas assigné à cette classe.")
         return redirect('enseignants:mes_classes')
     
     # Récupérer les étudiants de cette classe
     etudiants_classe = classe.utilisateur_set.filter(role='etudiant')
     
-    # Récupérer les cours de l'enseignant pour cette classe
-    # Utiliser try/except pour gérer le cas où le champ classe n'existe pas encore
-    try:
-        cours_classe = Cours.objects.filter(classe=classe, enseignant=enseignant).order_by('-created_at')
-    except Exception:
-        # Si le champ classe n'existe pas encore, retourner une liste vide
-        cours_classe = Cours.objects.none()
-    
-    # Pour chaque cours, compter les devoirs
-    cours_avec_stats = []
-    for cours in cours_classe:
-        devoirs_cours = Devoir.objects.filter(cours=cours)
-        cours_avec_stats.append({
-            'cours': cours,
-            'nb_devoirs': devoirs_cours.count(),
-            'nb_etudiants_inscrits': Inscription.objects.filter(cours=cours, etudiant__in=etudiants_classe).count(),
-        })
+    # Cours de l'enseignant pour cette classe, avec leurs devoirs et les inscrits de la classe comptés en une requête
+    cours_classe = Cours.objects.filter(classe=classe, enseignant=enseignant).annotate(
+        nb_devoirs=Count('devoir', distinct=True),
+        nb_etudiants_inscrits=Count(
+            'inscription',
+            filter=Q(inscription__etudiant__classe=classe, inscription__etudiant__role='etudiant'),
+            distinct=True,
+        ),
+    ).order_by('-created_at')
+    
+    cours_avec_stats = [
+        {'cours': cours, 'nb_devoirs': cours.nb_devoirs, 'nb_etudiants_inscrits': cours.nb_etudiants_inscrits}
+        for cours in cours_classe
+    ]
     
     context = {
         'classe': classe,
@@ -433,26 +515,29 @@ def detail_cours(request, cours_id):
     # Vérifier que le cours appartient à l'enseignant
     cours = get_object_or_404(Cours, id=cours_id, enseignant=enseignant)
     
-    # Récupérer les devoirs de ce cours
-    devoirs = Devoir.objects.filter(cours=cours).order_by('deadline')
+    # Récupérer les devoirs de ce cours avec leur nombre de soumissions
+    devoirs = list(Devoir.objects.filter(cours=cours).annotate(nb_soumissions=Count('soumission')).order_by('deadline'))
+    
+    # Aperçus déjà générés des PDF du cours et des devoirs, en une requête
+    apercus = apercus_par_nom([cours.fichier_pdf.name] + [devoir.fichier.name for devoir in devoirs])
     
-    # Pour chaque devoir, compter les soumissions
     now = timezone.now()
     devoirs_avec_stats = []
     for devoir in devoirs:
-        soumissions = Soumission.objects.filter(devoir=devoir)
         devoirs_avec_stats.append({
             'devoir': devoir,
-            'nb_soumissions': soumissions.count(),
+            'nb_soumissions': devoir.nb_soumissions,
             'est_en_retard': devoir.deadline < now,
+            'apercu': apercus.get(devoir.fichier.name),
         })
     
     # Récupérer les étudiants inscrits à ce cours
-    inscriptions = Inscription.objects.filter(cours=cours)
+    inscriptions = Inscription.objects.filter(cours=cours).select_related('etudiant')
     etudiants_inscrits = [inscription.etudiant for inscription in inscriptions]
     
     context = {
         'cours': cours,
+        'apercu_cours': apercus.get(cours.fichier_pdf.name),
         'enseignant': enseignant,
         'devoirs_avec_stats': devoirs_avec_stats,
         'total_devoirs': len(devoirs_avec_stats),
@@ -466,34 +551,21 @@ def detail_cours(request, cours_id):
 
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@lecture_sur_replica
 def mes_cours(request):
     """Afficher tous les cours de l'enseignant"""
     enseignant = request.user
     
-    # Récupérer tous les cours de l'enseignant
-    try:
-        cours = Cours.objects.filter(enseignant=enseignant).order_by('-created_at')
-    except Exception:
-        try:
-            cours = Cours.objects.filter(enseignant=enseignant).only('id', 'titre', 'description', 'enseignant_id', 'created_at').order_by('-created_at')
-        except Exception:
-            cours = Cours.objects.none()
+    # Récupérer tous les cours de l'enseignant avec leur classe et leurs statistiques, en une requête
+    cours = Cours.objects.filter(enseignant=enseignant).select_related('classe').annotate(
+        nb_inscriptions=Count('inscription', distinct=True),
+        nb_devoirs=Count('devoir', distinct=True),
+    ).order_by('-created_at')
     
-    # Pour chaque cours, récupérer les statistiques
-    cours_avec_stats = []
-    for c in cours:
-        try:
-            nb_inscriptions = Inscription.objects.filter(cours=c).count()
-            nb_devoirs = Devoir.objects.filter(cours=c).count()
-        except Exception:
-            nb_inscriptions = 0
-            nb_devoirs = 0
-        
-        cours_avec_stats.append({
-            'cours': c,
-            'nb_inscriptions': nb_inscriptions,
-            'nb_devoirs': nb_devoirs,
-        })
+    cours_avec_stats = [
+        {'cours': c, 'nb_inscriptions': c.nb_inscriptions, 'nb_devoirs': c.nb_devoirs}
+        for c in cours
+    ]
     
     context = {
         'enseignant': enseignant,
@@ -506,29 +578,21 @@ def mes_cours(request):
 
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@lecture_sur_replica
 def mes_devoirs(request):
     """Afficher tous les devoirs de l'enseignant"""
     enseignant = request.user
     
-    # Récupérer tous les devoirs de l'enseignant
-    devoirs = Devoir.objects.filter(cours__enseignant=enseignant).order_by('-created_at')
+    # Récupérer tous les devoirs de l'enseignant avec leur cours et leur nombre de soumissions
+    devoirs = Devoir.objects.filter(cours__enseignant=enseignant).select_related('cours').annotate(
+        nb_soumissions=Count('soumission')
+    ).order_by('-created_at')
     
-    # Pour chaque devoir, récupérer les statistiques
     now = timezone.now()
-    devoirs_avec_stats = []
-    for devoir in devoirs:
-        try:
-            nb_soumissions = Soumission.objects.filter(devoir=devoir).count()
-            est_en_retard = now > devoir.deadline
-        except Exception:
-            nb_soumissions = 0
-            est_en_retard = False
-        
-        devoirs_avec_stats.append({
-            'devoir': devoir,
-            'nb_soumissions': nb_soumissions,
-            'est_en_retard': est_en_retard,
-        })
+    devoirs_avec_stats = [
+        {'devoir': devoir, 'nb_soumissions': devoir.nb_soumissions, 'est_en_retard': now > devoir.deadline}
+        for devoir in devoirs
+    ]
     
     context = {
         'enseignant': enseignant,
@@ -542,29 +606,44 @@ def mes_devoirs(request):
 
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
+@lecture_sur_replica
 def etudiants_classe(request, classe_id):
     """Afficher les étudiants d'une classe avec leurs notes"""
     enseignant = request.user
     
     # Vérifier que l'enseignant est assigné à cette classe
     classe = get_object_or_404(Classe, id=classe_id)
-    if enseignant not in classe.enseignants.all():
+    if not contexte_acces(enseignant).enseigne(classe):
         messages.error(request, "Vous n'êtes pas assigné à cette classe.")
         return redirect('enseignants:mes_classes')
     
     # Récupérer les étudiants de cette classe
     etudiants = classe.utilisateur_set.filter(role='etudiant').order_by('username')
     
-    # Pour chaque étudiant, récupérer ses notes attribuées par cet enseignant
+    # Notes attribuées par cet enseignant, chargées en une requête puis regroupées par étudiant
+    notes_par_etudiant = {}
+    notes = (
+        Note.objects.filter(etudiant__in=etudiants, enseignant=enseignant)
+        .select_related('devoir__cours')
+        .order_by('-date_attribution')
+    )
+    for note in notes:
+        notes_par_etudiant.setdefault(note.etudiant_id, []).append(note)
+    
+    # Moyennes précalculées (comptes.agregats)
+    agregats = lire_agregats(
+        [cle_etudiant_enseignant(etudiant.id, enseignant.id) for etudiant in etudiants]
+        + [cle_classe(classe.id)]
+    )
+    
     etudiants_avec_notes = []
     for etudiant in etudiants:
-        notes_etudiant = Note.objects.filter(etudiant=etudiant, enseignant=enseignant).order_by('-date_attribution')
-        moyenne = notes_etudiant.aggregate(Avg('note'))['note__avg']
+        agregat = agregats[cle_etudiant_enseignant(etudiant.id, enseignant.id)]
         etudiants_avec_notes.append({
             'etudiant': etudiant,
-            'notes': notes_etudiant,
-            'nb_notes': notes_etudiant.count(),
-            'moyenne': round(moyenne, 2) if moyenne else None,
+            'notes': notes_par_etudiant.get(etudiant.id, []),
+            'nb_notes': agregat.nb_notes,
+            'moyenne': agregat.moyenne,
         })
     
     context = {
@@ -572,11 +651,48 @@ def etudiants_classe(request, classe_id):
         'enseignant': enseignant,
         'etudiants_avec_notes': etudiants_avec_notes,
         'total_etudiants': len(etudiants_avec_notes),
+        'moyenne_classe': agregats[cle_classe(classe.id)].moyenne,
     }
     
     return render(request, 'enseignant/etudiants_classe.html', context)
 
 
+@login_required
+@user_passes_test(is_enseignant, login_url='/enseignant/login/')
+def carnet_notes(request, classe_id):
+    """Saisir les notes d'une classe dans une grille étudiants × devoirs"""
+    enseignant = request.user
+    
+    # Vérifier que l'enseignant est assigné à cette classe
+    classe = get_object_or_404(Classe, id=classe_id)
+    if not contexte_acces(enseignant).enseigne(classe):
+        messages.error(request, "Vous n'êtes pas assigné à cette classe.")
+        return redirect('enseignants:mes_classes')
+    
+    carnet = CarnetNotes(classe, enseignant)
+    
+    if request.method == 'POST':
+        resultat = carnet.enregistrer(request.POST)
+        if resultat is None:
+            messages.error(request, "Certaines notes sont invalides, aucune modification n'a été enregistrée.")
+        else:
+            nb_creees, nb_modifiees, nb_supprimees = resultat
+            messages.success(
+                request,
+                f'Carnet enregistré : {nb_creees} note(s) ajoutée(s), {nb_modifiees} modifiée(s), {nb_supprimees} supprimée(s).'
+            )
+            return redirect('enseignants:carnet_notes', classe_id=classe.id)
+    
+    context = {
+        'classe': classe,
+        'enseignant': enseignant,
+        'devoirs': carnet.devoirs,
+        'lignes': carnet.lignes(),
+    }
+    
+    return render(request, 'enseignant/carnet_notes.html', context)
+
+
 @login_required
 @user_passes_test(is_enseignant, login_url='/enseignant/login/')
 def ajouter_note(request, classe_id, etudiant_id=None):
@@ -585,7 +701,7 @@ def ajouter_note(request, classe_id, etudiant_id=None):
     
     # Vérifier que l'enseignant est assigné à cette classe
     classe = get_object_or_404(Classe, id=classe_id)
-    if enseignant not in classe.enseignants.all():
+    if not contexte_acces(enseignant).enseigne(classe):
         messages.error(request, "Vous n'êtes pas assigné à cette classe.")
         return redirect('enseignants:mes_classes')
     
@@ -599,6 +715,7 @@ def ajouter_note(request, classe_id, etudiant_id=None):
         if form.is_valid():
             note = form.save(commit=False)
             note.enseignant = enseignant
+            # Les moyennes sont recalculées à la validation (signaux de comptes.agregats)
             note.save()
             messages.success(request, f'Note {note.note}/20 attribuée à {note.etudiant.username} avec succès!')
             return redirect('enseignants:etudiants_classe', classe_id=classe.id)
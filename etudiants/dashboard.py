@@ -0,0 +1,67 @@
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+from django.utils import timezone
+from cours.models import Inscription
+from devoirs.models import Devoir, Soumission
+from comptes.models import Note
+
+
+def devoirs_etudiant(etudiant):
+    """Retourne les devoirs des cours auxquels l'étudiant est inscrit"""
+    cours_inscrits = Inscription.objects.filter(etudiant=etudiant).values('cours_id')
+    return Devoir.objects.filter(cours__in=cours_inscrits)
+
+
+def statistiques_devoirs(etudiant, now=None):
+    """Calcule en une seule requête les compteurs de devoirs de l'étudiant"""
+    now = now or timezone.now()
+    devoirs = devoirs_etudiant(etudiant).annotate(
+        est_soumis=Exists(Soumission.objects.filter(devoir=OuterRef('pk'), etudiant=etudiant)),
+        est_note=Exists(Note.objects.filter(devoir=OuterRef('pk'), etudiant=etudiant)),
+    )
+    return devoirs.aggregate(
+        total=Count('id'),
+        en_retard=Count('id', filter=Q(deadline__lt=now)),
+        a_venir=Count('id', filter=Q(deadline__gte=now)),
+        non_soumis=Count('id', filter=Q(est_soumis=False)),
+        a_rendre=Count('id', filter=Q(est_soumis=False, deadline__gte=now)),
+        manques=Count('id', filter=Q(est_soumis=False, deadline__lt=now)),
+        soumis=Count('id', filter=Q(est_soumis=True)),
+        notes=Count('id', filter=Q(est_note=True)),
+    )
+
+
+def donnees_dashboard(etudiant, now=None):
+    """
+    Construit le contexte du dashboard étudiant avec un nombre fixe de requêtes,
+    quel que soit le nombre de cours ou de devoirs de l'étudiant.
+    """
+    now = now or timezone.now()
+    stats = statistiques_devoirs(etudiant, now)
+
+    inscriptions = Inscription.objects.filter(etudiant=etudiant)
+    cours_recents = [
+        inscription.cours
+        for inscription in inscriptions.select_related('cours__enseignant').order_by('-date_inscription')[:5]
+    ]
+
+    notes = Note.objects.filter(etudiant=etudiant)
+    moyenne_generale = notes.aggregate(Avg('note'))['note__avg']
+
+    return {
+        'total_cours': inscriptions.count(),
+        'total_devoirs': stats['total'],
+        'total_soumissions': Soumission.objects.filter(etudiant=etudiant).count(),
+        'devoirs_en_retard': stats['en_retard'],
+        'devoirs_a_venir': stats['a_venir'],
+        'devoirs_non_soumis': stats['non_soumis'],
+        'devoirs_a_rendre': stats['a_rendre'],
+        'devoirs_manques': stats['manques'],
+        'devoirs_soumis': stats['soumis'],
+        'devoirs_notes': stats['notes'],
+        'cours_inscrits': cours_recents,
+        'devoirs_recents': devoirs_etudiant(etudiant).select_related('cours').order_by('-deadline')[:5],
+        'soumissions_recentes': Soumission.objects.filter(etudiant=etudiant).select_related('devoir').order_by('-date_soumission')[:5],
+        'notes_recentes': notes.select_related('devoir').order_by('-date_attribution')[:5],
+        'moyenne_generale': round(moyenne_generale, 2) if moyenne_generale else None,
+        'now': now,
+    }
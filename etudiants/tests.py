@@ -0,0 +1,79 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from cours.models import Cours
+from devoirs.models import Devoir, Soumission
+from comptes.models import Utilisateur, Classe, Note
+from .dashboard import statistiques_devoirs
+
+
+class DashboardEtudiantTests(TestCase):
+    """Tests du dashboard étudiant"""
+
+    def setUp(self):
+        self.classe = Classe.objects.create(nom='Terminale A')
+        self.enseignant = Utilisateur.objects.create_user(
+            username='prof', password='secret', role='enseignant'
+        )
+        self.etudiant = Utilisateur.objects.create_user(
+            username='eleve', password='secret', role='etudiant', classe=self.classe
+        )
+        self.now = timezone.now()
+
+    def creer_cours(self, nb_cours, nb_devoirs):
+        """Crée des cours avec leurs devoirs, soumissions et notes pour l'étudiant"""
+        for i in range(nb_cours):
+            cours = Cours.objects.create(
+                titre=f'Cours {i}',
+                description='Description',
+                enseignant=self.enseignant,
+                classe=self.classe,
+            )
+            for j in range(nb_devoirs):
+                devoir = Devoir.objects.create(
+                    cours=cours,
+                    titre=f'Devoir {i}-{j}',
+                    description='Description',
+                    deadline=self.now + timedelta(days=1 if j % 2 else -1),
+                )
+                if j % 3 == 0:
+                    Soumission.objects.create(devoir=devoir, etudiant=self.etudiant, fichier='soumissions/copie.pdf')
+                    Note.objects.create(etudiant=self.etudiant, enseignant=self.enseignant, devoir=devoir, note=12)
+
+    def nb_requetes_dashboard(self):
+        self.client.force_login(self.etudiant)
+        with CaptureQueriesContext(connection) as contexte:
+            response = self.client.get(reverse('etudiants:dashboard_etudiant'))
+        self.assertEqual(response.status_code, 200)
+        return len(contexte.captured_queries)
+
+    def test_statistiques_devoirs(self):
+        self.creer_cours(nb_cours=2, nb_devoirs=4)
+        stats = statistiques_devoirs(self.etudiant, self.now)
+        self.assertEqual(stats['total'], 8)
+        self.assertEqual(stats['en_retard'], 4)
+        self.assertEqual(stats['a_venir'], 4)
+        self.assertEqual(stats['soumis'], 4)
+        self.assertEqual(stats['notes'], 4)
+        self.assertEqual(stats['non_soumis'], 4)
+        self.assertEqual(stats['a_rendre'], 2)
+        self.assertEqual(stats['manques'], 2)
+
+    def test_nombre_de_requetes_constant(self):
+        self.creer_cours(nb_cours=1, nb_devoirs=1)
+        reference = self.nb_requetes_dashboard()
+
+        self.creer_cours(nb_cours=10, nb_devoirs=6)
+        self.assertEqual(self.nb_requetes_dashboard(), reference)
+
+    def test_compteurs_mes_cours(self):
+        self.creer_cours(nb_cours=2, nb_devoirs=4)
+        self.client.force_login(self.etudiant)
+        response = self.client.get(reverse('etudiants:mes_cours'))
+        self.assertEqual(
+            sorted((item['cours'].titre, item['nb_devoirs'], item['nb_soumissions']) for item in response.context['cours_avec_stats']),
+            [('Cours 0', 4, 2), ('Cours 1', 4, 2)],
+        )
@@ -6,6 +6,8 @@ from .views import (
     detail_cours,
     mes_devoirs,
     soumettre_devoir,
+    demarrer_envoi_devoir,
+    envoi_devoir,
     mes_notes,
     mes_soumissions,
 )
@@ -17,6 +19,8 @@ urlpatterns = [
     path('cours/<int:cours_id>/', detail_cours, name='detail_cours'),
     path('mes-devoirs/', mes_devoirs, name='mes_devoirs'),
     path('soumettre-devoir/<int:devoir_id>/', soumettre_devoir, name='soumettre_devoir'),
+    path('soumettre-devoir/<int:devoir_id>/envoi/', demarrer_envoi_devoir, name='demarrer_envoi_devoir'),
+    path('soumettre-devoir/<int:devoir_id>/envoi/<str:token>/', envoi_devoir, name='envoi_devoir'),
     path('mes-notes/', mes_notes, name='mes_notes'),
     path('mes-soumissions/', mes_soumissions, name='mes_soumissions'),
 ]
@@ -1,13 +1,26 @@
+import json
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login
 from django.contrib import messages
 from django.utils import timezone
-from django.http import HttpResponseForbidden
-from django.db.models import Avg, Count, Q
+from django.http import HttpResponseForbidden, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from django.db.models import Count, Q
 from cours.models import Cours, Inscription
-from devoirs.models import Devoir, Soumission
+from cours.services import etudiant_a_acces
+from devoirs.models import Devoir, Soumission, EnvoiFractionne
+from devoirs.depots import deposer
+from devoirs.envois import ErreurEnvoi, demarrer_envoi, etat_envoi, recevoir_bloc
 from comptes.models import Utilisateur, Classe, Note
+from comptes.agregats import cle_devoir, cle_etudiant, lire_agregats
+from comptes.apercus import apercus_par_nom
+from comptes.caches import fragment_en_cache
+from comptes.replicas import lecture_sur_replica
+from comptes.televersements import verifier_envoi
+from .dashboard import donnees_dashboard
 
 
 def is_etudiant(user):
@@ -50,118 +63,58 @@ def etudiant_login(request):
 
 @login_required
 @user_passes_test(is_etudiant, login_url='/etudiant/login/')
+@lecture_sur_replica
 def dashboard_etudiant(request):
     """Dashboard de l'étudiant"""
     etudiant = request.user
     
-    # Récupérer les cours de la classe de l'étudiant
-    cours_etudiant = Cours.objects.none()
-    if etudiant.classe:
-        try:
-            cours_etudiant = Cours.objects.filter(classe=etudiant.classe).order_by('-created_at')
-        except Exception:
-            # Si le champ classe n'existe pas encore
-            cours_etudiant = Cours.objects.none()
-    
-    # Récupérer les inscriptions de l'étudiant
-    inscriptions = Inscription.objects.filter(etudiant=etudiant)
-    cours_inscrits = [inscription.cours for inscription in inscriptions]
-    
-    # Récupérer les devoirs des cours de l'étudiant
-    devoirs_etudiant = Devoir.objects.filter(cours__in=cours_inscrits).order_by('-deadline')
-    
-    # Récupérer les soumissions de l'étudiant
-    soumissions = Soumission.objects.filter(etudiant=etudiant).order_by('-date_soumission')
-    
-    # Statistiques
-    now = timezone.now()
-    devoirs_en_retard = devoirs_etudiant.filter(deadline__lt=now)
-    devoirs_a_venir = devoirs_etudiant.filter(deadline__gte=now)
-    
-    # Récupérer les notes de l'étudiant
-    notes_etudiant = Note.objects.filter(etudiant=etudiant).order_by('-date_attribution')
-    moyenne_generale = notes_etudiant.aggregate(Avg('note'))['note__avg']
-    
-    # Devoirs non soumis
-    devoirs_non_soumis = []
-    for devoir in devoirs_etudiant:
-        if not Soumission.objects.filter(devoir=devoir, etudiant=etudiant).exists():
-            devoirs_non_soumis.append(devoir)
-    
-    context = {
-        'etudiant': etudiant,
-        'total_cours': len(cours_inscrits),
-        'total_devoirs': devoirs_etudiant.count(),
-        'total_soumissions': soumissions.count(),
-        'devoirs_en_retard': devoirs_en_retard.count(),
-        'devoirs_a_venir': devoirs_a_venir.count(),
-        'devoirs_non_soumis': len(devoirs_non_soumis),
-        'cours_inscrits': cours_inscrits[:5],  # 5 derniers cours
-        'devoirs_recents': devoirs_etudiant[:5],  # 5 derniers devoirs
-        'soumissions_recentes': soumissions[:5],  # 5 dernières soumissions
-        'notes_recentes': notes_etudiant[:5],  # 5 dernières notes
-        'moyenne_generale': round(moyenne_generale, 2) if moyenne_generale else None,
-        'now': now,
-    }
+    # Toutes les statistiques sont calculées avec un nombre fixe de requêtes
+    context = donnees_dashboard(etudiant)
+    context['etudiant'] = etudiant
     
     return render(request, 'etudiant/dashboard.html', context)
 
 
+@fragment_en_cache('cours_suivis', ['cours.Inscription', 'cours.Cours', 'devoirs.Devoir', 'devoirs.Soumission'])
+def _cours_suivis(etudiant):
+    """Cours de l'étudiant avec leur nombre de devoirs et de soumissions"""
+    inscriptions = Inscription.objects.filter(etudiant=etudiant)
+    if etudiant.classe_id:
+        # Inscrire l'étudiant aux cours de sa classe qui lui manquent (nombre constant de requêtes)
+        etudiant.inscrire_aux_cours_classe()
+        inscriptions = inscriptions.filter(cours__classe_id=etudiant.classe_id).order_by('-cours__created_at')
+    else:
+        # Si l'étudiant n'a pas de classe, utiliser uniquement les inscriptions existantes
+        inscriptions = inscriptions.order_by('-date_inscription')
+    
+    # Cours, enseignant et compteurs de chaque inscription en une seule requête
+    inscriptions = inscriptions.select_related('cours__enseignant').annotate(
+        nb_devoirs=Count('cours__devoir', distinct=True),
+        nb_soumissions=Count(
+            'cours__devoir__soumission',
+            filter=Q(cours__devoir__soumission__etudiant=etudiant),
+            distinct=True,
+        ),
+    )
+    return [
+        {
+            'cours': inscription.cours,
+            'date_inscription': inscription.date_inscription,
+            'nb_devoirs': inscription.nb_devoirs,
+            'nb_soumissions': inscription.nb_soumissions,
+        }
+        for inscription in inscriptions
+    ]
+
+
 @login_required
 @user_passes_test(is_etudiant, login_url='/etudiant/login/')
+@lecture_sur_replica
 def mes_cours(request):
     """Afficher les cours de l'étudiant"""
     etudiant = request.user
-    
-    # Récupérer les cours de la classe de l'étudiant et s'assurer qu'il est inscrit
-    cours_avec_stats = []
-    if etudiant.classe:
-        try:
-            cours_classe = Cours.objects.filter(classe=etudiant.classe).order_by('-created_at')
-            # Inscrire automatiquement l'étudiant aux cours de sa classe s'il n'est pas déjà inscrit
-            for cours in cours_classe:
-                inscription, created = Inscription.objects.get_or_create(
-                    cours=cours,
-                    etudiant=etudiant
-                )
-                
-                nb_devoirs = Devoir.objects.filter(cours=cours).count()
-                nb_soumissions = Soumission.objects.filter(devoir__cours=cours, etudiant=etudiant).count()
-                
-                cours_avec_stats.append({
-                    'cours': cours,
-                    'date_inscription': inscription.date_inscription,
-                    'nb_devoirs': nb_devoirs,
-                    'nb_soumissions': nb_soumissions,
-                })
-        except Exception:
-            # Si le champ classe n'existe pas encore, utiliser les inscriptions existantes
-            inscriptions = Inscription.objects.filter(etudiant=etudiant).order_by('-date_inscription')
-            for inscription in inscriptions:
-                cours = inscription.cours
-                nb_devoirs = Devoir.objects.filter(cours=cours).count()
-                nb_soumissions = Soumission.objects.filter(devoir__cours=cours, etudiant=etudiant).count()
-                
-                cours_avec_stats.append({
-                    'cours': cours,
-                    'date_inscription': inscription.date_inscription,
-                    'nb_devoirs': nb_devoirs,
-                    'nb_soumissions': nb_soumissions,
-                })
-    else:
-        # Si l'étudiant n'a pas de classe, utiliser uniquement les inscriptions existantes
-        inscriptions = Inscription.objects.filter(etudiant=etudiant).order_by('-date_inscription')
-        for inscription in inscriptions:
-            cours = inscription.cours
-            nb_devoirs = Devoir.objects.filter(cours=cours).count()
-            nb_soumissions = Soumission.objects.filter(devoir__cours=cours, etudiant=etudiant).count()
-            
-            cours_avec_stats.append({
-                'cours': cours,
-                'date_inscription': inscription.date_inscription,
-                'nb_devoirs': nb_devoirs,
-                'nb_soumissions': nb_soumissions,
-            })
+    # Les inscriptions manquantes ne sont recherchées que lorsque la liste n'est pas en cache
+    cours_avec_stats = _cours_suivis(etudiant)
     
     context = {
         'etudiant': etudiant,
@@ -179,27 +132,27 @@ def detail_cours(request, cours_id):
     etudiant = request.user
     cours = get_object_or_404(Cours, id=cours_id)
     
-    # Vérifier que l'étudiant est dans la classe du cours ou est inscrit
-    peut_acceder = False
-    if cours.classe and etudiant.classe == cours.classe:
-        peut_acceder = True
-        # S'assurer que l'étudiant est inscrit
-        Inscription.objects.get_or_create(cours=cours, etudiant=etudiant)
-    elif Inscription.objects.filter(cours=cours, etudiant=etudiant).exists():
-        peut_acceder = True
-    
-    if not peut_acceder:
+    # Vérifier que l'étudiant est dans la classe du cours (il est alors inscrit) ou est inscrit
+    if not etudiant_a_acces(etudiant, cours, creer_inscription=True):
         messages.error(request, "Vous n'avez pas accès à ce cours.")
         return redirect('etudiants:mes_cours')
     
     # Récupérer les devoirs de ce cours
-    devoirs = Devoir.objects.filter(cours=cours).order_by('deadline')
+    devoirs = list(Devoir.objects.filter(cours=cours).order_by('deadline'))
+    
+    # Aperçus déjà générés des PDF du cours et des devoirs, en une requête
+    apercus = apercus_par_nom([cours.fichier_pdf.name] + [devoir.fichier.name for devoir in devoirs])
+    
+    # Soumissions de l'étudiant pour ces devoirs, en une requête
+    soumissions = {
+        soumission.devoir_id: soumission
+        for soumission in Soumission.objects.filter(devoir__in=devoirs, etudiant=etudiant)
+    }
     
-    # Pour chaque devoir, vérifier si l'étudiant a soumis
     devoirs_avec_statut = []
     now = timezone.now()
     for devoir in devoirs:
-        soumission = Soumission.objects.filter(devoir=devoir, etudiant=etudiant).first()
+        soumission = soumissions.get(devoir.id)
         est_en_retard = now > devoir.deadline
         
         devoirs_avec_statut.append({
@@ -207,10 +160,12 @@ def detail_cours(request, cours_id):
             'soumission': soumission,
             'est_en_retard': est_en_retard,
             'peut_soumettre': not soumission and not est_en_retard,
+            'apercu': apercus.get(devoir.fichier.name),
         })
     
     context = {
         'cours': cours,
+        'apercu_cours': apercus.get(cours.fichier_pdf.name),
         'etudiant': etudiant,
         'devoirs_avec_statut': devoirs_avec_statut,
         'total_devoirs': len(devoirs_avec_statut),
@@ -222,22 +177,26 @@ def detail_cours(request, cours_id):
 
 @login_required
 @user_passes_test(is_etudiant, login_url='/etudiant/login/')
+@lecture_sur_replica
 def mes_devoirs(request):
     """Afficher tous les devoirs de l'étudiant"""
     etudiant = request.user
     
-    # Récupérer les cours de l'étudiant
-    inscriptions = Inscription.objects.filter(etudiant=etudiant)
-    cours_inscrits = [inscription.cours for inscription in inscriptions]
+    # Récupérer tous les devoirs des cours de l'étudiant, avec leur cours
+    cours_inscrits = Inscription.objects.filter(etudiant=etudiant).values('cours_id')
+    devoirs = list(Devoir.objects.filter(cours__in=cours_inscrits).select_related('cours').order_by('deadline'))
     
-    # Récupérer tous les devoirs de ces cours
-    devoirs = Devoir.objects.filter(cours__in=cours_inscrits).order_by('deadline')
+    # Soumissions de l'étudiant pour ces devoirs, en une requête
+    soumissions = {
+        soumission.devoir_id: soumission
+        for soumission in Soumission.objects.filter(devoir__in=devoirs, etudiant=etudiant)
+    }
     
     # Pour chaque devoir, vérifier le statut
     now = timezone.now()
     devoirs_avec_statut = []
     for devoir in devoirs:
-        soumission = Soumission.objects.filter(devoir=devoir, etudiant=etudiant).first()
+        soumission = soumissions.get(devoir.id)
         est_en_retard = now > devoir.deadline
         
         devoirs_avec_statut.append({
@@ -259,21 +218,17 @@ def mes_devoirs(request):
 
 @login_required
 @user_passes_test(is_etudiant, login_url='/etudiant/login/')
+@verifier_envoi
 def soumettre_devoir(request, devoir_id):
     """Soumettre un devoir"""
     etudiant = request.user
-    devoir = get_object_or_404(Devoir, id=devoir_id)
-    
-    # Vérifier que l'étudiant est dans la classe du cours ou est inscrit
-    peut_acceder = False
-    if devoir.cours.classe and etudiant.classe == devoir.cours.classe:
-        peut_acceder = True
-        # S'assurer que l'étudiant est inscrit
-        Inscription.objects.get_or_create(cours=devoir.cours, etudiant=etudiant)
-    elif Inscription.objects.filter(cours=devoir.cours, etudiant=etudiant).exists():
-        peut_acceder = True
-    
-    if not peut_acceder:
+    devoir = get_object_or_404(Devoir.objects.select_related('cours'), id=devoir_id)
+    
+    if request.method == 'POST' and getattr(settings, 'DEPOTS_DIFFERES', True):
+        return _deposer_devoir(request, devoir)
+    
+    # Vérifier que l'étudiant est dans la classe du cours (il est alors inscrit) ou est inscrit
+    if not etudiant_a_acces(etudiant, devoir.cours, creer_inscription=True):
         messages.error(request, "Vous n'avez pas accès à ce devoir.")
         return redirect('etudiants:mes_devoirs')
     
@@ -313,27 +268,135 @@ def soumettre_devoir(request, devoir_id):
     return render(request, 'etudiant/soumettre_devoir.html', context)
 
 
+def _deposer_devoir(request, devoir):
+    """
+    Chemin rapide de soumettre_devoir (rush avant la deadline) : aucune écriture
+    ni requête avant l'INSERT de la soumission, qui écarte les doublons (devoirs.depots)
+    """
+    etudiant = request.user
+    if not etudiant_a_acces(etudiant, devoir.cours):
+        messages.error(request, "Vous n'avez pas accès à ce devoir.")
+        return redirect('etudiants:mes_devoirs')
+    if timezone.now() > devoir.deadline:
+        messages.error(request, "La date limite de soumission est dépassée.")
+        return redirect('etudiants:mes_devoirs')
+    
+    fichier = request.FILES.get('fichier')
+    if not fichier:
+        messages.error(request, "Veuillez sélectionner un fichier.")
+        return render(request, 'etudiant/soumettre_devoir.html', {'devoir': devoir, 'etudiant': etudiant, 'now': timezone.now()})
+    
+    if not deposer(devoir, etudiant, fichier):
+        messages.warning(request, "Vous avez déjà soumis ce devoir.")
+        return redirect('etudiants:mes_devoirs')
+    messages.success(request, f'Devoir "{devoir.titre}" soumis avec succès!')
+    return redirect('etudiants:mes_devoirs')
+
+
+def _refus_soumission(etudiant, devoir):
+    """Motif pour lequel l'étudiant ne peut pas soumettre ce devoir, ou None"""
+    if not etudiant_a_acces(etudiant, devoir.cours, creer_inscription=True):
+        return "Vous n'avez pas accès à ce devoir."
+    if Soumission.objects.filter(devoir=devoir, etudiant=etudiant).exists():
+        return "Vous avez déjà soumis ce devoir."
+    if timezone.now() > devoir.deadline:
+        return "La date limite de soumission est dépassée."
+    return None
+
+
 @login_required
 @user_passes_test(is_etudiant, login_url='/etudiant/login/')
+@require_POST
+def demarrer_envoi_devoir(request, devoir_id):
+    """Ouvrir (ou reprendre) l'envoi par blocs d'une soumission"""
+    etudiant = request.user
+    devoir = get_object_or_404(Devoir.objects.select_related('cours'), id=devoir_id)
+    
+    refus = _refus_soumission(etudiant, devoir)
+    if refus:
+        return JsonResponse({'erreur': refus}, status=403)
+    
+    try:
+        donnees = json.loads(request.body)
+        nom_fichier, taille, sha256 = str(donnees['nom']), int(donnees['taille']), str(donnees['sha256'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'erreur': 'Requête invalide.'}, status=400)
+    
+    try:
+        envoi = demarrer_envoi(devoir, etudiant, nom_fichier, taille, sha256)
+    except ErreurEnvoi as erreur:
+        return JsonResponse(erreur.donnees(), status=erreur.statut)
+    return JsonResponse(etat_envoi(envoi))
+
+
+@login_required
+@user_passes_test(is_etudiant, login_url='/etudiant/login/')
+def envoi_devoir(request, devoir_id, token):
+    """
+    GET : état de l'envoi (octets déjà reçus) pour le reprendre.
+    POST : un bloc brut (application/octet-stream) commençant à l'octet X-Debut.
+    """
+    envoi = get_object_or_404(
+        EnvoiFractionne.objects.select_related('devoir'),
+        token=token, devoir_id=devoir_id, utilisateur=request.user,
+    )
+    if request.method == 'GET':
+        return JsonResponse(etat_envoi(envoi))
+    if request.method != 'POST':
+        return JsonResponse({'erreur': 'Méthode non autorisée.'}, status=405)
+    
+    try:
+        debut = int(request.headers['X-Debut'])
+        longueur = int(request.META.get('CONTENT_LENGTH') or 0)
+    except (KeyError, ValueError):
+        return JsonResponse({'erreur': 'Requête invalide.'}, status=400)
+    
+    # Le bloc est lu directement depuis la requête, sans passer par request.body
+    try:
+        envoi, soumission = recevoir_bloc(envoi, debut, request, longueur, request.headers.get('X-Bloc-Sha256'))
+    except ErreurEnvoi as erreur:
+        return JsonResponse(erreur.donnees(), status=erreur.statut)
+    
+    if soumission is None:
+        return JsonResponse(etat_envoi(envoi))
+    messages.success(request, f'Devoir "{envoi.devoir.titre}" soumis avec succès!')
+    return JsonResponse({
+        'termine': True,
+        'en_retard': soumission.en_retard,
+        'redirection': reverse('etudiants:mes_devoirs'),
+    })
+
+
+@login_required
+@user_passes_test(is_etudiant, login_url='/etudiant/login/')
+@lecture_sur_replica
 def mes_notes(request):
     """Afficher les notes de l'étudiant"""
     etudiant = request.user
     
-    # Récupérer toutes les notes de l'étudiant
-    notes = Note.objects.filter(etudiant=etudiant).order_by('-date_attribution')
+    # Récupérer toutes les notes de l'étudiant avec leur devoir et leur cours
+    notes = list(
+        Note.objects.filter(etudiant=etudiant)
+        .select_related('devoir__cours')
+        .order_by('-date_attribution')
+    )
     
-    # Calculer les moyennes par devoir
+    # Regrouper les notes par devoir
     notes_par_devoir = {}
     for note in notes:
-        devoir_nom = note.devoir.titre
-        if devoir_nom not in notes_par_devoir:
-            notes_par_devoir[devoir_nom] = []
-        notes_par_devoir[devoir_nom].append(note)
-    
-    # Calculer la moyenne générale
-    moyenne_generale = notes.aggregate(Avg('note'))['note__avg']
+        notes_par_devoir.setdefault(note.devoir.titre, []).append(note)
+    
+    # Moyennes précalculées : moyenne générale de l'étudiant et statistiques de chaque devoir
+    devoirs = {note.devoir.titre: note.devoir_id for note in notes}
+    agregats = lire_agregats(
+        [cle_etudiant(etudiant.id)] + [cle_devoir(devoir_id) for devoir_id in devoirs.values()]
+    )
+    moyenne_generale = agregats[cle_etudiant(etudiant.id)].moyenne
+    agregats_par_devoir = {
+        devoir_nom: agregats[cle_devoir(devoir_id)] for devoir_nom, devoir_id in devoirs.items()
+    }
     
-    # Calculer les moyennes par devoir
+    # Moyenne de l'étudiant pour chaque devoir, sur les notes déjà chargées
     moyennes_par_devoir = {}
     for devoir_nom, notes_devoir in notes_par_devoir.items():
         moyenne = sum(note.note for note in notes_devoir) / len(notes_devoir)
@@ -343,9 +406,10 @@ def mes_notes(request):
         'etudiant': etudiant,
         'notes': notes,
         'notes_par_devoir': notes_par_devoir,
-        'moyenne_generale': round(moyenne_generale, 2) if moyenne_generale else None,
+        'moyenne_generale': moyenne_generale,
         'moyennes_par_devoir': moyennes_par_devoir,
-        'total_notes': notes.count(),
+        'agregats_par_devoir': agregats_par_devoir,
+        'total_notes': len(notes),
     }
     
     return render(request, 'etudiant/mes_notes.html', context)
@@ -353,21 +417,23 @@ def mes_notes(request):
 
 @login_required
 @user_passes_test(is_etudiant, login_url='/etudiant/login/')
+@lecture_sur_replica
 def mes_soumissions(request):
     """Afficher les soumissions de l'étudiant"""
     etudiant = request.user
     
     # Récupérer toutes les soumissions de l'étudiant
-    soumissions = Soumission.objects.filter(etudiant=etudiant).order_by('-date_soumission')
-    
-    # Pour chaque soumission, vérifier le statut
-    soumissions_avec_statut = []
-    for soumission in soumissions:
-        est_en_retard = soumission.date_soumission > soumission.devoir.deadline
-        soumissions_avec_statut.append({
-            'soumission': soumission,
-            'est_en_retard': est_en_retard,
-        })
+    soumissions = (
+        Soumission.objects.filter(etudiant=etudiant)
+        .select_related('devoir__cours')
+        .order_by('-date_soumission')
+    )
+    
+    # Le retard est enregistré sur la soumission : aucune requête par ligne
+    soumissions_avec_statut = [
+        {'soumission': soumission, 'est_en_retard': soumission.en_retard}
+        for soumission in soumissions
+    ]
     
     context = {
         'etudiant': etudiant,
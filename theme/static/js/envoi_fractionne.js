@@ -0,0 +1,90 @@
+// Envoi d'un fichier par blocs (soumission, PDF de cours), reprenable après une coupure réseau.
+// Le formulaire classique reste utilisé si le navigateur ne sait pas calculer le SHA-256.
+(function () {
+    function hexa(tampon) {
+        return Array.from(new Uint8Array(tampon), function (octet) {
+            return octet.toString(16).padStart(2, '0');
+        }).join('');
+    }
+
+    function csrf(formulaire) {
+        return formulaire.querySelector('input[name=csrfmiddlewaretoken]').value;
+    }
+
+    function attendre(ms) {
+        return new Promise(function (resolve) { setTimeout(resolve, ms); });
+    }
+
+    async function envoyer(formulaire, fichier, afficher) {
+        const entetes = {'X-CSRFToken': csrf(formulaire)};
+        afficher('Calcul de l\'empreinte du fichier…');
+        const sha256 = hexa(await crypto.subtle.digest('SHA-256', await fichier.arrayBuffer()));
+
+        let reponse = await fetch(formulaire.dataset.envoiUrl, {
+            method: 'POST',
+            headers: Object.assign({'Content-Type': 'application/json'}, entetes),
+            body: JSON.stringify({nom: fichier.name, taille: fichier.size, sha256: sha256}),
+        });
+        let etat = await reponse.json();
+        if (!reponse.ok) throw new Error(etat.erreur);
+        const url = formulaire.dataset.envoiUrl + etat.token + '/';
+
+        let essais = 0;
+        while (true) {
+            afficher('Envoi : ' + Math.floor(100 * etat.recu / etat.taille) + ' %');
+            const bloc = fichier.slice(etat.recu, etat.recu + etat.taille_bloc);
+            try {
+                reponse = await fetch(url, {
+                    method: 'POST',
+                    headers: Object.assign({'Content-Type': 'application/octet-stream', 'X-Debut': String(etat.recu)}, entetes),
+                    body: bloc,
+                });
+            } catch (erreur) {
+                // Coupure réseau : on attend puis on redemande au serveur où reprendre
+                if (++essais > 20) throw erreur;
+                await attendre(Math.min(30000, 1000 * essais));
+                reponse = await fetch(url, {headers: entetes}).catch(function () { return null; });
+                if (reponse && reponse.ok) etat = await reponse.json();
+                continue;
+            }
+            const donnees = await reponse.json();
+            if (donnees.termine) return donnees;
+            if (!reponse.ok && donnees.recu === undefined) throw new Error(donnees.erreur);
+            etat = donnees;
+            essais = 0;
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        const formulaire = document.querySelector('form[data-envoi-url]');
+        if (!formulaire || !window.crypto || !crypto.subtle || !window.fetch) return;
+        const progression = formulaire.querySelector('[data-envoi-progression]');
+        const bouton = formulaire.querySelector('button[type=submit]');
+
+        formulaire.addEventListener('submit', function (evenement) {
+            const fichier = formulaire.querySelector('input[type=file]').files[0];
+            if (!fichier) return;
+            evenement.preventDefault();
+            bouton.disabled = true;
+            envoyer(formulaire, fichier, function (texte) { progression.textContent = texte; })
+                .then(function (resultat) {
+                    if (resultat.redirection) {
+                        window.location.href = resultat.redirection;
+                        return;
+                    }
+                    // PDF de cours : le formulaire est posté avec le token de l'envoi à la place du fichier
+                    const jeton = document.createElement('input');
+                    jeton.type = 'hidden';
+                    jeton.name = 'envoi';
+                    jeton.value = resultat.token;
+                    formulaire.appendChild(jeton);
+                    formulaire.querySelector('input[type=file]').disabled = true;
+                    formulaire.submit();
+                })
+                .catch(function (erreur) {
+                    progression.textContent = erreur.message || 'L\'envoi a échoué, réessayez pour le reprendre.';
+                    bouton.disabled = false;
+                });
+        });
+    });
+})();